@@ -0,0 +1,94 @@
+'''
+Acquisition benchmark suite, run against the simulated device: measure() round trip, measurement sets with and without output file, configuration apply and Allan post-processing
+
+Usage: python benchmarks/bench_acquisition.py [--realtime] [--output bench_output.txt]
+With --realtime the link and the gate times modelled by the simulator are actually waited for, otherwise only the overhead of the library is measured.
+'''
+import sys
+import os
+sys.path.insert(0,os.path.dirname(os.path.dirname(os.path.abspath(__file__)))) #run from a checkout of the repository
+from sr620py import *
+from sr620py.sr620utils import compute_allan
+import numpy as np
+import argparse
+import logging
+import tempfile
+import time
+
+def open_device(realtime:bool) -> SR620:
+    sim = SimulatedSerial(realtime=realtime,seed=0,latency=0.001 if realtime else 0.0)
+    dev = SR620(None,port=sim)
+    dev.set_custom_configuration(mode=MODE_FREQUENCY,arming=ARMING_CENTISECOND,size=1)
+    dev.instrumentation.reset()
+    return dev
+
+def bench_measure(dev:SR620,n:int) -> list:
+    lat = np.empty(n)
+    for i in range(n):
+        start = time.perf_counter()
+        dev.measure(STATISTICS_MEAN,progress=False)
+        lat[i] = time.perf_counter()-start
+    return [('measure() round trip',f'mean {lat.mean()*1e6:.1f} us, p50 {np.percentile(lat,50)*1e6:.1f} us, p99 {np.percentile(lat,99)*1e6:.1f} us')]
+
+def bench_sets(dev:SR620,n:int) -> list:
+    rows = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for label,path in (('no file',None),('csv',os.path.join(tmp,'set.csv')),('npy',os.path.join(tmp,'set.npy'))):
+            start = time.perf_counter()
+            dev.start_measurement_set(STATISTICS_MEAN,n,file_path=path,print=False)
+            elapsed = time.perf_counter()-start
+            rows.append((f'start_measurement_set ({label})',f'{n/elapsed:.0f} samples/s'))
+    return rows
+
+def bench_configuration(dev:SR620,n:int) -> list:
+    lat = np.empty(n)
+    modes = (MODE_FREQUENCY,MODE_PERIOD)
+    for i in range(n):
+        start = time.perf_counter()
+        dev.set_mode(modes[i%2])
+        lat[i] = time.perf_counter()-start
+    dev.set_mode(MODE_FREQUENCY)
+    return [('configuration apply',f'mean {lat.mean()*1e3:.2f} ms, max {lat.max()*1e3:.2f} ms')]
+
+def bench_allan(sizes:list) -> list:
+    rows = []
+    rng = np.random.default_rng(0)
+    compute_allan(np.ones(10),1.0,ALLAN_OVERLAPPING,normalized=False) #warm up (import of allantools)
+    for n in sizes:
+        data = 10e6*(1+rng.normal(0,1e-11,n))
+        start = time.perf_counter()
+        compute_allan(data,1.0,ALLAN_OVERLAPPING,normalized=False)
+        batch = time.perf_counter()-start
+        est = OnlineAllan(1.0,max_m=n)
+        start = time.perf_counter()
+        est.add_many(data)
+        online = time.perf_counter()-start
+        rows.append((f'Allan post-processing n={n}',f'allantools {batch*1e3:.1f} ms, online {online*1e3:.1f} ms'))
+    return rows
+
+def format_stages(stats:dict) -> list:
+    return [(f'stage {stage}',f"count {s['count']}, mean {s['mean']*1e6:.1f} us, p99 <= {s['p99']*1e6:.0f} us") for stage,s in stats.items()]
+
+if __name__=='__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--realtime',action='store_true')
+    parser.add_argument('--output',default=None)
+    args = parser.parse_args()
+    logging.disable(logging.CRITICAL)
+    n = 50 if args.realtime else 2000
+
+    dev = open_device(args.realtime)
+    rows = []
+    rows += bench_measure(dev,n)
+    rows += bench_sets(dev,n)
+    rows += bench_configuration(dev,20 if args.realtime else 200)
+    rows += format_stages(dev.get_instrumentation_statistics())
+    rows += bench_allan([1000,10000] if args.realtime else [1000,10000,100000])
+    dev.close_connection()
+
+    width = max(len(r[0]) for r in rows)
+    out = '\n'.join(f'{name:<{width}}  {value}' for name,value in rows)
+    print(out)
+    if args.output!=None:
+        with open(args.output,'w') as fout:
+            fout.write(out+'\n')
@@ -0,0 +1,40 @@
+'''
+Startup-time benchmark: measure the cost of "import sr620py" in a fresh interpreter, and check that the optional heavy dependencies are not loaded
+
+Usage: python benchmarks/import_time.py [max_seconds]
+'''
+import subprocess
+import sys
+import os
+
+HEAVY_MODULES = ['matplotlib','allantools','tqdm','asyncio']
+REPEAT = 5
+DEFAULT_LIMIT = 0.5
+
+CODE = f"""
+import sys, time
+start = time.perf_counter()
+import sr620py
+elapsed = time.perf_counter()-start
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+def measure_import():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable,'-c',CODE],cwd=root,capture_output=True,text=True,check=True).stdout.split()
+    return float(out[0]), (out[1].split(',') if len(out)>1 else [])
+
+if __name__=='__main__':
+    limit = float(sys.argv[1]) if len(sys.argv)>1 else DEFAULT_LIMIT
+    results = [measure_import() for i in range(REPEAT)]
+    best = min(r[0] for r in results)
+    loaded = results[0][1]
+    print(f'import sr620py: best of {REPEAT} = {best*1000:.1f} ms')
+    if loaded:
+        print(f'FAIL: heavy modules loaded at import time: {loaded}')
+        sys.exit(1)
+    if best>limit:
+        print(f'FAIL: import time above the limit of {limit*1000:.0f} ms')
+        sys.exit(1)
+    print('OK')
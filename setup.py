@@ -18,6 +18,9 @@ setup(
           'allantools',
           'matplotlib'
       ],
+  extras_require={
+          'async': ['pyserial-asyncio']
+      },
   classifiers=[
     'Development Status :: 5 - Production/Stable',      # Chose either "3 - Alpha", "4 - Beta" or "5 - Production/Stable" as the current state of your package
 
@@ -1,2 +1,22 @@
 from .sr620 import SR620
-from .sr620constants import *
\ No newline at end of file
+from .sr620manager import SR620Manager
+from .sr620allan import OnlineAllan
+from .sr620simulator import SimulatedSerial, NOISE_WHITE_FM, NOISE_WHITE_PM, NOISE_RANDOM_WALK_FM
+from .sr620recorder import CsvRecorder, NpyRecorder
+from .sr620ringbuffer import SR620RingBuffer
+from .sr620store import SampleStore, StoreRecorder
+from .sr620filter import OutlierFilter, FILTER_DROP, FILTER_FLAG
+from .sr620constants import *
+
+LAZY_IMPORTS = {'AsyncSR620':'.sr620async','SR620Monitor':'.sr620monitor','SR620Server':'.sr620server','SR620Client':'.sr620server'} #optional parts of the library, imported on first use (i.e. asyncio is loaded only by the asynchronous client)
+
+def __getattr__(name):
+    if name in LAZY_IMPORTS:
+        from importlib import import_module
+        value = getattr(import_module(LAZY_IMPORTS[name],__name__),name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+def __dir__():
+    return sorted(set(globals())|set(LAZY_IMPORTS))
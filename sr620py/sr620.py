@@ -9,53 +9,138 @@ Unofficial library to manage a SR620 Universal Time Counter (Stanford Research S
 from .sr620utils import *
 from .sr620exceptions import *
 from .sr620constants import *
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from .sr620transport import SR620Transport
+from .sr620instrument import SR620Instrumentation
+from .sr620registry import open_session, release_session
+from .sr620protocol import *
+from .sr620recorder import open_recorder
+from .sr620ringbuffer import SR620RingBuffer
+from .sr620allan import plan_hybrid_allan, merge_allan
+from .sr620checkpoint import save_checkpoint, load_checkpoint, checkpoint_store_path
+from .sr620store import SampleStore
+from contextlib import contextmanager
 import numpy as np
-import allantools
-import serial
+import threading
+import os
 import time
 import logging
 
 class SR620():
     """Class describing the SR620 device. This class encapsulates all the functions to configure and control the instrument"""
 
-    MODE_DICT = {'time':0,'width':1,'ratio':2,'freq':3,'period':4,'phase':5,'count':6}
-    SOURCE_DICT = {'A':0,'B':1,'REF':2,'RATIO':3}
-    JTTR_DICT = {'STD':0,'ALL':1}
-    ARMM_DICT = {'+-time':0,'+time':1,'1per':2,'1cs':3,'1ds':4,'1s':5,'ext+-time':6,'ext+time':7,'extgate':8,'ext1per':9,'ext1cs':10,'ext1ds':11,'ext1s':12}
-    CLCK_DICT = {'int':0,'ext':1}
-    SIZE_LIST = [1,2,5,1e1,2e1,5e1,1e2,2e2,5e2,1e3,2e3,5e3,1e4,2e4,5e4,1e5,2e5,5e5,1e6,2e6,5e6]
-    CLKF_DICT = {'10mhz':0,'5mhz':1}
-    STAT_DICT = {'mean':0,'jitter':1,'max':2,'min':3}
-    ARMM_TIME = {'1cs':0.01,'1ds':0.1,'1s':1,'ext1cs':0.01,'ext1ds':0.1,'ext1s':1,'1per':0.001}
+    MODE_DICT = MODE_DICT
+    SOURCE_DICT = SOURCE_DICT
+    JTTR_DICT = JTTR_DICT
+    ARMM_DICT = ARMM_DICT
+    CLCK_DICT = CLCK_DICT
+    SIZE_LIST = SIZE_LIST
+    CLKF_DICT = CLKF_DICT
+    STAT_DICT = STAT_DICT
+    ARMM_TIME = ARMM_TIME
+    BDMP_SCALE = BDMP_SCALE
+    BDMP_BLOCK = 4096 #measurements requested with a single BDMP command
+    BDMP_RECORD = 8 #bytes of a single binary record (64 bit two's complement integer, LSB first)
+    CONF_FIELDS = CONF_FIELDS
     DELAY_CONF = 1
+    POLL_CONF = 0.05
 
-    def __init__(self,serial_port_path:str,log_file=None):
+    source = setup_property('source')
+    mode = setup_property('mode')
+    armm = setup_property('armm')
+    size = setup_property('size')
+    jttr = setup_property('jttr')
+    clock = setup_property('clock')
+    clockfr = setup_property('clockfr')
+
+    def __init__(self,serial_port_path:str,log_file=None,*,port=None,baudrate=None,shared=False):
         """
         Constructor.
         Parameters:
         :param serial_port_path (str): path of the serial port on which the device is connected (i.e. "/dev/ttyUSB0")
         :param log_file (str): path to the log file. If nothing is specified, then the output will be the console
+        :param port (serial.Serial): if specified, this already open port (or any object exposing the same interface, i.e. SimulatedSerial) is used instead of opening serial_port_path
+        :param baudrate (int): baud rate chosen on the front panel of the device, or BAUDRATE_AUTO to find it (the fastest baud rate answering is used). If nothing is specified, 9600 is used
+        :param shared (bool): when it is set on True, the connection is shared with the other SR620 objects created with shared=True on the same port in the process: the port is opened (and the device initialized) only by the first one, and closed by the last one
         """
+        self.session = None
         try:
             self.cont = True
+            self.serial_port_path = serial_port_path
+            self.transaction_depth = 0
+            self.acquisition = None
             logging.basicConfig(filename=log_file,level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
-            self.ser = serial.Serial(serial_port_path,9600,timeout=None)
-            self.__execute_command__("STOP;AUTM0;",False)
-            logging.debug('Connection established...')
-            self.__retrieve_parameters__()
+            self.session,created = open_session(serial_port_path,baudrate=baudrate,port=port,shared=shared)
+            if created or self.device_state is None:
+                self.__execute_command__(INIT_COMMAND,False)
+                logging.debug('Connection established...')
+                self.__retrieve_parameters__()
+            else: #the device has already been initialized, and its configuration is known
+                self.setup = self.device_state.copy()
+                logging.debug('Shared connection reused...')
         except:
             self.cont = False
+            if self.session!=None:
+                release_session(self.session)
             logging.error('Error in opening the connection')
             raise #program terminated
+
+    @property
+    def ser(self):
+        """Serial port on which the device is connected"""
+        return self.session.port
+
+    @property
+    def transport(self) -> SR620Transport:
+        """Transport of the connection"""
+        return self.session.transport
+
+    @property
+    def instrumentation(self) -> SR620Instrumentation:
+        """Statistics of the connection"""
+        return self.session.instrumentation
+
+    @property
+    def lock(self):
+        """Lock serializing the access to the device (i.e. with the background acquisition thread, or with the other objects sharing the connection)"""
+        return self.session.lock
+
+    @property
+    def device_state(self) -> Setup:
+        """Configuration last read from the device (shared by all the objects using the connection)"""
+        return self.session.device_state
+
+    @device_state.setter
+    def device_state(self,value:Setup):
+        self.session.device_state = value
+
+    def reconnect(self):
+        """
+        Reopen the connection after an error (i.e. a serial hiccup), and apply again the configuration chosen by the user. When the device was opened on an already open port, the same port is used again.
+        """
+        with self.lock:
+            requested = self.setup.copy()
+            try:
+                self.session.reopen()
+                self.cont = True
+                self.__execute_command__(INIT_COMMAND,False)
+                self.__retrieve_parameters__()
+                self.setup = requested
+                self.__apply_custom_configuration__(print=False)
+                logging.debug('Connection established again...')
+            except:
+                self.cont = False
+                logging.error('Error in opening the connection')
+                raise
             
     def close_connection(self):
         """
-        Close the serial port connection.
+        Close the serial port connection. A shared connection is closed only when all the objects using it are closed.
         """
         try:
-            self.ser.close()
+            self.stop_background_acquisition()
+            if self.session.refs==1:
+                logging.debug(f'Transport statistics: {self.get_transport_statistics()}')
+            release_session(self.session)
         finally:
             logging.debug('...Connection expired!')
         
@@ -67,54 +152,144 @@ class SR620():
         :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
         :return (dict): value returned when needs_response is set on True. The format is a dictionary whose keys are progressive strings 'value_i', with the corresponding returned values (i.e. {'value_0':'10','value_1':'5','value_2':'30'})
         """
-        try:
-            self.ser.timeout = 0.1 #clean the buffer (the only working way...)
-            self.ser.readall()
-            self.ser.timeout = None
-            
-            self.ser.write(command.encode('ASCII')+b'\r')
-            self.ser.flush()
-        except:
-            self.cont = False
-            logging.error("An error has occured while writing on the device. The execution has been concluded!")
-            raise SR620WriteException()
+        response = self.__query__(command,needs_response)
+        if needs_response:
+            with self.instrumentation.measure('parse'):
+                return parse_string_to_dict(response)
 
-        if needs_response: #if a response is needed
+    def __query__(self,command:str,needs_response=True) -> str:
+        """
+        Execute a command on the machine, returning the raw response (decoded by the typed parsers of sr620protocol).
+        Parameters:
+        :param command (str): command that must be executed, according to the format requested by the device ('command(?) param')
+        :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
+        :return (str): response of the device (None when needs_response is set on False)
+        """
+        with self.lock:
+            start = time.perf_counter()
             try:
-                response = self.ser.read_until(b'\r\n').decode('utf-8')
-                return parse_string_to_dict(response)
+                self.transport.send(command)
             except:
                 self.cont = False
-                logging.error("An error has occured while reading from the device. The execution has been concluded!")
-                raise SR620ReadException()
-            
-        
-            
+                logging.error("An error has occured while writing on the device. The execution has been concluded!")
+                raise SR620WriteException()
+
+            response = None
+            if needs_response: #if a response is needed
+                try:
+                    response = self.transport.read_response()
+                except:
+                    self.cont = False
+                    logging.error("An error has occured while reading from the device. The execution has been concluded!")
+                    raise SR620ReadException()
+            self.transport.account(time.perf_counter()-start)
+            return response
+
+    def execute_commands(self,commands:list,*,raw=False) -> list:
+        """
+        Execute several commands on the machine in pipelined mode: all the commands are written on the device before their responses are read.
+        Parameters:
+        :param commands (list): list of commands that must be executed, according to the format requested by the device ('command(?) param')
+        :param raw (bool): when it is set on True, the responses are returned as strings (i.e. to be decoded with parse_responses)
+        :return (list): list of the values returned by the queries (commands containing '?'), in the same format of the ones returned by a single command
+        """
+        try:
+            with self.lock:
+                responses = self.transport.query_many(commands)
+        except:
+            self.cont = False
+            logging.error("An error has occured while executing the commands on the device. The execution has been concluded!")
+            raise SR620ReadException()
+        if raw:
+            return responses
+        return [parse_string_to_dict(response) for response in responses]
+
+    def get_transport_statistics(self) -> dict:
+        """
+        Return the statistics of the commands executed on the device.
+        Parameters:
+        :return (dict): dictionary containing the number of commands executed, the total time spent and the mean time spent per command (in seconds)
+        """
+        return self.transport.get_statistics()
+
+    def get_instrumentation_statistics(self) -> dict:
+        """
+        Return the statistics of the time spent in every stage of the acquisition: writing the commands (write), waiting for the first byte of the response (wait), reading the rest of the response (read), parsing it (parse), saving the measurements (record) and checking them with the outlier filter (filter).
+        Parameters:
+        :return (dict): dictionary whose keys are the names of the stages, while the values are dictionaries containing count, total, mean, min, max, p50 and p99 (times in seconds)
+        """
+        return self.instrumentation.get_statistics()
+
+    def __current_configuration__(self) -> Setup:
+        """
+        Return a copy of the configuration chosen by the user.
+        Parameters:
+        :return (Setup): configuration
+        """
+        return self.setup.copy()
+
     def __generate_configuration_string__(self) -> str:
         """
-        Generate a command string containing the configuration of the device, according to the values set by the user.
+        Generate a command string containing the configuration of the device, according to the values set by the user. Only the fields that differ from the configuration last read from the device are included.
         Parameters:
-        :return (str): string representing the command
+        :return (str): string representing the command (empty when nothing has changed)
         """
         try:
-            cmm = f"SRCE {self.SOURCE_DICT[self.source]}; MODE {self.MODE_DICT[self.mode]}; ARMM {self.ARMM_DICT[self.armm]}; SIZE {self.size}; JTTR {self.JTTR_DICT[self.jttr]}; CLCK {self.CLCK_DICT[self.clock]}; CLKF {self.CLKF_DICT[self.clockfr]};"
-            return cmm
+            return configuration_command(self.__current_configuration__(),self.device_state)
         except:
             self.cont = False
-            logging.error("One (or more) of the parameters does not exist! The execution has been concluded... please, check the documentation!")
-            raise SR620ValueException()
+            raise
 
     def __apply_custom_configuration__(self,*,print=True):
         """
-        Apply the configuration chosen by the user. First of all a command string is generated, and then is executed on the device. Finally, the new configuration is retrieved directly from the device.
+        Apply the configuration chosen by the user. First of all a command string with the changed fields is generated, and then is executed on the device. Finally, the new configuration is read from the device until it matches the requested one (or DELAY_CONF seconds have elapsed).
+        When a configuration transaction is open, nothing is sent until the transaction is closed.
+        Parameters:
+        :param print (bool): when it is set on True, a feedback string is printed
+        """
+        if self.transaction_depth>0:
+            return
+        with self.lock: #the objects sharing the connection cannot change the configuration in the meantime
+            gcs = self.__generate_configuration_string__()
+            if gcs=='':
+                if print: logging.debug('Parameters already set...')
+                return
+            requested = self.__current_configuration__()
+            self.__execute_command__(gcs,False)
+            if print: logging.debug('Setting parameters...')
+            deadline = time.monotonic()+self.DELAY_CONF
+            self.__retrieve_parameters__()
+            while self.device_state!=requested and time.monotonic()<deadline:
+                time.sleep(self.POLL_CONF)
+                self.__retrieve_parameters__()
+            if self.device_state!=requested:
+                logging.warning('The configuration has not been completely applied by the device')
+
+    def __restore_configuration__(self):
+        """
+        On a shared connection, apply again the configuration of this object if another object has changed the configuration of the device (nothing is sent when they already match). It must be called holding the lock, before a measurement.
+        """
+        if self.session.key!=None and self.transaction_depth==0 and self.setup!=self.device_state:
+            logging.debug('Configuration changed by another object on the shared connection, applied again...')
+            self.__apply_custom_configuration__(print=False)
+
+    @contextmanager
+    def configuration(self,*,print=False):
+        """
+        Open a configuration transaction: all the setters called inside the with block are sent to the device with a single command when the block is closed. If an exception occurs inside the block, the changes are discarded.
         Parameters:
         :param print (bool): when it is set on True, a feedback string is printed
         """
-        gcs = self.__generate_configuration_string__()
-        self.__execute_command__(gcs,False)
-        if print: logging.debug('Setting parameters...')
-        time.sleep(self.DELAY_CONF)
-        self.__retrieve_parameters__()
+        self.transaction_depth += 1
+        try:
+            yield self
+        except:
+            self.setup = self.device_state.copy()
+            raise
+        finally:
+            self.transaction_depth -= 1
+        if self.transaction_depth==0:
+            self.set_custom_configuration(print=print)
 
     def set_custom_configuration(self,*,mode=None,source=None,jitter=None,arming=None,size=None,clock=None,clock_frequency=None,print=False):
         """
@@ -130,21 +305,12 @@ class SR620():
         :param print (bool): when it is set on True, a feedback string is printed
         """
         try:
-            if mode!=None: self.mode = mode
-            if source!=None: self.source = source
-            if jitter!=None: self.jttr = jitter
-            if arming!=None: self.armm = arming
-            if clock!=None: self.clock = clock
-            if clock_frequency!=None: self.clockfr = clock_frequency
-            if size!=None: 
-                if (size not in self.SIZE_LIST):
-                    logging.error("The size inserted is not valid! The execution has been concluded... please, check the documentation!")
-                    raise SR620SizeException(self.SIZE_LIST)
-                else:
-                    self.size = size
+            self.setup = update_configuration(self.setup,mode=mode,source=source,jitter=jitter,arming=arming,size=size,clock=clock,clock_frequency=clock_frequency)
             self.__apply_custom_configuration__(print=print)
             if print: logging.info("Current configuration:\n"+str(self))
         except:
+            if self.device_state!=None and self.transaction_depth==0: #the configuration of the object is the one of the device
+                self.setup = self.device_state.copy()
             logging.error("Configuration set terminated with an error")
             
     def set_mode(self,mode:str,*,print=False):
@@ -214,15 +380,10 @@ class SR620():
         """
         Retrieve the parameters set on the device, saving them in the corresponding attributes of the class.
         """
-        res = self.__execute_command__("STUP?;",True)
-        x = int(res['value_7'])
-        self.mode = get_key_from_value(self.MODE_DICT,int(res['value_0']))
-        self.source = get_key_from_value(self.SOURCE_DICT,int(res['value_1']))
-        self.armm = get_key_from_value(self.ARMM_DICT,int(res['value_2']))
-        self.size = self.SIZE_LIST[int(res['value_4'])]
-        self.clock = get_key_from_value(self.CLCK_DICT,get_bit(x,6))
-        self.jttr = get_key_from_value(self.JTTR_DICT,get_bit(x,5))
-        self.clockfr = get_key_from_value(self.CLKF_DICT,get_bit(x,7))
+        response = self.__query__(SETUP_COMMAND)
+        with self.instrumentation.measure('parse'):
+            self.setup = parse_setup(response)
+        self.device_state = self.setup.copy()
 
     def __str__(self):
         """
@@ -230,7 +391,7 @@ class SR620():
         Parameters:
         :return (str): string representing the configuration of the device
         """
-        return f"-------------------------------------\n***SR620 parameters configuration***\nMode: {self.mode}\nSource: {self.source}\nArming: {self.armm}\nNumOfSamples: {self.size}\nTypeOfJitter: {self.jttr}\nClock: {self.clock}\nClockFrequency: {self.clockfr}\n-------------------------------------"
+        return configuration_to_string(self.setup)
     
     def measure(self,stat=STATISTICS_MEAN,*,progress=True) -> float:
         """
@@ -243,83 +404,192 @@ class SR620():
             thread = None
             if (progress and self.armm in self.ARMM_TIME.keys() and self.mode=='freq'):        
                 thread = start_progress(int(self.size),self.ARMM_TIME[self.armm],self)
-            res = self.__execute_command__(f'STOP;AUTM0;MEAS?{self.STAT_DICT[stat]}',True)
+            with self.lock:
+                self.__restore_configuration__()
+                response = self.__query__(measure_command(stat))
             if (thread!=None):
                 thread.join()
-            return float(res['value_0'])
+            with self.instrumentation.measure('parse'):
+                return parse_float(response)
         except:
             logging.error('Measure terminated')
             return None #program not terminated
     
-    def start_measurement_set(self,stat:str,num_meas:int,*,file_path=None,print=True,progress=False) -> list:
+    def iter_measurements(self,stat:str,num_meas=None,*,progress=False):
+        """
+        Generator of measures of the specified statistics on the device. The measurements are yielded as soon as they are read, so that the memory used stays constant and the data can be consumed while it is being collected.
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param num_meas (int): number of measurements to perform. If nothing is specified, the measurements go on until the execution is stopped
+        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :return (generator): generator of (timestamp,value) tuples, where timestamp is the time of the reading in seconds since the epoch (taken from a monotonic clock, so it never goes backwards)
+        """
+        clock = EpochClock()
+        i = 0
+        while self.cont and (num_meas is None or i<num_meas):
+            res = self.measure(stat,progress=progress)
+            i += 1
+            if res is not None:
+                yield (clock.now(),res)
+
+    def iter_measurement_blocks(self,stat:str,block_size:int,num_meas=None,*,progress=False):
+        """
+        Generator of blocks of measures of the specified statistics on the device. Every block is a NumPy array with two columns (timestamp and value), with block_size rows (the last block can be shorter).
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param block_size (int): number of measurements of every block
+        :param num_meas (int): number of measurements to perform. If nothing is specified, the measurements go on until the execution is stopped
+        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :return (generator): generator of NumPy arrays of shape (block_size,2)
+        """
+        block = np.empty((block_size,2),dtype=np.float64)
+        k = 0
+        for ts,res in self.iter_measurements(stat,num_meas,progress=progress):
+            block[k,0] = ts
+            block[k,1] = res
+            k += 1
+            if k==block_size:
+                yield block
+                block = np.empty((block_size,2),dtype=np.float64)
+                k = 0
+        if k>0:
+            yield block[:k]
+
+    def start_measurement_set(self,stat:str,num_meas:int,*,file_path=None,recorder=None,monitor=None,outlier_filter=None,print=True,progress=False) -> list:
         """
         Start a new set of measures of the specified statistics on the device. Return a list of the measurements.
         Parameters:
         :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
         :param num_meas (int): number of measurements to perform
-        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file
-        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file (npy format if the extension is .npy, csv format otherwise)
+        :param recorder (SR620Recorder): if specified, the set of measurements is saved with this recorder, which is closed at the end of the set (used instead of file_path)
+        :param monitor (SR620Monitor): if specified, every measurement is also added to this live monitor (progress and plot)
+        :param outlier_filter (OutlierFilter): if specified, every measurement is checked by this filter: the outliers are discarded (not returned, saved or monitored) or only counted, depending on the mode of the filter
+        :param progress (bool): when it is set on True, a progress bar is shown on the console (the progress bar of the monitor is used instead when a monitor is given)
         :return (list): list of float values corresponding to the measurements
         """
-        if print: logging.debug('Measurement set started...')
-        fout = None
-        lst = []
-        try:
-            if file_path!=None:
-                fout = open(file_path,'w')
-                fout.write(f'timestamp,{stat}\n')
-                fout.flush()
-            for i in range(num_meas):
-                if self.cont:
-                    res = self.measure(stat,progress=progress)
-                    if res is not None:
-                        lst.append(res)
-                        rec = f"{str(datetime.now(ZoneInfo('Europe/Rome')))},{res}"
-                        if print: logging.debug(f'Value read: {res}')
-                        if fout!=None:
-                            fout.write(rec+'\n')
-                            fout.flush()
-            if fout!=None:
-                fout.close()
-                if print: logging.debug(f'Measurement set concluded, file saved in {file_path}')
-        except:
-            logging.error('Measurement set terminated')
-        return lst
+        return self.__run_measurement_set__(stat,num_meas,file_path=file_path,recorder=recorder,monitor=monitor,outlier_filter=outlier_filter,print=print,progress=progress)
 
-    def start_measurement_set_forever(self,stat:str,*,file_path=None,print=True,progress=False) -> list:
+    def start_measurement_set_forever(self,stat:str,*,file_path=None,recorder=None,monitor=None,outlier_filter=None,print=True,progress=False) -> list:
         """
         Start a new set of measures of the specified statistics on the device. Return a list of the measurements.
+        To collect the measurements with a constant memory usage, iter_measurements can be used instead.
         Parameters:
         :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file (npy format if the extension is .npy, csv format otherwise)
+        :param recorder (SR620Recorder): if specified, the set of measurements is saved with this recorder, which is closed at the end of the set (used instead of file_path)
+        :param monitor (SR620Monitor): if specified, every measurement is also added to this live monitor (progress and plot)
+        :param outlier_filter (OutlierFilter): if specified, every measurement is checked by this filter: the outliers are discarded (not returned, saved or monitored) or only counted, depending on the mode of the filter
+        :param progress (bool): when it is set on True, a progress bar is shown on the console (the progress bar of the monitor is used instead when a monitor is given)
+        :return (list): list of float values corresponding to the measurements
+        """
+        return self.__run_measurement_set__(stat,None,file_path=file_path,recorder=recorder,monitor=monitor,outlier_filter=outlier_filter,print=print,progress=progress)
+
+    def __run_measurement_set__(self,stat:str,num_meas,*,file_path=None,recorder=None,monitor=None,outlier_filter=None,print=True,progress=False) -> list:
+        """
+        Run a set of measures on top of iter_measurements, optionally saving them with a recorder.
+        Parameters:
+        :param stat (str): string representing the statistics to measure
+        :param num_meas (int): number of measurements to perform (None to go on until the execution is stopped)
         :param file_path (str): if specified, the set of measurements is saved in the corresponding output file
-        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :param recorder (SR620Recorder): if specified, the set of measurements is saved with this recorder
+        :param monitor (SR620Monitor): if specified, every measurement is also added to this live monitor (progress and plot)
+        :param outlier_filter (OutlierFilter): if specified, every measurement is checked by this filter: the outliers are discarded (not returned, saved or monitored) or only counted, depending on the mode of the filter
+        :param progress (bool): when it is set on True, a progress bar is shown on the console (the progress bar of the monitor is used instead when a monitor is given)
         :return (list): list of float values corresponding to the measurements
         """
         if print: logging.debug('Measurement set started...')
-        fout = None
         lst = []
         try:
-            if file_path!=None:
-                fout = open(file_path,'w')
-                fout.write(f'timestamp,{stat}\n')
-                fout.flush()
-            while self.cont:
-                res = self.measure(stat,progress=progress)
-                if res is not None:
-                    lst.append(res)
-                    rec = f"{str(datetime.now(ZoneInfo('Europe/Rome')))},{res}"
-                    if print: logging.debug(f'Value read: {res}')
-                    if fout!=None:
-                        fout.write(rec+'\n')
-                        fout.flush()
-            if fout!=None:
-                fout.close()
-                if print: logging.debug(f'Measurement set concluded, file saved in {file_path}')
+            if recorder==None and file_path!=None:
+                recorder = open_recorder(file_path,stat)
+            if monitor!=None:
+                monitor.start(num_meas,tau0=self.ARMM_TIME.get(self.armm))
+            for ts,res in self.iter_measurements(stat,num_meas,progress=progress and monitor is None):
+                if outlier_filter!=None:
+                    with self.instrumentation.measure('filter'):
+                        keep = outlier_filter.process(res)
+                    if not keep:
+                        if print: logging.debug(f'Outlier discarded: {res}')
+                        continue
+                lst.append(res)
+                if print: logging.debug(f'Value read: {res}')
+                if recorder!=None:
+                    with self.instrumentation.measure('record'):
+                        recorder.append(res,ts)
+                if monitor!=None:
+                    monitor.update(ts,res)
         except:
             logging.error('Measurement set terminated')
+        finally:
+            if monitor!=None:
+                monitor.stop()
+            if outlier_filter!=None and print:
+                logging.debug(f'Outlier filter: {outlier_filter.get_statistics()}')
+            if recorder!=None:
+                recorder.close()
+                if print: logging.debug(f'Measurement set concluded, file saved in {recorder.file_path}')
         return lst
 
-    def start_measurement_allan_variance(self,n:int,*,f_0=None,command=ALLAN_OVERLAPPING,file_path=None,plot_path=None,progress=True,print=True) -> dict:
+    def start_background_acquisition(self,stat=STATISTICS_MEAN,*,capacity=65536) -> SR620RingBuffer:
+        """
+        Start a dedicated thread measuring the specified statistics on the device continuously, and writing the measurements in a ring buffer. The application can read the buffer (snapshot, wait, drain) while the device keeps measuring. If a background acquisition is already running, it is stopped first.
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param capacity (int): maximum number of measurements kept in the buffer. When the application does not drain the buffer fast enough, the oldest measurements are overwritten
+        :return (SR620RingBuffer): buffer of (timestamp,value) pairs
+        """
+        self.stop_background_acquisition()
+        buffer = SR620RingBuffer(capacity)
+        stop = threading.Event()
+        thread = threading.Thread(target=self.__background_acquisition__,args=(stat,buffer,stop),daemon=True)
+        self.acquisition = (thread,stop,buffer)
+        thread.start()
+        logging.debug('Background acquisition started...')
+        return buffer
+
+    def __background_acquisition__(self,stat:str,buffer:SR620RingBuffer,stop:threading.Event):
+        """
+        Body of the background acquisition thread.
+        Parameters:
+        :param stat (str): string representing the statistics to measure
+        :param buffer (SR620RingBuffer): buffer in which the measurements are written
+        :param stop (threading.Event): event set to stop the acquisition
+        """
+        error = None
+        clock = EpochClock()
+        try:
+            while self.cont and not stop.is_set():
+                res = self.measure(stat,progress=False)
+                if res is None:
+                    error = SR620ReadException()
+                    break
+                buffer.push(clock.now(),res)
+        except Exception as e:
+            error = e
+        finally:
+            if error!=None:
+                logging.error('Background acquisition terminated')
+            buffer.close(error)
+
+    def stop_background_acquisition(self,timeout=None) -> SR620RingBuffer:
+        """
+        Stop the background acquisition, waiting for the measurement in progress to be concluded. The measurements left in the buffer can still be read.
+        Parameters:
+        :param timeout (float): maximum time to wait for the thread (in seconds). If nothing is specified, there is no limit
+        :return (SR620RingBuffer): buffer of the stopped acquisition (None if no acquisition was running)
+        """
+        if self.acquisition is None:
+            return None
+        thread,stop,buffer = self.acquisition
+        stop.set()
+        if thread is not threading.current_thread():
+            thread.join(timeout)
+        self.acquisition = None
+        logging.debug(f'Background acquisition concluded: {buffer.get_statistics()}')
+        return buffer
+
+    def start_measurement_allan_variance(self,n:int,*,f_0=None,command=ALLAN_OVERLAPPING,file_path=None,plot_path=None,online=None,monitor=None,outlier_filter=None,checkpoint_path=None,checkpoint_every=100,retries=0,retry_delay=5.0,progress=True,print=True) -> dict:
         """
         Start a set of measurements corresponding to the Allan Variance for an increasing averaging time. Return a dictionary of the measurements.
         Parameters:
@@ -328,50 +598,143 @@ class SR620():
         :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
         :param file_path (str): if specified, the set of measurements is saved in the corresponding output file
         :param plot_path (str): if specified, the plot is saved in the corresponding output file
-        :param progress (bool): when it is set on True, a progress bar is shown on the console
-        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Variances
+        :param online (OnlineAllan): if specified, every measurement is also added to this estimator, whose results can be queried while the set is running
+        :param monitor (SR620Monitor): if specified, every measurement is also added to this live monitor (progress and plot)
+        :param outlier_filter (OutlierFilter): if specified, every measurement is checked by this filter: the outliers are discarded and measured again (the run still collects n measurements) or only counted, depending on the mode of the filter. The number of outliers is saved in the checkpoints
+        :param checkpoint_path (str): if specified, the parameters of the run are saved in the corresponding json file every checkpoint_every measurements, and the new measurements are appended to a sample store next to it (checkpoint_path+'.sr620'), so that an interrupted run can be continued with resume_allan_variance
+        :param checkpoint_every (int): number of measurements between two checkpoints
+        :param retries (int): number of attempts to reconnect to the device after an error, before the run is interrupted
+        :param retry_delay (float): time to wait (in seconds) before every attempt to reconnect
+        :param progress (bool): when it is set on True, a progress bar is shown on the console (the progress bar of the monitor is used instead when a monitor is given)
+        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Variances. If the connection is lost, the Allan Variance is computed on the measurements performed (empty if they are too few)
         """
-        thread = None
-        dct = {}
-        lst = []
         try:
-            if (progress):        
-                thread = start_progress(n,self.ARMM_TIME[self.armm],self)
-            fout = None
-            if file_path!=None:
-                fout = open(file_path,'w')
-                fout.write(f'averaging time,allan deviation\n')
-                fout.flush()
             self.set_custom_configuration( #mode set to frequency and size set to 1
                 mode=MODE_FREQUENCY,
                 size=1
             )
+            if checkpoint_path!=None and os.path.exists(checkpoint_store_path(checkpoint_path)):
+                os.remove(checkpoint_store_path(checkpoint_path)) #measurements of a previous run
+        except:
+            logging.error('Measurement set terminated')
+            return {}
+        state = {
+            'n':n,
+            'f_0':f_0,
+            'command':command,
+            'setup':dict(self.setup.items()),
+            'started':time.time(),
+            'outliers':0,
+            'samples':[],
+        }
+        return self.__run_allan_variance__(state,file_path=file_path,plot_path=plot_path,online=online,monitor=monitor,outlier_filter=outlier_filter,checkpoint_path=checkpoint_path,checkpoint_every=checkpoint_every,retries=retries,retry_delay=retry_delay,progress=progress,print=print)
 
-            for i in range(n):
-                if self.cont:
-                    res = self.measure(STATISTICS_MEAN,progress=False)
-                    if res is not None:
-                        if f_0 is not None:
-                            res = (res-f_0)/f_0
-                        lst.append(res)
-
-            if f_0 is None: #if no nominal frequency is given, we use the mean of the measurements
-                mean = sum(lst)/len(lst)
-                for i in range(len(lst)):
-                    lst[i] = (lst[i]-mean)/mean
-            
-            a = allantools.Dataset(data=lst,rate=1/self.ARMM_TIME[self.armm],data_type='freq')
-            a.compute(command) #compute allan variance
-
-            for i in range(len(a.out['taus'])):
-                dct[float(a.out['taus'][i])] = float(a.out['stat'][i])
-                if fout!=None:
-                    rec = f"{float(a.out['taus'][i])},{float(a.out['stat'][i])}"
-                    fout.write(rec+'\n')
-                    fout.flush()
-
-            if fout!=None:
-                fout.close()
+    def resume_allan_variance(self,checkpoint_path:str,*,file_path=None,plot_path=None,online=None,monitor=None,outlier_filter=None,checkpoint_every=100,retries=0,retry_delay=5.0,progress=True,print=True) -> dict:
+        """
+        Continue an Allan Variance run interrupted after a checkpoint: the connection is opened again if it has been lost, the configuration saved in the checkpoint is applied, the missing measurements are performed and the Allan Variance is computed on the whole set.
+        Parameters:
+        :param checkpoint_path (str): path of the checkpoint saved by start_measurement_allan_variance (it is updated while the run goes on)
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file
+        :param plot_path (str): if specified, the plot is saved in the corresponding output file
+        :param online (OnlineAllan): if specified, every new measurement is also added to this estimator
+        :param monitor (SR620Monitor): if specified, every new measurement is also added to this live monitor (progress and plot)
+        :param outlier_filter (OutlierFilter): if specified, every new measurement is checked by this filter (its window is filled again from the new measurements)
+        :param checkpoint_every (int): number of measurements between two checkpoints
+        :param retries (int): number of attempts to reconnect to the device after an error, before the run is interrupted
+        :param retry_delay (float): time to wait (in seconds) before every attempt to reconnect
+        :param progress (bool): when it is set on True, a progress bar is shown on the console (the progress bar of the monitor is used instead when a monitor is given)
+        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Variances (empty if the run has been interrupted again)
+        """
+        try:
+            state = load_checkpoint(checkpoint_path)
+            with SampleStore(checkpoint_store_path(checkpoint_path),mode='r') as store: #the store may also hold measurements saved after the last json
+                state['samples'] = store.range().tolist()
+            if not self.cont: #the connection has been lost by the interrupted run
+                self.reconnect()
+            self.setup = Setup(**state['setup'])
+            self.__apply_custom_configuration__(print=print)
+        except:
+            logging.error('Measurement set terminated')
+            return {}
+        if print: logging.debug(f"Allan Variance run resumed: {len(state['samples'])}/{state['n']} measurements already performed")
+        return self.__run_allan_variance__(state,file_path=file_path,plot_path=plot_path,online=online,monitor=monitor,outlier_filter=outlier_filter,checkpoint_path=checkpoint_path,checkpoint_every=checkpoint_every,retries=retries,retry_delay=retry_delay,progress=progress,print=print)
+
+    def __run_allan_variance__(self,state:dict,*,file_path,plot_path,online,monitor,outlier_filter,checkpoint_path,checkpoint_every,retries,retry_delay,progress,print) -> dict:
+        """
+        Perform the measurements of an Allan Variance run which are still missing, then compute the Allan Variance.
+        Parameters:
+        :param state (dict): state of the run (number of measurements n, f_0, command, setup, list of [timestamp,value] samples), updated with the new measurements
+        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Variances (empty if the run has been interrupted)
+        """
+        thread = None
+        store = None
+        dct = {}
+        samples = state['samples']
+        n = state['n']
+        f_0 = state['f_0']
+        try:
+            if (progress and monitor is None): #the monitor has its own progress bar
+                thread = start_progress(n-len(samples),self.ARMM_TIME[self.armm],self)
+            if monitor!=None:
+                monitor.start(n-len(samples),tau0=self.ARMM_TIME[self.armm])
+            if checkpoint_path!=None:
+                store = SampleStore(checkpoint_store_path(checkpoint_path))
+            attempts = 0
+            discarded = 0
+            last_checkpoint = len(samples)
+            clock = EpochClock()
+            while len(samples)<n:
+                res = self.measure(STATISTICS_MEAN,progress=False) if self.cont else None
+                if res is not None:
+                    attempts = 0
+                    if outlier_filter is not None:
+                        with self.instrumentation.measure('filter'):
+                            keep = outlier_filter.process(res)
+                        if outlier_filter.last_outlier:
+                            state['outliers'] = state.get('outliers',0)+1
+                        if not keep:
+                            if print: logging.debug(f'Outlier discarded: {res}')
+                            continue
+                    samples.append([clock.now(),res])
+                    if online is not None:
+                        online.add(res)
+                    if monitor is not None:
+                        monitor.update(samples[-1][0],res)
+                    if store!=None and len(samples)-last_checkpoint>=checkpoint_every:
+                        self.__save_allan_checkpoint__(checkpoint_path,state,store,last_checkpoint)
+                        last_checkpoint = len(samples)
+                    continue
+                if self.cont and discarded<n: #measurement discarded, the connection is still working
+                    discarded += 1
+                    continue
+                if store!=None and last_checkpoint<len(samples):
+                    self.__save_allan_checkpoint__(checkpoint_path,state,store,last_checkpoint)
+                    last_checkpoint = len(samples)
+                if attempts>=retries:
+                    logging.error(f'Connection lost after {len(samples)}/{n} measurements, the Allan Variance is computed on the measurements performed')
+                    break
+                attempts += 1
+                logging.warning(f'Connection lost, attempt {attempts}/{retries} to reconnect in {retry_delay} s')
+                time.sleep(retry_delay)
+                try:
+                    self.reconnect()
+                except:
+                    pass
+            if store!=None and last_checkpoint<len(samples):
+                self.__save_allan_checkpoint__(checkpoint_path,state,store,last_checkpoint)
+            if outlier_filter is not None and print:
+                logging.debug(f"Outlier filter: {outlier_filter.get_statistics()}, {state.get('outliers',0)} outliers in the whole run")
+
+            if len(samples)<3:
+                raise SR620ReadException()
+            lst = np.array([value for ts,value in samples],dtype=np.float64)
+            if f_0 is not None:
+                lst = (lst-f_0)/f_0
+            a = compute_allan(lst,1/self.ARMM_TIME[self.armm],state['command'],normalized=f_0 is not None) #compute allan variance
+            dct = allan_to_dict(a)
+
+            if file_path!=None:
+                save_allan(a,file_path)
                 if print: logging.debug(f'Measurement set concluded, file saved in {file_path}')
 
             if plot_path!=None:
@@ -380,4 +743,161 @@ class SR620():
 
         except:
             logging.error('Measurement set terminated')
-        return dct
\ No newline at end of file
+            if checkpoint_path!=None and len(samples)>0:
+                logging.error(f'The measurements performed are saved in {checkpoint_path}, the run can be continued with resume_allan_variance')
+        finally:
+            if monitor!=None:
+                monitor.stop()
+            if store!=None:
+                store.close()
+        return dct
+
+    def __save_allan_checkpoint__(self,path:str,state:dict,store:SampleStore,start:int):
+        """
+        Save the state of an Allan Variance run in a checkpoint: the measurements performed since the previous checkpoint are appended to the sample store, then the parameters of the run are saved in the json file (so the cost does not grow with the length of the run).
+        Parameters:
+        :param path (str): path of the checkpoint
+        :param state (dict): state of the run
+        :param store (SampleStore): sample store of the checkpoint
+        :param start (int): number of measurements already saved in the store
+        """
+        store.append_many(np.array(state['samples'][start:],dtype=np.float64))
+        store.flush()
+        state['updated'] = time.time()
+        save_checkpoint(path,{key:value for key,value in state.items() if key!='samples'})
+        logging.debug(f"Checkpoint saved: {len(state['samples'])}/{state['n']} measurements")
+
+    def start_hybrid_allan_variance(self,max_tau:float,*,f_0=None,command=ALLAN_OVERLAPPING,raw_max_m=1000,min_terms=10,file_path=None,plot_path=None,progress=True,print=True) -> dict:
+        """
+        Start an Allan Variance acquisition using the statistics computed by the device for the long averaging times. The short averaging times are computed from single-shot measurements (size 1), while the long ones are computed from the means of N gates (size N) measured by the device, so that only one value every N gates is transferred on the serial link. The two curves are merged into a single one (see plan_hybrid_allan).
+        The device is stopped and rearmed between two blocks, so a small dead time is added to every block.
+        Parameters:
+        :param max_tau (float): largest averaging time (in seconds)
+        :param f_0 (int): nominal frequency. If no value is given, the nominal frequency will be the mean of the single-shot measurements
+        :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING
+        :param raw_max_m (int): largest averaging factor computed from the single-shot measurements
+        :param min_terms (int): minimum number of terms of the largest averaging time of every stage
+        :param file_path (str): if specified, the result is saved in the corresponding output file
+        :param plot_path (str): if specified, the plot is saved in the corresponding output file
+        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Deviations
+        """
+        dct = {}
+        try:
+            if command not in (ALLAN_CLASSIC,ALLAN_OVERLAPPING): #the modified variance needs the single-shot measurements at every averaging time
+                logging.error("The hybrid acquisition is available only for the classic and the overlapping Allan Variance! The execution has been concluded... please, check the documentation!")
+                raise SR620ValueException()
+            if self.armm not in self.ARMM_TIME.keys():
+                logging.error("The hybrid acquisition needs an arming mode with a fixed gate time! The execution has been concluded... please, check the documentation!")
+                raise SR620ValueException()
+            tau0 = self.ARMM_TIME[self.armm]
+            plan = plan_hybrid_allan(tau0,max_tau,raw_max_m=raw_max_m,min_terms=min_terms)
+            if print: logging.debug(f'Hybrid Allan plan: {plan}')
+
+            raw = self.__collect_means__(1,plan['raw'],tau0,progress)
+            if len(raw)<2:
+                raise SR620ReadException()
+            if f_0 is None:
+                f_0 = float(np.mean(raw))
+            dct = allan_to_dict(compute_allan((raw-f_0)/f_0,1/tau0,command))
+            if plan['blocks']>0 and self.cont:
+                blocks = self.__collect_means__(plan['size'],plan['blocks'],tau0,progress)
+                if len(blocks)>=3:
+                    long = allan_to_dict(compute_allan((blocks-f_0)/f_0,1/(plan['size']*tau0),command))
+                    dct = merge_allan(dct,long,plan['split_tau'])
+
+            if file_path!=None:
+                save_allan(dct,file_path)
+                if print: logging.debug(f'Measurement set concluded, file saved in {file_path}')
+
+            if plot_path!=None:
+                save_plot(dct,plot_path)
+                if print: logging.debug(f'Plot created, file saved in {plot_path}')
+
+        except:
+            logging.error('Measurement set terminated')
+        return dct
+
+    def __collect_means__(self,size:int,num_meas:int,tau0:float,progress:bool) -> np.ndarray:
+        """
+        Set the frequency mode and the number of samples, and collect a set of mean measurements.
+        Parameters:
+        :param size (int): number of samples averaged by the device for every measurement
+        :param num_meas (int): number of measurements to perform
+        :param tau0 (float): gate time of a single sample (in seconds)
+        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :return (np.ndarray): array of the measurements (truncated if the acquisition is interrupted)
+        """
+        self.set_custom_configuration(mode=MODE_FREQUENCY,size=size)
+        thread = start_progress(num_meas,size*tau0,self) if progress else None
+        out = np.empty(num_meas,dtype=np.float64)
+        k = 0
+        for i in range(num_meas):
+            if not self.cont:
+                break
+            res = self.measure(STATISTICS_MEAN,progress=False)
+            if res is not None:
+                out[k] = res
+                k += 1
+        if thread!=None:
+            thread.join()
+        return out[:k]
+
+    def start_binary_dump(self,num_meas:int,*,file_path=None,print=True) -> np.ndarray:
+        """
+        Start a high-rate set of single-shot measurements, using the binary dump output of the device (BDMP). The records are read in large chunks and decoded directly into a NumPy array, without a request/response round trip for every sample. Return the array of the measurements.
+        Parameters:
+        :param num_meas (int): number of measurements to perform
+        :param file_path (str): if specified, the array of measurements is saved in the corresponding output file (.npy format)
+        :return (np.ndarray): array of float values corresponding to the measurements (truncated if the acquisition is interrupted)
+        """
+        if print: logging.debug('Binary dump started...')
+        out = np.empty(num_meas,dtype=np.float64)
+        pos = 0
+        try:
+            if self.mode not in self.BDMP_SCALE.keys():
+                logging.error("The binary dump is not available for the current mode! The execution has been concluded... please, check the documentation!")
+                raise SR620ValueException()
+            if self.size!=1: #binary dump works on single-shot measurements
+                self.set_custom_configuration(size=1)
+            scale = self.BDMP_SCALE[self.mode]
+            gate = None
+            if self.mode=='freq': #the frequency records depend on the gate time
+                if self.armm not in self.ARMM_TIME.keys() or self.armm=='1per':
+                    logging.error("The binary dump of frequency measurements needs a gate of fixed length! The execution has been concluded... please, check the documentation!")
+                    raise SR620ValueException()
+                gate = self.ARMM_TIME[self.armm]
+            while pos<num_meas and self.cont:
+                k = min(self.BDMP_BLOCK,num_meas-pos)
+                with self.lock:
+                    self.__restore_configuration__()
+                    self.__execute_command__(f'STOP;AUTM0;BDMP {k}',False)
+                    buf = self.__read_bytes__(k*self.BDMP_RECORD)
+                decode_binary_dump(buf,scale,gate=gate,out=out[pos:pos+k])
+                pos += k
+                if print: logging.debug(f'Records read: {pos}/{num_meas}')
+            if file_path!=None:
+                np.save(file_path,out[:pos])
+                if print: logging.debug(f'Binary dump concluded, file saved in {file_path}')
+        except:
+            logging.error('Binary dump terminated')
+        return out[:pos]
+
+    def __read_bytes__(self,num_bytes:int) -> bytes:
+        """
+        Read a fixed number of raw bytes from the device.
+        Parameters:
+        :param num_bytes (int): number of bytes to read
+        :return (bytes): bytes read from the device
+        """
+        try:
+            buf = self.transport.read_bytes(num_bytes)
+        except:
+            self.cont = False
+            logging.error("An error has occured while reading from the device. The execution has been concluded!")
+            raise SR620ReadException()
+        if len(buf)!=num_bytes:
+            self.cont = False
+            logging.error("The device returned an incomplete binary record. The execution has been concluded!")
+            raise SR620ReadException()
+        return buf
@@ -0,0 +1,231 @@
+'''
+Online Allan Variance estimator of the SR620 library: the Allan deviations are updated as each sample arrives, at octave-spaced averaging times
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620constants import *
+from .sr620protocol import SIZE_LIST
+import numpy as np
+import threading
+import math
+
+class OnlineAllan():
+    """Class describing an incremental estimator of the classic, overlapping and modified Allan deviations of a set of frequency measurements. The averaging times are tau0*m, with m=1,2,4,...,max_m. The memory used is bounded by max_m, and the results can be queried at any time.
+    The measurements are collected in a buffer of batch values, and the sums of every averaging time are updated with vectorized operations when the buffer is full (or the results are queried): adding a measurement costs O(1) in Python, while the update costs O(log max_m) numpy operations for every batch. The estimator can be queried from another thread while the measurements are added"""
+
+    BATCH = 1024 #default number of measurements collected before the sums are updated
+
+    def __init__(self,tau0:float,*,f_0=None,max_m=4096,batch=BATCH):
+        """
+        Constructor.
+        Parameters:
+        :param tau0 (float): averaging time of a single measurement (in seconds)
+        :param f_0 (float): nominal frequency. If no value is given, the nominal frequency will be the mean of the measurements
+        :param max_m (int): maximum averaging factor (the largest averaging time is tau0*max_m). It is rounded up to a power of 2
+        :param batch (int): number of measurements collected before the sums are updated
+        """
+        self.tau0 = tau0
+        self.f_0 = f_0
+        self.ms = [2**k for k in range(int(math.ceil(math.log2(max(max_m,1))))+1)]
+        self.size = 3*self.ms[-1]+1 #phase points needed by the largest averaging time
+        self.phase = np.zeros(1) #last phase points (at most size), the last one has index n (the first one is 0)
+        self.n = 0
+        self.count = 0 #number of measurements
+        self.ref = f_0 #reference subtracted from the measurements, to keep the phase small
+        self.total = 0.0 #sum of the measurements minus the reference
+        self.sums = {cmd:np.zeros(len(self.ms)) for cmd in (ALLAN_CLASSIC,ALLAN_OVERLAPPING,ALLAN_MODIFIED)}
+        self.terms = {cmd:np.zeros(len(self.ms),dtype=np.int64) for cmd in (ALLAN_CLASSIC,ALLAN_OVERLAPPING,ALLAN_MODIFIED)}
+        self.pending = np.empty(max(int(batch),1)) #measurements not yet added to the sums
+        self.num_pending = 0
+        self.lock = threading.Lock()
+
+    def add(self,value:float):
+        """
+        Add a frequency measurement to the estimator. The sums are updated every batch measurements.
+        Parameters:
+        :param value (float): frequency measurement
+        """
+        with self.lock:
+            if self.ref is None:
+                self.ref = value
+            self.pending[self.num_pending] = value
+            self.num_pending += 1
+            if self.num_pending==len(self.pending):
+                self.__flush__()
+
+    def add_many(self,values):
+        """
+        Add several frequency measurements to the estimator.
+        Parameters:
+        :param values (iterable): frequency measurements
+        """
+        values = np.asarray(values,dtype=np.float64).ravel()
+        if len(values)==0:
+            return
+        with self.lock:
+            self.__flush__()
+            if self.ref is None:
+                self.ref = float(values[0])
+            chunk = max(len(self.pending),self.size) #bounds the memory of the temporary arrays
+            for i in range(0,len(values),chunk):
+                self.__update__(values[i:i+chunk])
+
+    def flush(self):
+        """
+        Update the sums with the measurements collected in the buffer.
+        """
+        with self.lock:
+            self.__flush__()
+
+    def __flush__(self):
+        """
+        Update the sums with the measurements collected in the buffer. The caller must hold the lock of the estimator.
+        """
+        if self.num_pending>0:
+            values = self.pending[:self.num_pending].copy()
+            self.num_pending = 0
+            self.__update__(values)
+
+    def __update__(self,values:np.ndarray):
+        """
+        Update the sums with a block of measurements. The phase points of the block are appended to the last ones, then the new second differences of every averaging time are computed at once.
+        Parameters:
+        :param values (np.ndarray): frequency measurements
+        """
+        y = values-self.ref
+        if self.f_0 is not None:
+            y = y/self.f_0
+        self.count += len(y)
+        self.total += float(y.sum())
+        x = np.concatenate((self.phase,self.phase[-1]+np.cumsum(y*self.tau0)))
+        base = self.n-(len(self.phase)-1) #index of the first phase point of x
+        first = self.n+1 #index of the first new phase point
+        last = self.n+len(y)
+        for k,m in enumerate(self.ms):
+            lo = max(first,2*m)-2*m #first index of the new second differences (d[i] = x[i+2m]-2x[i+m]+x[i])
+            hi = last-2*m
+            if hi<lo:
+                break
+            start = max(0,lo-m+1) #the windows of the modified deviation also need the previous m-1 second differences
+            j = np.arange(start-base,hi-base+1)
+            d = x[j+2*m]-2*x[j+m]+x[j]
+            new = d[lo-start:]
+            self.sums[ALLAN_OVERLAPPING][k] += new@new
+            self.terms[ALLAN_OVERLAPPING][k] += len(new)
+            classic = new[(-lo)%m::m] #first index divisible by m
+            self.sums[ALLAN_CLASSIC][k] += classic@classic
+            self.terms[ALLAN_CLASSIC][k] += len(classic)
+            first_window = max(lo,m-1) #a window of m second differences ends on every index from m-1 on
+            if first_window<=hi:
+                c = np.concatenate(([0.0],np.cumsum(d)))
+                ends = np.arange(first_window,hi+1)-start
+                windows = c[ends+1]-c[ends+1-m]
+                self.sums[ALLAN_MODIFIED][k] += windows@windows
+                self.terms[ALLAN_MODIFIED][k] += len(windows)
+        self.phase = x[-self.size:]
+        self.n = last
+
+    def result(self,command=ALLAN_OVERLAPPING) -> dict:
+        """
+        Return the current Allan deviations.
+        Parameters:
+        :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+        :return (dict): dictionary whose keys are the averaging times, while the values are the corresponding Allan deviations (only the averaging times with at least two terms are included)
+        """
+        with self.lock:
+            self.__flush__()
+            scale = 1.0
+            if self.f_0 is None: #normalize with respect to the mean of the measurements
+                mean = self.ref+self.total/self.count if self.count>0 else 0.0
+                scale = 1.0/mean if mean!=0 else 1.0
+            dct = {}
+            for k,m in enumerate(self.ms):
+                terms = self.terms[command][k]
+                if terms<=1:
+                    continue
+                tau = m*self.tau0
+                var = self.sums[command][k]/(2.0*terms*tau*tau)
+                if command==ALLAN_MODIFIED:
+                    var = var/(m*m)
+                dct[float(tau)] = float(math.sqrt(var)*scale)
+            return dct
+
+    def get_state(self) -> dict:
+        """
+        Return the state of the estimator, so that it can be saved (i.e. in a json file) and restored with from_state.
+        Parameters:
+        :return (dict): dictionary containing the state of the estimator
+        """
+        with self.lock:
+            self.__flush__()
+            return {
+                'tau0':self.tau0,'f_0':self.f_0,'max_m':self.ms[-1],
+                'phase':self.phase.tolist(),'n':self.n,'count':self.count,'ref':self.ref,'total':self.total,
+                'sums':{cmd:v.tolist() for cmd,v in self.sums.items()},
+                'terms':{cmd:v.tolist() for cmd,v in self.terms.items()},
+                'batch':len(self.pending),
+            }
+
+    @classmethod
+    def from_state(cls,state:dict):
+        """
+        Restore an estimator from its state.
+        Parameters:
+        :param state (dict): dictionary returned by get_state
+        :return (OnlineAllan): estimator
+        """
+        est = cls(state['tau0'],f_0=state['f_0'],max_m=state['max_m'],batch=state.get('batch',cls.BATCH))
+        est.phase = np.array(state['phase'])
+        est.n = state['n']
+        est.count = state['count']
+        est.ref = state['ref']
+        est.total = state['total']
+        est.sums = {cmd:np.array(v) for cmd,v in state['sums'].items()}
+        est.terms = {cmd:np.array(v,dtype=np.int64) for cmd,v in state['terms'].items()}
+        return est
+
+def plan_hybrid_allan(tau0:float,max_tau:float,*,raw_max_m=1000,min_terms=10,sizes=SIZE_LIST) -> dict:
+    """
+    Plan an Allan Variance acquisition in two stages: single-shot measurements (size 1), transferred one by one, for the short averaging times, and measurements averaged by the device (size N, mean of N gates) for the long ones.
+    The block size N is the largest available size not greater than raw_max_m, so that the averaging times of the two stages overlap.
+    Parameters:
+    :param tau0 (float): gate time of a single measurement (in seconds)
+    :param max_tau (float): largest averaging time (in seconds)
+    :param raw_max_m (int): largest averaging factor computed from the single-shot measurements
+    :param min_terms (int): minimum number of terms (second differences) of the largest averaging time of every stage
+    :param sizes (list): block sizes available on the device
+    :return (dict): dictionary containing the number of single-shot measurements ('raw'), the block size ('size'), the number of blocks ('blocks'), the averaging time at which the second stage takes over ('split_tau'), the number of values transferred ('transfers', against 'transfers_raw' for an acquisition using only single-shot measurements) and the estimated duration in seconds ('duration')
+    """
+    max_m = max(1,int(math.ceil(max_tau/tau0)))
+    raw_max_m = min(raw_max_m,max_m)
+    size = int(max([s for s in sizes if s<=raw_max_m] or [1]))
+    raw = raw_max_m*(min_terms+1)
+    blocks = 0
+    if max_m>raw_max_m and size>1: #the long averaging times are computed by the device
+        blocks = int(math.ceil(max_m/size))*(min_terms+1)
+    else:
+        raw = max_m*(min_terms+1)
+        size = 1
+    return {
+        'raw':raw,
+        'size':size,
+        'blocks':blocks,
+        'split_tau':float(size*tau0) if blocks>0 else float('inf'),
+        'transfers':raw+blocks,
+        'transfers_raw':max_m*(min_terms+1),
+        'duration':float((raw+blocks*size)*tau0),
+    }
+
+def merge_allan(short:dict,long:dict,split_tau:float) -> dict:
+    """
+    Merge two Allan deviation curves: the points of the first one below split_tau and the points of the second one from split_tau on.
+    Parameters:
+    :param short (dict): Allan deviations of the short averaging times (computed from single-shot measurements)
+    :param long (dict): Allan deviations of the long averaging times (computed from the measurements averaged by the device)
+    :param split_tau (float): averaging time at which the second curve takes over
+    :return (dict): dictionary whose keys are the averaging times (sorted), while the values are the corresponding Allan deviations
+    """
+    dct = {tau:dev for tau,dev in short.items() if tau<split_tau*(1-1e-9)}
+    dct.update({tau:dev for tau,dev in long.items() if tau>=split_tau*(1-1e-9)})
+    return dict(sorted(dct.items()))
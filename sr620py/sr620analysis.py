@@ -0,0 +1,152 @@
+'''
+Batch analysis of the SR620 library: Allan deviations of many recorded files (channels and time ranges) computed in parallel in a process pool, with a cache of the results
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620utils import compute_allan, allan_to_dict
+from .sr620constants import *
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from datetime import datetime
+import numpy as np
+import hashlib
+import json
+import os
+import logging
+
+CACHE_VERSION = 1
+ALLAN_COMMANDS = (ALLAN_CLASSIC,ALLAN_OVERLAPPING,ALLAN_MODIFIED)
+
+def load_recording(file_path:str) -> tuple:
+    """
+    Load a file recorded by the library: csv files of the measurement sets or of the manager (one channel per column), npy files of the recorders and sample stores (.sr620).
+    Parameters:
+    :param file_path (str): path of the file
+    :return (tuple): array of the timestamps (in seconds since the epoch) and dictionary whose keys are the names of the channels, while the values are the arrays of the corresponding values
+    """
+    if file_path.endswith('.sr620'):
+        from .sr620store import SampleStore
+        with SampleStore(file_path,mode='r') as store:
+            data = np.array(store.range())
+        return data[:,0],{'value':data[:,1]}
+    if file_path.endswith('.npy'):
+        data = np.load(file_path)
+        return data[:,0],{'value':data[:,1]}
+    with open(file_path) as fin:
+        names = fin.readline().strip().split(',')[1:]
+        rows = [line.strip().split(',') for line in fin if line.strip()!='']
+    ts = np.array([datetime.fromisoformat(row[0]).timestamp() for row in rows],dtype=np.float64)
+    values = np.array([row[1:] for row in rows],dtype=np.float64).reshape(len(rows),len(names))
+    return ts,{name:values[:,k] for k,name in enumerate(names)}
+
+def result_key(values:np.ndarray,rate:float,command:str,f_0) -> str:
+    """
+    Return the key of a result in the cache: hash of the values and of the parameters of the computation.
+    Parameters:
+    :param values (np.ndarray): values analysed
+    :param rate (float): sampling rate of the values
+    :param command (str): kind of Allan Variance
+    :param f_0 (float): nominal frequency (None to normalize with respect to the mean)
+    :return (str): key of the result
+    """
+    h = hashlib.sha256(np.ascontiguousarray(values,dtype='<f8').data)
+    h.update(json.dumps([CACHE_VERSION,float(rate),command,f_0]).encode('ASCII'))
+    return h.hexdigest()
+
+def compute_allan_shared(name:str,length:int,start:int,end:int,rate:float,command:str,f_0) -> dict:
+    """
+    Compute the Allan Deviation of a slice of an array kept in shared memory (function executed by the workers of the process pool).
+    Parameters:
+    :param name (str): name of the shared memory block
+    :param length (int): number of values in the block
+    :param start (int): first value of the slice
+    :param end (int): value after the last one of the slice
+    :param rate (float): sampling rate of the values
+    :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+    :param f_0 (float): nominal frequency. If no value is given, the values are normalized with respect to their mean
+    :return (dict): dictionary whose keys are the averaging times, while the values are the corresponding Allan Deviations
+    """
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        values = np.ndarray((length,),dtype=np.float64,buffer=shm.buf)[start:end]
+        if f_0 is not None:
+            values = (values-f_0)/f_0
+        res = allan_to_dict(compute_allan(values,rate,command,normalized=f_0 is not None))
+        del values #the block cannot be closed while a view of it exists
+        return res
+    finally:
+        shm.close()
+
+def analyze_recordings(file_paths:list,*,tau0=None,commands=ALLAN_COMMANDS,ranges=None,f_0=None,processes=None,cache_dir=None,print=True) -> list:
+    """
+    Compute the Allan Deviations of several recorded files, for every channel, time range and kind of Allan Variance, in parallel in a process pool. The values are passed to the workers in shared memory (without copying them), and the results are cached by hash of the values and of the parameters, so that repeated analyses are not computed again.
+    Parameters:
+    :param file_paths (list): paths of the files (see load_recording)
+    :param tau0 (float): averaging time of a single measurement (in seconds). If nothing is specified, the median interval between the timestamps of every file is used
+    :param commands (list): kinds of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+    :param ranges (list): list of (start,end) time ranges (in seconds since the epoch, end excluded, None for no limit) analysed separately. If nothing is specified, the whole files are analysed
+    :param f_0 (float): nominal frequency. If no value is given, the values of every range are normalized with respect to their mean
+    :param processes (int): number of worker processes. If nothing is specified, the number of processors is used
+    :param cache_dir (str): if specified, the results are saved in (and read from) this directory
+    :return (list): list of dictionaries, one for every file, channel, range and kind of Allan Variance, containing the keys 'file','channel','range','command','tau0','samples','cached','result' (dictionary whose keys are the averaging times, while the values are the corresponding Allan Deviations) and 'error' (None, or the description of the error which stopped the computation; a file which cannot be loaded gets a single dictionary with channel None). The missing values (NaN, i.e. the gaps of the manager tables) are dropped before the computation, so the remaining ones are treated as contiguous
+    """
+    if cache_dir!=None:
+        os.makedirs(cache_dir,exist_ok=True)
+    blocks = []
+    results = []
+    futures = []
+    try:
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            for file_path in file_paths:
+                try:
+                    ts,channels = load_recording(file_path)
+                except Exception as e:
+                    logging.error(f'{file_path} cannot be loaded: {e}')
+                    results.append({'file':file_path,'channel':None,'range':None,'command':None,'tau0':None,'samples':0,'cached':False,'result':{},'error':f'{type(e).__name__}: {e}'})
+                    continue
+                for channel,values in channels.items():
+                    keep = np.isfinite(values)
+                    cts = ts if keep.all() else ts[keep]
+                    values = values if keep.all() else values[keep]
+                    step = tau0 if tau0!=None or len(cts)<2 else float(np.median(np.diff(cts)))
+                    rate = 1/(step or 1.0)
+                    shm = None
+                    for t1,t2 in (ranges or [(None,None)]):
+                        start = 0 if t1 is None else int(np.searchsorted(cts,t1,side='left'))
+                        end = len(cts) if t2 is None else int(np.searchsorted(cts,t2,side='left'))
+                        for command in commands:
+                            res = {'file':file_path,'channel':channel,'range':(t1,t2),'command':command,'tau0':1/rate,'samples':max(end-start,0),'cached':False,'result':{},'error':None}
+                            results.append(res)
+                            if end-start<3:
+                                continue
+                            key = result_key(values[start:end],rate,command,f_0)
+                            cache_path = None if cache_dir is None else os.path.join(cache_dir,key+'.json')
+                            if cache_path!=None and os.path.exists(cache_path):
+                                with open(cache_path) as fin:
+                                    res['result'] = {float(tau):dev for tau,dev in json.load(fin).items()}
+                                res['cached'] = True
+                                continue
+                            if shm is None: #the channel is copied in shared memory only once, and only if needed
+                                shm = shared_memory.SharedMemory(create=True,size=max(values.nbytes,1))
+                                blocks.append(shm)
+                                np.ndarray(values.shape,dtype=np.float64,buffer=shm.buf)[:] = values
+                            future = executor.submit(compute_allan_shared,shm.name,len(values),start,end,rate,command,f_0)
+                            futures.append((future,res,cache_path))
+            for future,res,cache_path in futures:
+                try:
+                    res['result'] = future.result()
+                except Exception as e: #the other results are still collected
+                    logging.error(f'Analysis of {res["file"]} ({res["channel"]}, {res["command"]}) failed: {e}')
+                    res['error'] = f'{type(e).__name__}: {e}'
+                    continue
+                if cache_path!=None:
+                    with open(cache_path+'.tmp','w') as fout:
+                        json.dump(res['result'],fout)
+                    os.replace(cache_path+'.tmp',cache_path)
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    if print: logging.debug(f'Batch analysis concluded: {len(results)} results, {sum(res["cached"] for res in results)} from the cache')
+    return results
@@ -0,0 +1,405 @@
+'''
+Asynchronous client of the SR620 library, to drive several devices from a single asyncio event loop
+
+@requires: pip install pyserial-asyncio
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620utils import *
+from .sr620exceptions import *
+from .sr620constants import *
+from .sr620protocol import *
+from .sr620recorder import open_recorder
+from contextlib import asynccontextmanager
+import asyncio
+import time
+import logging
+
+class AsyncSR620():
+    """Class describing the SR620 device, driven with non-blocking I/O. It exposes the same functions of the SR620 class as coroutines, sharing with it the generation of the commands and the parsing of the responses"""
+
+    MODE_DICT = MODE_DICT
+    SOURCE_DICT = SOURCE_DICT
+    JTTR_DICT = JTTR_DICT
+    ARMM_DICT = ARMM_DICT
+    CLCK_DICT = CLCK_DICT
+    SIZE_LIST = SIZE_LIST
+    CLKF_DICT = CLKF_DICT
+    STAT_DICT = STAT_DICT
+    ARMM_TIME = ARMM_TIME
+    CONF_FIELDS = CONF_FIELDS
+    DELAY_CONF = 1
+    POLL_CONF = 0.05
+    DRAIN_TIMEOUT = 10 #maximum time (in seconds) waited for the response of a cancelled command, when the commands have no timeout
+
+    source = setup_property('source')
+    mode = setup_property('mode')
+    armm = setup_property('armm')
+    size = setup_property('size')
+    jttr = setup_property('jttr')
+    clock = setup_property('clock')
+    clockfr = setup_property('clockfr')
+
+    def __init__(self,reader:asyncio.StreamReader,writer:asyncio.StreamWriter,*,timeout=None):
+        """
+        Constructor. The connection is usually opened with the connect coroutine, which also reads the configuration of the device.
+        Parameters:
+        :param reader (asyncio.StreamReader): stream from which the responses of the device are read
+        :param writer (asyncio.StreamWriter): stream on which the commands are written
+        :param timeout (float): default timeout (in seconds) of every command. If nothing is specified, the commands wait forever
+        """
+        self.reader = reader
+        self.writer = writer
+        self.timeout = timeout
+        self.cont = True
+        self.pending = 0 #responses not read because of a timeout or a cancellation
+        self.lock = asyncio.Lock()
+        self.transaction_depth = 0
+        self.device_state = None
+
+    @classmethod
+    async def connect(cls,serial_port_path:str,log_file=None,*,baudrate=9600,timeout=None):
+        """
+        Open the connection with the device and read its configuration.
+        Parameters:
+        :param serial_port_path (str): path of the serial port on which the device is connected (i.e. "/dev/ttyUSB0")
+        :param log_file (str): path to the log file. If nothing is specified, then the output will be the console
+        :param baudrate (int): baud rate of the serial port
+        :param timeout (float): default timeout (in seconds) of every command. If nothing is specified, the commands wait forever
+        :return (AsyncSR620): connected device
+        """
+        import serial_asyncio #optional dependency, needed only by the asynchronous client
+        logging.basicConfig(filename=log_file,level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+        dev = None
+        try:
+            reader,writer = await serial_asyncio.open_serial_connection(url=serial_port_path,baudrate=baudrate)
+            dev = cls(reader,writer,timeout=timeout)
+            await dev.__execute_command__(INIT_COMMAND,False)
+            logging.debug('Connection established...')
+            await dev.__retrieve_parameters__()
+            return dev
+        except BaseException:
+            logging.error('Error in opening the connection')
+            if dev!=None: #the port is not left open when the device does not answer
+                await dev.close_connection()
+            raise #program terminated
+
+    async def close_connection(self):
+        """
+        Close the serial port connection.
+        """
+        try:
+            self.writer.close()
+            await self.writer.wait_closed()
+        except Exception:
+            pass
+        finally:
+            logging.debug('...Connection expired!')
+
+    async def __execute_command__(self,command:str,needs_response:bool,*,timeout=None):
+        """
+        Execute a command on the machine.
+        Parameters:
+        :param command (str): command that must be executed, according to the format requested by the device ('command(?) param')
+        :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
+        :param timeout (float): timeout (in seconds) of the command. If nothing is specified, the default timeout of the device is used
+        :return (dict): value returned when needs_response is set on True, in the same format of the SR620 class
+        """
+        response = await self.__query__(command,needs_response,timeout=timeout)
+        if needs_response:
+            return parse_string_to_dict(response)
+
+    async def __query__(self,command:str,needs_response=True,*,timeout=None) -> str:
+        """
+        Execute a command on the machine, returning the raw response. The commands are serialized, so that several coroutines can share the same device. When the command is cancelled (or its timeout expires) while waiting for the response, the response is discarded by the following command (waiting at most DRAIN_TIMEOUT seconds for it when there is no timeout).
+        Parameters:
+        :param command (str): command that must be executed, according to the format requested by the device ('command(?) param')
+        :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
+        :param timeout (float): timeout (in seconds) of the command. If nothing is specified, the default timeout of the device is used
+        :return (str): response of the device (None when needs_response is set on False)
+        """
+        async with self.lock:
+            return await self.__exchange__(command,needs_response,timeout=timeout)
+
+    async def __exchange__(self,command:str,needs_response=True,*,timeout=None) -> str:
+        """
+        Write a command on the device and read its response (see __query__). The caller must hold the lock of the device.
+        Parameters:
+        :param command (str): command that must be executed, according to the format requested by the device ('command(?) param')
+        :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
+        :param timeout (float): timeout (in seconds) of the command. If nothing is specified, the default timeout of the device is used
+        :return (str): response of the device (None when needs_response is set on False)
+        """
+        timeout = self.timeout if timeout is None else timeout
+        try:
+            while self.pending>0: #discard the responses of the cancelled commands
+                try:
+                    await asyncio.wait_for(self.reader.readuntil(b'\r\n'),self.DRAIN_TIMEOUT if timeout is None else timeout)
+                except asyncio.TimeoutError: #the responses never arrived, the stream starts again from the next command
+                    logging.warning(f'{self.pending} response(s) of cancelled commands discarded')
+                    self.pending = 0
+                    break
+                self.pending -= 1
+            self.writer.write(command.encode('ASCII')+b'\r')
+            await self.writer.drain()
+        except asyncio.CancelledError:
+            raise
+        except:
+            self.cont = False
+            logging.error("An error has occured while writing on the device. The execution has been concluded!")
+            raise SR620WriteException()
+
+        if needs_response: #if a response is needed
+            self.pending += 1
+            try:
+                response = await asyncio.wait_for(self.reader.readuntil(b'\r\n'),timeout)
+                self.pending -= 1
+                return response.decode('utf-8')
+            except (asyncio.CancelledError,asyncio.TimeoutError):
+                raise
+            except:
+                self.cont = False
+                logging.error("An error has occured while reading from the device. The execution has been concluded!")
+                raise SR620ReadException()
+
+    def __current_configuration__(self) -> Setup:
+        """
+        Return a copy of the configuration chosen by the user.
+        Parameters:
+        :return (Setup): configuration
+        """
+        return self.setup.copy()
+
+    async def __retrieve_parameters__(self):
+        """
+        Retrieve the parameters set on the device, saving them in the corresponding attributes of the class.
+        """
+        async with self.lock:
+            await self.__read_device_state__()
+        self.setup = self.device_state.copy()
+
+    async def __read_device_state__(self):
+        """
+        Read the configuration of the device into device_state. The caller must hold the lock of the device.
+        """
+        self.device_state = parse_setup(await self.__exchange__(SETUP_COMMAND))
+
+    async def __apply_custom_configuration__(self,*,print=True):
+        """
+        Apply the configuration chosen by the user, sending only the fields that differ from the configuration of the device. Nothing is sent while a configuration transaction is open. The lock of the device is held from the write to the last readback, so that the commands of other coroutines are not interleaved.
+        Parameters:
+        :param print (bool): when it is set on True, a feedback string is printed
+        """
+        if self.transaction_depth>0:
+            return
+        async with self.lock:
+            gcs = configuration_command(self.__current_configuration__(),self.device_state)
+            if gcs=='':
+                if print: logging.debug('Parameters already set...')
+                return
+            requested = self.__current_configuration__()
+            await self.__exchange__(gcs,False)
+            if print: logging.debug('Setting parameters...')
+            deadline = time.monotonic()+self.DELAY_CONF
+            await self.__read_device_state__()
+            while self.device_state!=requested and time.monotonic()<deadline:
+                await asyncio.sleep(self.POLL_CONF)
+                await self.__read_device_state__()
+            if self.device_state!=requested: #the configuration chosen meanwhile by other coroutines is applied by their own call
+                logging.warning('The configuration has not been completely applied by the device')
+                self.setup = self.device_state.copy()
+
+    async def set_custom_configuration(self,*,mode=None,source=None,jitter=None,arming=None,size=None,clock=None,clock_frequency=None,print=False):
+        """
+        Choose the configuration to apply on the device. All the parameters are optional, which means that if something is not specified, than it is kept on the current value. The options are the same of SR620.set_custom_configuration.
+        Parameters:
+        :param print (bool): when it is set on True, a feedback string is printed
+        """
+        try:
+            self.setup = update_configuration(self.setup,mode=mode,source=source,jitter=jitter,arming=arming,size=size,clock=clock,clock_frequency=clock_frequency)
+            await self.__apply_custom_configuration__(print=print)
+            if print: logging.info("Current configuration:\n"+str(self))
+        except asyncio.CancelledError:
+            raise
+        except:
+            logging.error("Configuration set terminated with an error")
+
+    @asynccontextmanager
+    async def configuration(self,*,print=False):
+        """
+        Open a configuration transaction: all the setters awaited inside the async with block are sent to the device with a single command when the block is closed. If an exception occurs inside the block, the changes are discarded.
+        Parameters:
+        :param print (bool): when it is set on True, a feedback string is printed
+        """
+        self.transaction_depth += 1
+        try:
+            yield self
+        except:
+            self.setup = self.device_state.copy()
+            raise
+        finally:
+            self.transaction_depth -= 1
+        if self.transaction_depth==0:
+            await self.set_custom_configuration(print=print)
+
+    async def set_mode(self,mode:str,*,print=False):
+        """Set the mode of measurement (see SR620.set_mode)."""
+        await self.set_custom_configuration(mode=mode,print=print)
+
+    async def set_source(self,source:str,*,print=False):
+        """Set the source of the measurement (see SR620.set_source)."""
+        await self.set_custom_configuration(source=source,print=print)
+
+    async def set_jitter_type(self,jitter:str,*,print=False):
+        """Set the kind of jitter to compute (see SR620.set_jitter_type)."""
+        await self.set_custom_configuration(jitter=jitter,print=print)
+
+    async def set_arming(self,arming:str,*,print=False):
+        """Set the kind of arming to use (see SR620.set_arming)."""
+        await self.set_custom_configuration(arming=arming,print=print)
+
+    async def set_number_samples(self,size:int,*,print=False):
+        """Set the number of samples (see SR620.set_number_samples)."""
+        await self.set_custom_configuration(size=size,print=print)
+
+    async def set_clock(self,clock:str,*,print=False):
+        """Set the source of the clock, internal or external (see SR620.set_clock)."""
+        await self.set_custom_configuration(clock=clock,print=print)
+
+    async def set_clock_frequency(self,clockfr:str,*,print=False):
+        """Set the frequeny of the clock (see SR620.set_clock_frequency)."""
+        await self.set_custom_configuration(clock_frequency=clockfr,print=print)
+
+    def __str__(self):
+        """
+        Return a string representing the configuration of the device.
+        Parameters:
+        :return (str): string representing the configuration of the device
+        """
+        return configuration_to_string(self.setup)
+
+    async def measure(self,stat=STATISTICS_MEAN,*,timeout=None) -> float:
+        """
+        Start a new measurement of the specified statistics on the device.
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param timeout (float): timeout (in seconds) of the measurement. If nothing is specified, the default timeout of the device is used
+        :return (float): value of the measurement (None when the measurement fails or the timeout expires)
+        """
+        try:
+            return parse_float(await self.__query__(measure_command(stat),timeout=timeout))
+        except asyncio.CancelledError:
+            raise
+        except:
+            logging.error('Measure terminated')
+            return None #program not terminated
+
+    async def iter_measurements(self,stat:str,num_meas=None,*,timeout=None):
+        """
+        Asynchronous generator of measures of the specified statistics on the device (see SR620.iter_measurements).
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param num_meas (int): number of measurements to perform. If nothing is specified, the measurements go on until the execution is stopped
+        :param timeout (float): timeout (in seconds) of every measurement
+        :return (async generator): generator of (timestamp,value) tuples, where timestamp is the time of the reading in seconds since the epoch (taken from a monotonic clock, so it never goes backwards)
+        """
+        clock = EpochClock()
+        i = 0
+        while self.cont and (num_meas is None or i<num_meas):
+            res = await self.measure(stat,timeout=timeout)
+            i += 1
+            if res is not None:
+                yield (clock.now(),res)
+
+    async def start_measurement_set(self,stat:str,num_meas:int,*,file_path=None,recorder=None,print=True,timeout=None) -> list:
+        """
+        Start a new set of measures of the specified statistics on the device. Return a list of the measurements (see SR620.start_measurement_set).
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param num_meas (int): number of measurements to perform
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file (npy format if the extension is .npy, csv format otherwise)
+        :param recorder (SR620Recorder): if specified, the set of measurements is saved with this recorder, which is closed at the end of the set (used instead of file_path)
+        :param timeout (float): timeout (in seconds) of every measurement
+        :return (list): list of float values corresponding to the measurements
+        """
+        return await self.__run_measurement_set__(stat,num_meas,file_path=file_path,recorder=recorder,print=print,timeout=timeout)
+
+    async def start_measurement_set_forever(self,stat:str,*,file_path=None,recorder=None,print=True,timeout=None) -> list:
+        """
+        Start a new set of measures of the specified statistics on the device, going on until the execution is stopped. Return a list of the measurements (see SR620.start_measurement_set_forever). To stop the set by cancelling the task, a recorder (or file_path) must be used to keep the measurements.
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file (npy format if the extension is .npy, csv format otherwise)
+        :param recorder (SR620Recorder): if specified, the set of measurements is saved with this recorder, which is closed at the end of the set (used instead of file_path)
+        :param timeout (float): timeout (in seconds) of every measurement
+        :return (list): list of float values corresponding to the measurements
+        """
+        return await self.__run_measurement_set__(stat,None,file_path=file_path,recorder=recorder,print=print,timeout=timeout)
+
+    async def __run_measurement_set__(self,stat:str,num_meas,*,file_path=None,recorder=None,print=True,timeout=None) -> list:
+        """
+        Run a set of measures on top of iter_measurements, optionally saving them with a recorder. When the task is cancelled, the recorder is closed before the cancellation is propagated.
+        """
+        if print: logging.debug('Measurement set started...')
+        lst = []
+        try:
+            if recorder==None and file_path!=None:
+                recorder = open_recorder(file_path,stat)
+            async for ts,res in self.iter_measurements(stat,num_meas,timeout=timeout):
+                lst.append(res)
+                if print: logging.debug(f'Value read: {res}')
+                if recorder!=None:
+                    recorder.append(res,ts)
+        except Exception:
+            logging.error('Measurement set terminated')
+        finally:
+            if recorder!=None:
+                recorder.close()
+                if print: logging.debug(f'Measurement set concluded, file saved in {recorder.file_path}')
+        return lst
+
+    async def start_measurement_allan_variance(self,n:int,*,f_0=None,command=ALLAN_OVERLAPPING,file_path=None,plot_path=None,online=None,print=True,timeout=None) -> dict:
+        """
+        Start a set of measurements corresponding to the Allan Variance for an increasing averaging time. Return a dictionary of the measurements (see SR620.start_measurement_allan_variance). The computation is performed in a worker thread, so that the event loop is not blocked.
+        Parameters:
+        :param n (int): number of measurements to perform
+        :param f_0 (int): nominal frequency. If no value is given, the nominal frequency will be the mean of the measurements
+        :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+        :param file_path (str): if specified, the set of measurements is saved in the corresponding output file
+        :param plot_path (str): if specified, the plot is saved in the corresponding output file
+        :param online (OnlineAllan): if specified, every measurement is also added to this estimator, whose results can be queried while the set is running
+        :param timeout (float): timeout (in seconds) of every measurement
+        :return (dict): dictionary containing the measurements. The keys are the averaging times, while the values are the corresponding Allan Variances
+        """
+        dct = {}
+        lst = []
+        try:
+            await self.set_custom_configuration( #mode set to frequency and size set to 1
+                mode=MODE_FREQUENCY,
+                size=1
+            )
+
+            async for ts,res in self.iter_measurements(STATISTICS_MEAN,n,timeout=timeout):
+                if online is not None:
+                    online.add(res)
+                if f_0 is not None:
+                    res = (res-f_0)/f_0
+                lst.append(res)
+
+            a = await asyncio.to_thread(compute_allan,lst,1/self.ARMM_TIME[self.armm],command,normalized=f_0 is not None) #compute allan variance
+            dct = allan_to_dict(a)
+
+            if file_path!=None:
+                save_allan(a,file_path)
+                if print: logging.debug(f'Measurement set concluded, file saved in {file_path}')
+
+            if plot_path!=None:
+                await asyncio.to_thread(save_plot,a,plot_path)
+                if print: logging.debug(f'Plot created, file saved in {plot_path}')
+
+        except asyncio.CancelledError:
+            raise
+        except:
+            logging.error('Measurement set terminated')
+        return dct
@@ -0,0 +1,46 @@
+'''
+Checkpoints of the SR620 library: state of the long measurement runs saved periodically in json files (the measurements are appended to a sample store next to them), so that an interrupted run can be resumed
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+import json
+import os
+
+CHECKPOINT_VERSION = 2
+
+def save_checkpoint(path:str,state:dict):
+    """
+    Save the state of a run in a json file. The file is written in a temporary file and then renamed, so that a crash during the write never leaves a truncated checkpoint.
+    Parameters:
+    :param path (str): path of the checkpoint
+    :param state (dict): state of the run (it must be serializable in json)
+    """
+    tmp = path+'.tmp'
+    with open(tmp,'w') as fout:
+        json.dump(dict(state,version=CHECKPOINT_VERSION),fout)
+        fout.flush()
+        os.fsync(fout.fileno())
+    os.replace(tmp,path)
+
+def checkpoint_store_path(path:str) -> str:
+    """
+    Return the path of the sample store holding the measurements of a checkpoint.
+    Parameters:
+    :param path (str): path of the checkpoint
+    :return (str): path of the sample store
+    """
+    return path+'.sr620'
+
+def load_checkpoint(path:str) -> dict:
+    """
+    Load the state of a run from a json file.
+    Parameters:
+    :param path (str): path of the checkpoint
+    :return (dict): state of the run
+    """
+    with open(path) as fin:
+        state = json.load(fin)
+    if state.get('version')!=CHECKPOINT_VERSION:
+        raise ValueError(f'{path} is not a valid checkpoint')
+    return state
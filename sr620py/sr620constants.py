@@ -34,4 +34,5 @@ STATISTICS_MAX = 'max'
 STATISTICS_MIN = 'min'
 ALLAN_CLASSIC = 'adev'
 ALLAN_OVERLAPPING = 'oadev'
-ALLAN_MODIFIED = 'mdev'
\ No newline at end of file
+ALLAN_MODIFIED = 'mdev'
+BAUDRATE_AUTO = 'auto'
@@ -0,0 +1,153 @@
+'''
+Outlier filter of the SR620 library: streaming rejection of the glitches (i.e. missed triggers), based on the rolling median and median absolute deviation of the last measurements
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from collections import deque
+import bisect
+import math
+
+FILTER_DROP = 'drop'
+FILTER_FLAG = 'flag'
+
+class OutlierFilter():
+    """Class describing a streaming outlier filter. A measurement is an outlier when its distance from the median of the last window measurements is greater than threshold robust standard deviations (1.4826 times the median absolute deviation).
+    The window is kept sorted, so that an update needs a binary search (plus a move of the references in memory), and the median absolute deviation is found with a binary search over the two sorted sequences of the deviations below and above the median, without sorting them"""
+
+    MAD_SCALE = 1.4826 #ratio between the standard deviation and the median absolute deviation of a normal distribution
+
+    def __init__(self,window=101,threshold=5.0,*,mode=FILTER_DROP,min_samples=10):
+        """
+        Constructor.
+        Parameters:
+        :param window (int): number of measurements of the rolling window
+        :param threshold (float): distance from the median (in robust standard deviations) above which a measurement is an outlier
+        :param mode (str): FILTER_DROP to discard the outliers, FILTER_FLAG to keep them (their positions are saved in flagged)
+        :param min_samples (int): number of measurements needed in the window before the outliers are detected
+        """
+        if mode not in (FILTER_DROP,FILTER_FLAG):
+            raise ValueError('The mode must be FILTER_DROP or FILTER_FLAG')
+        self.window = window
+        self.threshold = threshold
+        self.mode = mode
+        self.min_samples = max(min_samples,2)
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the window and the statistics.
+        """
+        self.values = deque() #measurements in order of arrival
+        self.sorted = [] #the same measurements, sorted
+        self.samples = 0
+        self.outliers = 0
+        self.flagged = [] #positions of the outliers (in FILTER_FLAG mode)
+        self.last_outlier = False #True when the last measurement processed is an outlier
+
+    def median(self) -> float:
+        """
+        Return the median of the window.
+        Parameters:
+        :return (float): median (NaN if the window is empty)
+        """
+        s = self.sorted
+        n = len(s)
+        if n==0:
+            return math.nan
+        if n%2==1:
+            return s[n//2]
+        return (s[n//2-1]+s[n//2])/2
+
+    def __kth_deviation__(self,m:float,h:int,k:int) -> float:
+        """
+        Return the k-th smallest (from 0) absolute deviation from m. The deviations of the measurements below m (m-s[h-1], m-s[h-2], ...) and above m (s[h]-m, s[h+1]-m, ...) are two sorted sequences: the k-th smallest element of their union is found with a binary search on the number of elements taken from the first one.
+        Parameters:
+        :param m (float): median
+        :param h (int): number of measurements lower than m
+        :param k (int): position of the deviation
+        :return (float): deviation
+        """
+        s = self.sorted
+        na = h
+        nb = len(s)-h
+        a = lambda i: m-s[h-1-i] #ascending
+        b = lambda j: s[h+j]-m #ascending
+        lo = max(0,k+1-nb)
+        hi = min(k+1,na)
+        while lo<hi: #number of elements i taken from the first sequence (k+1-i from the second one)
+            i = (lo+hi)//2
+            if a(i)<b(k-i):
+                lo = i+1 #a(i) is among the k+1 smallest
+            else:
+                hi = i
+        i = lo
+        candidates = []
+        if i>0:
+            candidates.append(a(i-1))
+        if k+1-i>0:
+            candidates.append(b(k-i))
+        return max(candidates)
+
+    def mad(self) -> float:
+        """
+        Return the median absolute deviation of the window.
+        Parameters:
+        :return (float): median absolute deviation (NaN if the window is empty)
+        """
+        n = len(self.sorted)
+        if n==0:
+            return math.nan
+        m = self.median()
+        h = bisect.bisect_left(self.sorted,m)
+        if n%2==1:
+            return self.__kth_deviation__(m,h,n//2)
+        return (self.__kth_deviation__(m,h,n//2-1)+self.__kth_deviation__(m,h,n//2))/2
+
+    def is_outlier(self,value:float) -> bool:
+        """
+        Check if a measurement is an outlier with respect to the current window, without adding it.
+        Parameters:
+        :param value (float): measurement
+        :return (bool): True when the measurement is an outlier
+        """
+        if len(self.sorted)<self.min_samples:
+            return False
+        sigma = self.MAD_SCALE*self.mad()
+        return sigma>0 and abs(value-self.median())>self.threshold*sigma
+
+    def process(self,value:float) -> bool:
+        """
+        Check a measurement and add it to the window (also the outliers are added, so that the filter follows a real step of the measurements).
+        Parameters:
+        :param value (float): measurement
+        :return (bool): True when the measurement must be kept (it is not an outlier, or the filter is in FILTER_FLAG mode)
+        """
+        outlier = self.is_outlier(value)
+        self.last_outlier = outlier
+        if outlier:
+            self.outliers += 1
+            if self.mode==FILTER_FLAG:
+                self.flagged.append(self.samples)
+        self.samples += 1
+        self.values.append(value)
+        bisect.insort(self.sorted,value)
+        if len(self.values)>self.window:
+            old = self.values.popleft()
+            del self.sorted[bisect.bisect_left(self.sorted,old)]
+        return not outlier or self.mode==FILTER_FLAG
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of the filter.
+        Parameters:
+        :return (dict): dictionary containing the number of measurements checked ('samples'), of outliers ('outliers'), of measurements discarded ('dropped') and flagged ('flagged'), and the current median and median absolute deviation of the window
+        """
+        return {
+            'samples':self.samples,
+            'outliers':self.outliers,
+            'dropped':self.outliers if self.mode==FILTER_DROP else 0,
+            'flagged':self.outliers if self.mode==FILTER_FLAG else 0,
+            'median':self.median(),
+            'mad':self.mad(),
+        }
@@ -0,0 +1,119 @@
+'''
+Instrumentation of the SR620 library: counters and histograms of the time spent in every stage of the acquisition (write, device wait, read, parse, record)
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from contextlib import contextmanager
+import numpy as np
+import time
+
+class StageStatistics():
+    """Class describing the statistics of a single stage: number of events, total/minimum/maximum time and a histogram with logarithmic bins (from 1 us to 1000 s, 10 bins per decade)"""
+
+    EDGES = np.logspace(-6,3,91)
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the statistics.
+        """
+        self.count = 0
+        self.total = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+        self.histogram = np.zeros(len(self.EDGES)+1,dtype=np.int64) #first and last bins collect the values out of range
+
+    def add(self,elapsed:float):
+        """
+        Add an event to the statistics.
+        Parameters:
+        :param elapsed (float): time spent (in seconds)
+        """
+        self.count += 1
+        self.total += elapsed
+        if elapsed<self.min: self.min = elapsed
+        if elapsed>self.max: self.max = elapsed
+        self.histogram[np.searchsorted(self.EDGES,elapsed)] += 1
+
+    def percentile(self,q:float) -> float:
+        """
+        Return an estimate of a percentile of the time spent, taken from the histogram (upper edge of the bin).
+        Parameters:
+        :param q (float): percentile, between 0 and 100
+        :return (float): time spent (in seconds)
+        """
+        if self.count==0:
+            return 0.0
+        k = int(np.searchsorted(np.cumsum(self.histogram),q/100*self.count))
+        return float(self.EDGES[min(k,len(self.EDGES)-1)])
+
+    def summary(self) -> dict:
+        """
+        Return a summary of the statistics.
+        Parameters:
+        :return (dict): dictionary containing count, total, mean, min, max, p50 and p99 (times in seconds)
+        """
+        return {
+            'count':self.count,
+            'total':self.total,
+            'mean':self.total/self.count if self.count>0 else 0.0,
+            'min':self.min if self.count>0 else 0.0,
+            'max':self.max,
+            'p50':self.percentile(50),
+            'p99':self.percentile(99),
+        }
+
+class SR620Instrumentation():
+    """Class collecting the statistics of all the stages of the acquisition"""
+
+    STAGES = ('write','wait','read','parse','record','filter')
+
+    def __init__(self,*,enabled=True):
+        """
+        Constructor.
+        Parameters:
+        :param enabled (bool): when it is set on False, no statistics are collected
+        """
+        self.enabled = enabled
+        self.stages = {stage:StageStatistics() for stage in self.STAGES}
+
+    def add(self,stage:str,elapsed:float):
+        """
+        Add an event to the statistics of a stage.
+        Parameters:
+        :param stage (str): name of the stage
+        :param elapsed (float): time spent (in seconds)
+        """
+        if self.enabled:
+            self.stages[stage].add(elapsed)
+
+    @contextmanager
+    def measure(self,stage:str):
+        """
+        Measure the time spent inside the with block, adding it to the statistics of a stage.
+        Parameters:
+        :param stage (str): name of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage,time.perf_counter()-start)
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of all the stages.
+        Parameters:
+        :return (dict): dictionary whose keys are the names of the stages, while the values are the summaries of the corresponding statistics
+        """
+        return {stage:s.summary() for stage,s in self.stages.items()}
+
+    def reset(self):
+        """
+        Clear the statistics of all the stages.
+        """
+        for s in self.stages.values():
+            s.reset()
@@ -0,0 +1,170 @@
+'''
+Manager of several SR620 devices, measured in parallel with time-aligned results
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620recorder import format_timestamps
+from .sr620utils import EpochClock
+from .sr620exceptions import *
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import threading
+import time
+import logging
+
+def align_by_time(series:dict) -> dict:
+    """
+    Align the measurements of several devices by time. The rows of the table are intervals as long as the interval between the measurements of the slowest device, starting from the first measurement: the values of every device are averaged over each row (NaN when a device has no measurement in it), so that devices with different gate times can be compared. The rows without any measurement are removed.
+    Parameters:
+    :param series (dict): dictionary whose keys are the names of the devices, while the values are tuples of arrays (timestamps, values)
+    :return (dict): dictionary containing the table: the key 'timestamp' contains the array of the timestamps of the rows (center of the intervals, in seconds since the epoch), while the names of the devices contain the arrays of the corresponding values
+    """
+    used = [t for t,v in series.values() if len(t)>0]
+    if len(used)==0:
+        return dict({'timestamp':np.empty(0)},**{name:np.empty(0) for name in series})
+    step = max((float(np.median(np.diff(t))) for t in used if len(t)>1),default=0.0)
+    start = min(float(t.min()) for t in used)
+    end = max(float(t.max()) for t in used)
+    if step<=0:
+        step = max(end-start,1.0)
+    num_rows = int(np.floor((end-start)/step+0.5))+1
+    sums = {}
+    counts = {}
+    for name,(t,v) in series.items():
+        row = np.clip(np.floor((t-start)/step+0.5).astype(np.int64),0,num_rows-1) #row i covers start+i*step -/+ step/2
+        sums[name] = np.bincount(row,weights=v,minlength=num_rows)
+        counts[name] = np.bincount(row,minlength=num_rows)
+    valid = np.sum(list(counts.values()),axis=0)>0
+    table = {'timestamp':(start+step*np.arange(num_rows))[valid]}
+    for name in series:
+        with np.errstate(invalid='ignore',divide='ignore'):
+            table[name] = np.where(counts[name]>0,sums[name]/np.maximum(counts[name],1),np.nan)[valid]
+    return table
+
+class SR620Manager():
+    """Class managing several SR620 devices. The measurement sets are started in parallel (one worker thread per device) and merged into a single table indexed by time"""
+
+    START_TIMEOUT = 10 #maximum time (in seconds) waited for all the devices to be ready
+
+    def __init__(self,devices:dict):
+        """
+        Constructor.
+        Parameters:
+        :param devices (dict): dictionary whose keys are the names of the devices, while the values are the corresponding SR620 objects (already connected)
+        """
+        if len(devices)==0:
+            logging.error('No device given to the manager! The execution has been concluded... please, check the documentation!')
+            raise ValueError('At least one device must be given to the manager')
+        self.devices = devices
+        self.statistics = {}
+
+    def __measure_device__(self,name:str,stat:str,num_meas:int,barrier:threading.Barrier,clock:EpochClock,ts:np.ndarray,values:np.ndarray):
+        """
+        Perform a set of measures on a single device, saving them in the corresponding rows of the output arrays. Any error is kept in the statistics of the device, so that the other devices are not stopped.
+        Parameters:
+        :param name (str): name of the device
+        :param stat (str): string representing the statistics to measure
+        :param num_meas (int): number of measurements to perform
+        :param barrier (threading.Barrier): barrier used to start all the devices at the same time
+        :param clock (EpochClock): clock shared by all the devices, giving the timestamps of the measurements
+        :param ts (np.ndarray): output array of the timestamps of the device
+        :param values (np.ndarray): output array of the values of the device
+        """
+        dev = self.devices[name]
+        samples = 0
+        error = None
+        try:
+            barrier.wait(self.START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass #the other devices are started anyway
+        start = time.monotonic()
+        try:
+            for i in range(num_meas):
+                if not dev.cont:
+                    break
+                res = dev.measure(stat,progress=False)
+                if res is not None:
+                    ts[i] = clock.now()
+                    values[i] = res
+                    samples += 1
+            if not dev.cont: #measure does not raise, the connection has been lost
+                error = repr(SR620ReadException())
+                logging.error(f'Measurement set of device {name} terminated')
+        except Exception as e:
+            error = repr(e)
+            logging.error(f'Measurement set of device {name} terminated')
+        elapsed = time.monotonic()-start
+        self.statistics[name] = {
+            'samples':samples,
+            'dropped':num_meas-samples,
+            'elapsed':elapsed,
+            'rate':samples/elapsed if elapsed>0 else 0.0,
+            'error':error,
+        }
+
+    def start_measurement_set(self,stat:str,num_meas:int,*,file_path=None,print=True) -> dict:
+        """
+        Start a new set of measures of the specified statistics on all the devices in parallel. The measurements are aligned by time (see align_by_time): every row of the table covers the interval between two measurements of the slowest device, and the measurements of every device in it are averaged. Missing measurements are set to NaN.
+        Parameters:
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param num_meas (int): number of measurements to perform on every device
+        :param file_path (str): if specified, the table is saved in the corresponding csv file
+        :return (dict): dictionary containing the table: the key 'timestamp' contains the array of the timestamps (in seconds since the epoch), while the names of the devices contain the arrays of the corresponding values
+        """
+        if print: logging.debug(f'Parallel measurement set started on {len(self.devices)} devices...')
+        names = list(self.devices.keys())
+        ts = np.full((len(names),num_meas),np.nan)
+        values = np.full((len(names),num_meas),np.nan)
+        barrier = threading.Barrier(len(names))
+        clock = EpochClock()
+        self.statistics = {}
+        with ThreadPoolExecutor(max_workers=len(names)) as executor:
+            futures = {name:executor.submit(self.__measure_device__,name,stat,num_meas,barrier,clock,ts[k],values[k]) for k,name in enumerate(names)}
+        for name,future in futures.items():
+            try:
+                future.result()
+            except Exception as e: #error outside the measurements of the device
+                logging.error(f'Measurement set of device {name} terminated')
+                self.statistics[name] = dict(self.statistics.get(name,{'samples':0,'dropped':num_meas,'elapsed':0.0,'rate':0.0}),error=repr(e))
+
+        table = align_by_time({name:(ts[k][~np.isnan(ts[k])],values[k][~np.isnan(ts[k])]) for k,name in enumerate(names)})
+        if print:
+            for name in names:
+                logging.debug(f'Device {name}: {self.statistics[name]}')
+
+        if file_path!=None:
+            self.save_table(table,stat,file_path)
+            if print: logging.debug(f'Parallel measurement set concluded, file saved in {file_path}')
+        return table
+
+    def save_table(self,table:dict,stat:str,file_path:str):
+        """
+        Save a table returned by start_measurement_set in a csv file.
+        Parameters:
+        :param table (dict): table of the measurements
+        :param stat (str): string representing the statistics measured
+        :param file_path (str): path of the output file
+        """
+        names = [name for name in table.keys() if name!='timestamp']
+        rows = format_timestamps(table['timestamp'])
+        for name in names:
+            rows = np.char.add(np.char.add(rows,','),np.asarray(table[name],dtype=np.float64).astype(str))
+        with open(file_path,'w') as fout:
+            fout.write('timestamp,'+','.join(f'{name} {stat}' for name in names)+'\n')
+            fout.write(''.join(row+'\n' for row in rows))
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of the last measurement set.
+        Parameters:
+        :return (dict): dictionary whose keys are the names of the devices, while the values are dictionaries containing the number of samples read, the number of dropped samples, the elapsed time, the throughput (samples per second) and the error that stopped the device (None if no error occurred)
+        """
+        return self.statistics
+
+    def close_connections(self):
+        """
+        Close the connections of all the devices.
+        """
+        for dev in self.devices.values():
+            dev.close_connection()
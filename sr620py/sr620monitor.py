@@ -0,0 +1,276 @@
+'''
+Live monitor of the SR620 library: progress driven by the measurements actually read, and a plot of the time series and of the Allan deviation, decimated so that the cost of rendering does not depend on the number of measurements
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620allan import OnlineAllan
+from .sr620constants import *
+import numpy as np
+import threading
+import time
+import os
+
+class MinMaxDecimator():
+    """Class keeping a decimated copy of a time series in a fixed number of buckets. Every bucket keeps the minimum and the maximum of the samples it covers (with their times), so that peaks are never hidden. When all the buckets are used, adjacent buckets are merged and every bucket covers twice the samples"""
+
+    def __init__(self,buckets=1000):
+        """
+        Constructor.
+        Parameters:
+        :param buckets (int): maximum number of buckets (the decimated series has at most 2*buckets points)
+        """
+        self.buckets = buckets+buckets%2
+        self.width = 1 #number of samples covered by every bucket
+        self.used = 0 #number of buckets used (the last one may be partial)
+        self.filled = 0 #number of samples in the last bucket
+        self.data = np.empty((self.buckets,4)) #time of the minimum, minimum, time of the maximum, maximum
+
+    def add(self,timestamp:float,value:float):
+        """
+        Add a sample to the series.
+        Parameters:
+        :param timestamp (float): time of the sample
+        :param value (float): value of the sample
+        """
+        if self.filled==0:
+            if self.used==self.buckets:
+                self.__merge__()
+            self.data[self.used] = (timestamp,value,timestamp,value)
+            self.used += 1
+        else:
+            row = self.data[self.used-1]
+            if value<row[1]:
+                row[0] = timestamp
+                row[1] = value
+            if value>row[3]:
+                row[2] = timestamp
+                row[3] = value
+        self.filled += 1
+        if self.filled==self.width:
+            self.filled = 0
+
+    def __merge__(self):
+        """
+        Merge the buckets in pairs, doubling the number of samples covered by every bucket.
+        """
+        a = self.data[0::2]
+        b = self.data[1::2]
+        merged = np.empty((self.buckets//2,4))
+        low = b[:,1]<a[:,1]
+        merged[:,0:2] = np.where(low[:,None],b[:,0:2],a[:,0:2])
+        high = b[:,3]>a[:,3]
+        merged[:,2:4] = np.where(high[:,None],b[:,2:4],a[:,2:4])
+        self.data[:self.buckets//2] = merged
+        self.used = self.buckets//2
+        self.width *= 2
+
+    def series(self) -> tuple:
+        """
+        Return the decimated series: for every bucket, the minimum and the maximum in time order.
+        Parameters:
+        :return (tuple): arrays of the times and of the values
+        """
+        d = self.data[:self.used]
+        first = d[:,0]<=d[:,2]
+        t = np.empty(2*self.used)
+        v = np.empty(2*self.used)
+        t[0::2] = np.where(first,d[:,0],d[:,2])
+        v[0::2] = np.where(first,d[:,1],d[:,3])
+        t[1::2] = np.where(first,d[:,2],d[:,0])
+        v[1::2] = np.where(first,d[:,3],d[:,1])
+        return t,v
+
+class SR620Monitor():
+    """Class describing a live monitor of a measurement set: a progress bar updated with the number of measurements actually read, and a plot of the time series (min/max decimated) and of the Allan deviation (updated online).
+    The figure and its artists are created once, then only their data is updated. In headless mode (snapshot_path), a background thread writes a PNG snapshot every interval seconds, so the acquisition is never stalled by the rendering. In interactive mode (show), the figure is redrawn by the acquisition at most every interval seconds"""
+
+    def __init__(self,*,tau0=None,f_0=None,snapshot_path=None,interval=5.0,max_points=2000,show=False,progress=True,max_m=4096):
+        """
+        Constructor.
+        Parameters:
+        :param tau0 (float): averaging time of a single measurement (in seconds). If nothing is specified, the gate time of the device (if fixed) or the mean interval between the measurements is used
+        :param f_0 (float): nominal frequency used for the Allan deviation. If no value is given, the mean of the measurements is used
+        :param snapshot_path (str): if specified, a PNG snapshot of the plot is written in this file every interval seconds
+        :param interval (float): time (in seconds) between two renderings of the plot
+        :param max_points (int): maximum number of points of the time series plotted
+        :param show (bool): when it is set on True, the plot is shown in a window
+        :param progress (bool): when it is set on True, a progress bar is shown on the console
+        :param max_m (int): maximum averaging factor of the Allan deviation
+        """
+        self.tau0 = tau0
+        self.f_0 = f_0
+        self.snapshot_path = snapshot_path
+        self.interval = interval
+        self.max_points = max_points
+        self.show = show
+        self.progress = progress
+        self.max_m = max_m
+        self.gate = None
+        self.lock = threading.Lock()
+        self.figure = None
+        self.bar = None
+        self.thread = None
+        self.running = threading.Event()
+        self.reset()
+
+    def reset(self):
+        """
+        Clear the data of the monitor.
+        """
+        with self.lock:
+            self.count = 0
+            self.first = None
+            self.last = None
+            self.decimator = MinMaxDecimator(self.max_points//2)
+            self.allan = OnlineAllan(1.0,f_0=self.f_0,max_m=self.max_m) #averaging factors, scaled by tau0 when rendered
+        self.last_render = time.monotonic()
+
+    def start(self,total=None,*,tau0=None):
+        """
+        Start monitoring a measurement set.
+        Parameters:
+        :param total (int): number of measurements expected (None if unknown)
+        :param tau0 (float): gate time of a single measurement, used when no tau0 has been given to the constructor
+        """
+        self.reset()
+        if self.tau0 is None:
+            self.gate = tau0
+        if self.progress:
+            from tqdm import tqdm #imported only when a progress bar is shown
+            self.bar = tqdm(total=total,unit='meas')
+        if self.snapshot_path!=None and not self.show:
+            self.running.set()
+            self.thread = threading.Thread(target=self.__snapshot_loop__,daemon=True)
+            self.thread.start()
+
+    def update(self,timestamp:float,value:float):
+        """
+        Add a measurement (called by the acquisition for every measurement read). The cost does not depend on the number of measurements.
+        Parameters:
+        :param timestamp (float): time of the measurement, in seconds since the epoch
+        :param value (float): value of the measurement
+        """
+        with self.lock:
+            self.count += 1
+            if self.first is None:
+                self.first = timestamp
+            self.last = timestamp
+            self.decimator.add(timestamp,value)
+            self.allan.add(value)
+        if self.bar is not None:
+            self.bar.update(1)
+        if self.show and time.monotonic()-self.last_render>=self.interval:
+            self.render()
+
+    def stop(self):
+        """
+        Stop monitoring: the background thread is stopped, the last snapshot is written and the progress bar is closed.
+        """
+        if self.thread!=None:
+            self.running.clear()
+            self.thread.join()
+            self.thread = None
+        if self.snapshot_path!=None or self.show:
+            self.render()
+        if self.bar is not None:
+            self.bar.close()
+            self.bar = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.stop()
+
+    def __snapshot_loop__(self):
+        """
+        Body of the background thread writing the snapshots.
+        """
+        while self.running.is_set():
+            time.sleep(min(self.interval,0.1))
+            if time.monotonic()-self.last_render>=self.interval:
+                self.render()
+
+    def get_tau0(self) -> float:
+        """
+        Return the averaging time of a single measurement: the one given to the constructor, the gate time of the device or the mean interval between the measurements.
+        Parameters:
+        :return (float): averaging time (in seconds)
+        """
+        if self.tau0!=None:
+            return self.tau0
+        if self.gate!=None:
+            return self.gate
+        if self.count>1:
+            return (self.last-self.first)/(self.count-1)
+        return 1.0
+
+    def snapshot(self) -> dict:
+        """
+        Return a copy of the data plotted.
+        Parameters:
+        :return (dict): dictionary containing the number of measurements ('count'), the decimated time series ('times','values', times relative to the first measurement) and the Allan deviation ('allan', dictionary whose keys are the averaging times)
+        """
+        with self.lock:
+            t,v = self.decimator.series()
+            tau0 = self.get_tau0()
+            allan = {m*tau0:dev for m,dev in self.allan.result(ALLAN_OVERLAPPING).items()}
+            return {'count':self.count,'times':t-(self.first or 0.0),'values':v,'allan':allan}
+
+    def __create_figure__(self):
+        """
+        Create the figure and its artists (only once).
+        """
+        import matplotlib #imported only when a plot is drawn
+        matplotlib.set_loglevel("warning")
+        if self.show:
+            import matplotlib.pyplot as plt
+            plt.ion()
+            self.figure = plt.figure(figsize=(10,4))
+        else: #headless figure, which can be drawn outside of the main thread
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.figure = Figure(figsize=(10,4))
+            FigureCanvasAgg(self.figure)
+        ax_series,ax_allan = self.figure.subplots(1,2)
+        self.series_line, = ax_series.plot([],[],color='b',linewidth=0.8)
+        ax_series.set_xlabel('Time (s)')
+        ax_series.set_ylabel('Value')
+        ax_series.grid(True,ls="--")
+        self.allan_line, = ax_allan.plot([],[],marker='o',linestyle='-',color='b')
+        ax_allan.set_xscale('log')
+        ax_allan.set_yscale('log')
+        ax_allan.set_xlim(1e-3,1e3) #log axes need positive limits until the first deviations are available
+        ax_allan.set_ylim(1e-15,1e-9)
+        ax_allan.set_autoscale_on(True)
+        ax_allan.set_xlabel('Tau (s)')
+        ax_allan.set_ylabel('Allan Deviation')
+        ax_allan.grid(True,which="both",ls="--")
+        self.title = self.figure.suptitle('')
+        self.axes = (ax_series,ax_allan)
+
+    def render(self):
+        """
+        Update the plot with the current data: the artists are updated in place, then the figure is drawn in the window or written in the snapshot file.
+        """
+        self.last_render = time.monotonic()
+        data = self.snapshot()
+        if self.figure is None:
+            self.__create_figure__()
+        self.series_line.set_data(data['times'],data['values'])
+        if len(data['allan'])>0:
+            self.allan_line.set_data(list(data['allan'].keys()),list(data['allan'].values()))
+        self.title.set_text(f"{data['count']} measurements")
+        for ax,points in zip(self.axes,(len(data['values']),len(data['allan']))):
+            if points>0:
+                ax.relim()
+                ax.autoscale_view()
+        if self.show:
+            self.figure.canvas.draw_idle()
+            self.figure.canvas.flush_events()
+        if self.snapshot_path!=None:
+            tmp = self.snapshot_path+'.tmp.png'
+            self.figure.savefig(tmp)
+            os.replace(tmp,self.snapshot_path) #the snapshot is never seen half written
+        self.last_render = time.monotonic()
@@ -0,0 +1,203 @@
+'''
+Protocol of the SR620 library: tables of the device options, generation of the commands and parsing of the responses, shared by the synchronous and the asynchronous clients
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620utils import *
+from .sr620exceptions import *
+from dataclasses import dataclass, replace
+import numpy as np
+import logging
+
+MODE_DICT = {'time':0,'width':1,'ratio':2,'freq':3,'period':4,'phase':5,'count':6}
+SOURCE_DICT = {'A':0,'B':1,'REF':2,'RATIO':3}
+JTTR_DICT = {'STD':0,'ALL':1}
+ARMM_DICT = {'+-time':0,'+time':1,'1per':2,'1cs':3,'1ds':4,'1s':5,'ext+-time':6,'ext+time':7,'extgate':8,'ext1per':9,'ext1cs':10,'ext1ds':11,'ext1s':12}
+CLCK_DICT = {'int':0,'ext':1}
+SIZE_LIST = [1,2,5,1e1,2e1,5e1,1e2,2e2,5e2,1e3,2e3,5e3,1e4,2e4,5e4,1e5,2e5,5e5,1e6,2e6,5e6]
+CLKF_DICT = {'10mhz':0,'5mhz':1}
+STAT_DICT = {'mean':0,'jitter':1,'max':2,'min':3}
+ARMM_TIME = {'1cs':0.01,'1ds':0.1,'1s':1,'ext1cs':0.01,'ext1ds':0.1,'ext1s':1,'1per':0.001}
+BDMP_SCALE = {'time':1.05963812934e-14,'width':1.05963812934e-14,'period':1.05963812934e-14,'freq':1.24900090270e-9}
+CONF_FIELDS = [('source','SRCE',SOURCE_DICT),('mode','MODE',MODE_DICT),('armm','ARMM',ARMM_DICT),('size','SIZE',None),('jttr','JTTR',JTTR_DICT),('clock','CLCK',CLCK_DICT),('clockfr','CLKF',CLKF_DICT)]
+CONF_PARAMETERS = {'mode':'mode','source':'source','jitter':'jttr','arming':'armm','size':'size','clock':'clock','clock_frequency':'clockfr'}
+CONF_OPTIONS = {field:options for field,command,options in CONF_FIELDS if options is not None}
+BAUDRATES = [19200,9600,4800,2400,1200,600,300] #baud rates of the RS-232 interface, fastest first
+
+MODE_CODES = {v:k for k,v in MODE_DICT.items()}
+SOURCE_CODES = {v:k for k,v in SOURCE_DICT.items()}
+JTTR_CODES = {v:k for k,v in JTTR_DICT.items()}
+ARMM_CODES = {v:k for k,v in ARMM_DICT.items()}
+CLCK_CODES = {v:k for k,v in CLCK_DICT.items()}
+CLKF_CODES = {v:k for k,v in CLKF_DICT.items()}
+
+INIT_COMMAND = 'STOP;AUTM0;'
+MEASURE_COMMANDS = {stat:f'STOP;AUTM0;MEAS?{code}' for stat,code in STAT_DICT.items()}
+SETUP_COMMAND = 'STUP?;'
+IDN_COMMAND = '*IDN?'
+IDN_PREFIX = 'StanfordResearchSystems,SR620'
+
+def measure_command(stat:str) -> str:
+    """
+    Generate the command starting a new measurement of the specified statistics.
+    Parameters:
+    :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+    :return (str): string representing the command
+    """
+    return MEASURE_COMMANDS[stat]
+
+@dataclass
+class Setup():
+    """Class describing the configuration of the device. The fields have the same names of the attributes of the SR620 class"""
+
+    __slots__ = ('source','mode','armm','size','jttr','clock','clockfr')
+    source: str
+    mode: str
+    armm: str
+    size: float
+    jttr: str
+    clock: str
+    clockfr: str
+
+    def copy(self):
+        """
+        Return a copy of the configuration.
+        Parameters:
+        :return (Setup): copy of the configuration
+        """
+        return replace(self)
+
+    def items(self):
+        """
+        Return the fields of the configuration.
+        Parameters:
+        :return (generator): generator of (name,value) tuples
+        """
+        return ((field,getattr(self,field)) for field in self.__slots__)
+
+def setup_property(field:str) -> property:
+    """
+    Generate a property reading and writing a field of the setup attribute of a device, so that the fields of the configuration can be used as attributes of the device (i.e. device.mode).
+    Parameters:
+    :param field (str): name of the field
+    :return (property): property of the field
+    """
+    return property(lambda self: getattr(self.setup,field),lambda self,value: setattr(self.setup,field,value))
+
+def parse_float(response:str) -> float:
+    """
+    Decode the first value of a response as a float, without building the dictionary of parse_string_to_dict.
+    Parameters:
+    :param response (str): response of the device
+    :return (float): first value of the response
+    """
+    try:
+        return float(response.split(',',1)[0])
+    except:
+        logging.error("An error has occured while reading from the device. The execution has been concluded!")
+        raise SR620ReadException()
+
+def parse_values(response:str,out=None) -> np.ndarray:
+    """
+    Decode all the values of a multi-value response into an array of floats.
+    Parameters:
+    :param response (str): response of the device
+    :param out (np.ndarray): if specified, the values are written in this preallocated array (which must be long enough), and the corresponding slice is returned
+    :return (np.ndarray): values of the response
+    """
+    try:
+        values = np.array(response.strip().split(','),dtype=np.float64)
+    except:
+        logging.error("An error has occured while reading from the device. The execution has been concluded!")
+        raise SR620ReadException()
+    if out is None:
+        return values
+    out[:len(values)] = values
+    return out[:len(values)]
+
+def parse_responses(responses:list,out=None) -> np.ndarray:
+    """
+    Decode the first value of several responses (i.e. returned by a pipelined set of queries) into an array of floats.
+    Parameters:
+    :param responses (list): list of responses of the device
+    :param out (np.ndarray): if specified, the values are written in this preallocated array (which must be long enough), and the corresponding slice is returned
+    :return (np.ndarray): values of the responses
+    """
+    if out is None:
+        out = np.empty(len(responses),dtype=np.float64)
+    for i,response in enumerate(responses):
+        out[i] = parse_float(response)
+    return out[:len(responses)]
+
+def update_configuration(current:Setup,**changes) -> Setup:
+    """
+    Apply the changes chosen by the user to a configuration. The parameters that are not specified (or None) are kept on the current value. Every new value is checked against the options of the device.
+    Parameters:
+    :param current (Setup): current configuration
+    :param changes: new values, with the names of the parameters of set_custom_configuration (mode,source,jitter,arming,size,clock,clock_frequency)
+    :return (Setup): new configuration
+    """
+    conf = current.copy()
+    for param,value in changes.items():
+        if value!=None:
+            if param=='size' and value not in SIZE_LIST:
+                logging.error("The size inserted is not valid! The execution has been concluded... please, check the documentation!")
+                raise SR620SizeException(SIZE_LIST)
+            field = CONF_PARAMETERS[param]
+            if field in CONF_OPTIONS and value not in CONF_OPTIONS[field]:
+                logging.error(f"The value {value!r} of {param} is not valid! The execution has been concluded... please, check the documentation!")
+                raise SR620ValueException()
+            setattr(conf,field,value)
+    return conf
+
+def configuration_command(requested:Setup,applied:Setup) -> str:
+    """
+    Generate a command string containing the fields of the requested configuration that differ from the applied one.
+    Parameters:
+    :param requested (Setup): configuration chosen by the user
+    :param applied (Setup): configuration last read from the device (if None, all the fields are included)
+    :return (str): string representing the command (empty when nothing has changed)
+    """
+    try:
+        cmm = ''
+        for field,command,options in CONF_FIELDS:
+            value = getattr(requested,field)
+            if applied is None or value!=getattr(applied,field):
+                cmm += f"{command} {value if options is None else options[value]}; "
+        return cmm.strip()
+    except:
+        logging.error("One (or more) of the parameters does not exist! The execution has been concluded... please, check the documentation!")
+        raise SR620ValueException()
+
+def parse_setup(response:str) -> Setup:
+    """
+    Parse the response to the setup query (STUP?).
+    Parameters:
+    :param response (str): response of the device
+    :return (Setup): configuration of the device
+    """
+    try:
+        codes = [int(v) for v in response.strip().split(',')]
+        x = codes[7]
+        return Setup(
+            source=SOURCE_CODES[codes[1]],
+            mode=MODE_CODES[codes[0]],
+            armm=ARMM_CODES[codes[2]],
+            size=SIZE_LIST[codes[4]],
+            jttr=JTTR_CODES[get_bit(x,5)],
+            clock=CLCK_CODES[get_bit(x,6)],
+            clockfr=CLKF_CODES[get_bit(x,7)],
+        )
+    except:
+        logging.error("An error has occured while reading from the device. The execution has been concluded!")
+        raise SR620ReadException()
+
+def configuration_to_string(conf:Setup) -> str:
+    """
+    Return a string representing a configuration of the device.
+    Parameters:
+    :param conf (Setup): configuration
+    :return (str): string representing the configuration
+    """
+    return f"-------------------------------------\n***SR620 parameters configuration***\nMode: {conf.mode}\nSource: {conf.source}\nArming: {conf.armm}\nNumOfSamples: {conf.size}\nTypeOfJitter: {conf.jttr}\nClock: {conf.clock}\nClockFrequency: {conf.clockfr}\n-------------------------------------"
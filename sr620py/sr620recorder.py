@@ -0,0 +1,222 @@
+'''
+Recorders of the SR620 library: buffered writers saving the measurements in csv or npy files
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620utils import EpochClock
+from datetime import datetime, timedelta, timezone
+from abc import ABC, abstractmethod
+from zoneinfo import ZoneInfo
+import numpy as np
+import time
+import os
+
+TIMEZONE = ZoneInfo('Europe/Rome')
+OFFSET_SPAN = 7*86400 #a segment of a batch longer than this (in seconds) can hold two offset changes, so it is always split
+
+class SR620Recorder(ABC):
+    """Base class of the recorders. The measurements are kept in a buffer and written in batches: a batch is written when the number of rows or the time elapsed since the previous batch exceed the chosen limits"""
+
+    def __init__(self,file_path:str,stat:str,*,flush_rows=100,flush_interval=1.0):
+        """
+        Constructor.
+        Parameters:
+        :param file_path (str): path of the output file
+        :param stat (str): string representing the statistics recorded (used as column name)
+        :param flush_rows (int): maximum number of rows kept in the buffer before writing them on the file
+        :param flush_interval (float): maximum time (in seconds) between two writes on the file
+        """
+        self.file_path = file_path
+        self.stat = stat
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows = 0
+        self.buffer = np.empty((flush_rows,2),dtype=np.float64)
+        self.count = 0
+        self.clock = EpochClock()
+        self.last_flush = time.monotonic()
+        self.open()
+
+    @abstractmethod
+    def open(self):
+        """
+        Open the output file (implemented by the subclasses).
+        """
+
+    @abstractmethod
+    def write_batch(self,batch:np.ndarray):
+        """
+        Write a batch of rows on the output file (implemented by the subclasses).
+        Parameters:
+        :param batch (np.ndarray): array with two columns, containing the timestamps (in seconds since the epoch) and the values
+        """
+
+    def append(self,value:float,timestamp=None):
+        """
+        Add a measurement to the buffer. The buffer is written on the file when it is full or when the flush interval is elapsed.
+        Parameters:
+        :param value (float): value of the measurement
+        :param timestamp (float): timestamp of the measurement, in seconds since the epoch. If nothing is specified, the current time of the clock of the recorder is used
+        """
+        now = time.monotonic()
+        self.buffer[self.count,0] = self.clock.now() if timestamp is None else timestamp
+        self.buffer[self.count,1] = value
+        self.count += 1
+        if self.count==self.flush_rows or now-self.last_flush>=self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Write the rows kept in the buffer on the output file. Every batch is written (and synced) as a whole. A batch whose write fails is discarded, so that it is not written again by the following flush.
+        """
+        if self.count>0:
+            count = self.count
+            self.count = 0
+            self.write_batch(self.buffer[:count])
+            self.rows += count
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """
+        Write the remaining rows and close the output file (which is closed also when the last write fails).
+        """
+        try:
+            self.flush()
+        finally:
+            self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+def utc_offset(timestamp:float) -> float:
+    """
+    Return the offset of the timezone of the library from UTC at a time.
+    Parameters:
+    :param timestamp (float): time in seconds since the epoch
+    :return (float): offset in seconds
+    """
+    return datetime.fromtimestamp(float(timestamp),TIMEZONE).utcoffset().total_seconds()
+
+def utc_offsets(timestamps:np.ndarray) -> np.ndarray:
+    """
+    Return the offset of the timezone of the library from UTC at every timestamp of a batch (sorted). The offset is computed at the ends of the batch only: when they differ (a daylight saving change falls inside the batch) or the batch is longer than OFFSET_SPAN, the batch is split in two halves, so that only a few offsets are computed for every batch.
+    Parameters:
+    :param timestamps (np.ndarray): array of timestamps in seconds since the epoch
+    :return (np.ndarray): array of offsets in seconds
+    """
+    out = np.empty(len(timestamps),dtype=np.float64)
+    if len(out)==0:
+        return out
+    segments = [(0,len(out)-1,utc_offset(timestamps[0]),utc_offset(timestamps[-1]))]
+    while len(segments)>0:
+        lo,hi,first,last = segments.pop()
+        if first==last and timestamps[hi]-timestamps[lo]<=OFFSET_SPAN:
+            out[lo:hi+1] = first
+        elif hi-lo<=1:
+            out[lo],out[hi] = first,last
+        else:
+            mid = (lo+hi)//2
+            middle = utc_offset(timestamps[mid])
+            segments += [(lo,mid,first,middle),(mid,hi,middle,last)]
+    return out
+
+def format_offset(offset:float) -> str:
+    """
+    Format an offset from UTC as in the isoformat of the datetimes (i.e. '+01:00').
+    Parameters:
+    :param offset (float): offset in seconds
+    :return (str): string representing the offset
+    """
+    sign = '-' if offset<0 else '+'
+    minutes = int(round(abs(offset)))//60
+    return f'{sign}{minutes//60:02d}:{minutes%60:02d}'
+
+def format_timestamps(timestamps:np.ndarray) -> np.ndarray:
+    """
+    Format an array of timestamps as local times of the timezone of the library (i.e. '2024-03-31 03:00:00.000000+02:00'). The offsets are computed once per batch (see utc_offsets), and the strings are built with vectorized operations.
+    Parameters:
+    :param timestamps (np.ndarray): array of timestamps in seconds since the epoch
+    :return (np.ndarray): array of strings
+    """
+    timestamps = np.asarray(timestamps,dtype=np.float64)
+    if len(timestamps)==0:
+        return np.empty(0,dtype=str)
+    offsets = utc_offsets(timestamps)
+    local = np.round((timestamps+offsets)*1e6).astype(np.int64).astype('datetime64[us]')
+    dates = np.char.replace(np.datetime_as_string(local,unit='us'),'T',' ')
+    suffixes = np.empty(len(offsets),dtype='<U6')
+    for offset in np.unique(offsets):
+        suffixes[offsets==offset] = format_offset(offset)
+    return np.char.add(dates,suffixes)
+
+def epoch_to_datetime(timestamps:np.ndarray) -> list:
+    """
+    Convert an array of timestamps into datetimes of the timezone of the library. The offsets are computed once per batch (see utc_offsets).
+    Parameters:
+    :param timestamps (np.ndarray): array of timestamps in seconds since the epoch
+    :return (list): list of datetimes in the timezone of the library
+    """
+    offsets = utc_offsets(timestamps)
+    zones = {offset:timezone(timedelta(seconds=offset),TIMEZONE.key) for offset in np.unique(offsets)}
+    return [datetime.fromtimestamp(float(t),zones[offset]) for t,offset in zip(timestamps,offsets)]
+
+class CsvRecorder(SR620Recorder):
+    """Recorder saving the measurements in a csv file, with the same format of the measurement sets (timestamp,stat). Every batch is written with a single write, but a crash during the write can leave a partial last line"""
+
+    def open(self):
+        self.fout = open(self.file_path,'w')
+        self.fout.write(f'timestamp,{self.stat}\n')
+        self.fout.flush()
+
+    def write_batch(self,batch:np.ndarray):
+        rows = np.char.add(np.char.add(format_timestamps(batch[:,0]),','),batch[:,1].astype(str))
+        self.fout.write('\n'.join(rows)+'\n')
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+
+class NpyRecorder(SR620Recorder):
+    """Recorder saving the measurements in a npy file (array of float64 with two columns: timestamp in seconds since the epoch and value). The header is rewritten after every batch, so that the file can always be loaded with numpy.load"""
+
+    HEADER_LEN = 128
+
+    def open(self):
+        self.fout = open(self.file_path,'w+b')
+        self.__write_header__(0)
+
+    def __write_header__(self,rows:int):
+        """
+        Write the npy header, with the number of rows saved in the file. The header has a fixed length, so that it can be rewritten in place.
+        Parameters:
+        :param rows (int): number of rows saved in the file
+        """
+        header = "{'descr': '<f8', 'fortran_order': False, 'shape': (%d, 2), }" % rows
+        header = b'\x93NUMPY\x01\x00'+(self.HEADER_LEN-10).to_bytes(2,'little')+header.ljust(self.HEADER_LEN-11).encode('latin1')+b'\n'
+        self.fout.seek(0)
+        self.fout.write(header)
+
+    def write_batch(self,batch:np.ndarray):
+        self.fout.seek(self.HEADER_LEN+self.rows*16)
+        self.fout.write(batch.astype('<f8').tobytes())
+        self.fout.flush()
+        os.fsync(self.fout.fileno()) #the rows are on disk before the header counts them
+        self.__write_header__(self.rows+len(batch))
+        self.fout.flush()
+
+def open_recorder(file_path:str,stat:str,**kwargs) -> SR620Recorder:
+    """
+    Open the recorder corresponding to the extension of the output file: npy files are saved with NpyRecorder, sr620 files with StoreRecorder (sample store), any other file with CsvRecorder.
+    Parameters:
+    :param file_path (str): path of the output file
+    :param stat (str): string representing the statistics recorded
+    :return (SR620Recorder): recorder writing on the output file
+    """
+    if file_path.endswith('.sr620'):
+        from .sr620store import StoreRecorder #the store module depends on this one
+        return StoreRecorder(file_path,stat,**kwargs)
+    if file_path.endswith('.npy'):
+        return NpyRecorder(file_path,stat,**kwargs)
+    return CsvRecorder(file_path,stat,**kwargs)
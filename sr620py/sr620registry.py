@@ -0,0 +1,131 @@
+'''
+Registry of the SR620 library: sessions (open ports, with their transport and the last configuration read from the device) shared by all the SR620 objects created on the same port in a process
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620transport import SR620Transport
+from .sr620instrument import SR620Instrumentation
+from .sr620protocol import *
+from .sr620constants import *
+import threading
+import serial
+import logging
+
+class SR620Session():
+    """Class describing an open connection with a device: port, transport, statistics, lock serializing the commands and configuration of the device. A shared session is used by several SR620 objects, and closed when the last one is closed"""
+
+    def __init__(self,key,port,baudrate,path=None):
+        """
+        Constructor.
+        Parameters:
+        :param key (str): path of the serial port under which the session is registered (None for a private session)
+        :param port (serial.Serial): open serial port (or any object exposing the same interface)
+        :param baudrate (int): baud rate of the port
+        :param path (str): path from which the port has been opened (None when the port has been opened by the user, and cannot be opened again)
+        """
+        self.key = key
+        self.path = path
+        self.port = port
+        self.baudrate = baudrate
+        self.instrumentation = SR620Instrumentation()
+        self.transport = SR620Transport(port,self.instrumentation)
+        self.lock = threading.RLock()
+        self.device_state = None #configuration last read from the device
+        self.refs = 0
+
+    def reopen(self):
+        """
+        Close the port and open it again, with the same baud rate. A port opened by the user is only cleared.
+        """
+        if self.path!=None:
+            try:
+                self.transport.close()
+            except:
+                pass
+            self.port = serial.Serial(self.path,self.baudrate,timeout=None)
+            self.transport = SR620Transport(self.port,self.instrumentation)
+        self.port.reset_input_buffer()
+
+SESSIONS = {}
+REGISTRY_LOCK = threading.Lock()
+
+def probe_baudrate(ser,baudrates=BAUDRATES,*,timeout=0.5) -> int:
+    """
+    Find the baud rate of the device, sending an identification query at every baud rate (fastest first) until a valid response is read. The baud rate of the SR620 is chosen on the front panel, so it cannot be changed remotely: the fastest one that answers is the one set on the device.
+    Parameters:
+    :param ser (serial.Serial): open serial port, left at the baud rate found
+    :param baudrates (list): baud rates to try
+    :param timeout (float): time to wait (in seconds) for the response at every baud rate
+    :return (int): baud rate of the device
+    """
+    old_timeout = ser.timeout
+    try:
+        ser.timeout = timeout
+        for baudrate in baudrates:
+            ser.baudrate = baudrate
+            ser.reset_input_buffer()
+            ser.write(b'\r'+IDN_COMMAND.encode('ASCII')+b'\r') #the first terminator discards any partial command
+            ser.flush()
+            response = ser.read_until(b'\r\n').decode('ASCII',errors='replace')
+            if response.startswith(IDN_PREFIX):
+                logging.debug(f'Baud rate found: {baudrate}')
+                return baudrate
+    finally:
+        ser.timeout = old_timeout
+    logging.error("The device does not answer at any baud rate! The execution has been concluded... please, check the connection!")
+    raise SR620ReadException()
+
+def open_session(serial_port_path:str,*,baudrate=None,port=None,shared=False) -> tuple:
+    """
+    Open a session on a device. When shared is set on True and a shared session is already open on the same port, it is reused: a ValueError is raised if it has been opened with a different port object or baud rate.
+    Parameters:
+    :param serial_port_path (str): path of the serial port on which the device is connected
+    :param baudrate (int): baud rate of the port, or BAUDRATE_AUTO to find it with probe_baudrate. If nothing is specified, 9600 is used (or the baud rate of the shared session)
+    :param port (serial.Serial): if specified, this already open port is used instead of opening serial_port_path
+    :param shared (bool): when it is set on True, the session is registered under serial_port_path and shared with the following calls
+    :return (tuple): session (SR620Session) and a boolean which is True when the session has just been opened
+    """
+    key = serial_port_path if shared and serial_port_path!=None else None
+    with REGISTRY_LOCK:
+        if key in SESSIONS:
+            session = SESSIONS[key]
+            if baudrate not in (None,BAUDRATE_AUTO,session.baudrate):
+                logging.error(f'The session on {key} is already open at {session.baudrate} baud, it cannot be shared at {baudrate} baud')
+                raise ValueError(f'The session on {key} is already open at {session.baudrate} baud')
+            if port is not None and port is not session.port:
+                logging.error(f'The session on {key} is already open on another port object, it cannot be shared with the port given')
+                raise ValueError(f'The session on {key} is already open on another port')
+            session.refs += 1
+            return session,False
+        path = serial_port_path if port is None else None
+        if port is None:
+            port = serial.Serial(serial_port_path,baudrate if isinstance(baudrate,int) else 9600,timeout=None)
+        if baudrate==BAUDRATE_AUTO:
+            try:
+                baudrate = probe_baudrate(port)
+            except:
+                if path!=None:
+                    port.close()
+                raise
+        session = SR620Session(key,port,getattr(port,'baudrate',baudrate or 9600),path)
+        session.refs = 1
+        if key!=None:
+            SESSIONS[key] = session
+        return session,True
+
+def release_session(session:SR620Session) -> bool:
+    """
+    Release a session: the port is closed when the session is not used anymore.
+    Parameters:
+    :param session (SR620Session): session to release
+    :return (bool): True when the port has been closed
+    """
+    with REGISTRY_LOCK:
+        session.refs -= 1
+        if session.refs>0:
+            return False
+        if session.key!=None and SESSIONS.get(session.key) is session:
+            del SESSIONS[session.key]
+    session.transport.close()
+    return True
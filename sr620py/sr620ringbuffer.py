@@ -0,0 +1,137 @@
+'''
+Ring buffer of the SR620 library: fixed-size buffer of (timestamp,value) pairs, filled by a background acquisition thread and read by the application
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+import numpy as np
+import threading
+import time
+
+class SR620RingBuffer():
+    """Class describing a fixed-size ring buffer of (timestamp,value) pairs, with a single producer (the acquisition thread) and a single consumer (the application).
+    The producer never waits for the consumer and takes no lock: it writes the pair and then advances the write counter. When the consumer is too slow, the oldest pairs are overwritten and counted as lost (overrun)"""
+
+    def __init__(self,capacity=65536):
+        """
+        Constructor.
+        Parameters:
+        :param capacity (int): maximum number of pairs kept in the buffer
+        """
+        if capacity<1:
+            raise ValueError('The capacity must be at least 1')
+        self.capacity = capacity
+        self.slots = capacity+1 #the slot being written by the producer is never read
+        self.data = np.zeros((self.slots,2),dtype=np.float64)
+        self.written = 0 #total number of pairs written (only updated by the producer)
+        self.read = 0 #total number of pairs consumed (only updated by the consumer)
+        self.lost = 0 #total number of pairs overwritten before being consumed
+        self.error = None #exception which stopped the producer, if any
+        self.closed = False
+        self.event = threading.Event()
+
+    def push(self,timestamp:float,value:float):
+        """
+        Write a pair in the buffer (producer side).
+        Parameters:
+        :param timestamp (float): time of the measurement, in seconds since the epoch
+        :param value (float): value of the measurement
+        """
+        row = self.data[self.written%self.slots]
+        row[0] = timestamp
+        row[1] = value
+        self.written += 1 #the pair is published only after it has been written
+        self.event.set()
+
+    def close(self,error=None):
+        """
+        Mark the end of the data (producer side), waking up the consumers.
+        Parameters:
+        :param error (Exception): exception which stopped the producer, if any
+        """
+        self.error = error
+        self.closed = True
+        self.event.set()
+
+    def available(self) -> int:
+        """
+        Return the number of pairs written and not consumed yet (at most the capacity).
+        Parameters:
+        :return (int): number of pairs
+        """
+        return min(self.written-self.read,self.capacity)
+
+    def __copy_range__(self,start:int,end:int) -> np.ndarray:
+        """
+        Copy the pairs with indexes in [start,end) out of the buffer, discarding the ones overwritten by the producer during the copy.
+        Parameters:
+        :param start (int): index of the first pair
+        :param end (int): index after the last pair
+        :return (tuple): first index actually copied and array of shape (k,2)
+        """
+        i = start%self.slots
+        j = i+(end-start)
+        if j<=self.slots:
+            out = self.data[i:j].copy()
+        else:
+            out = np.concatenate((self.data[i:],self.data[:j-self.slots]))
+        first = self.written-self.capacity #oldest pair not overwritten (nor being overwritten) during the copy
+        if first>start:
+            return first,out[first-start:]
+        return start,out
+
+    def snapshot(self,n=None) -> np.ndarray:
+        """
+        Return a copy of the last pairs written, without consuming them.
+        Parameters:
+        :param n (int): number of pairs. If nothing is specified, all the pairs in the buffer are returned
+        :return (np.ndarray): array of shape (k,2), with the timestamps in the first column and the values in the second one
+        """
+        end = self.written
+        k = min(end,self.capacity) if n is None else min(n,end,self.capacity)
+        return self.__copy_range__(end-k,end)[1]
+
+    def drain(self,max_items=None) -> np.ndarray:
+        """
+        Consume the pairs written since the last call (consumer side). The pairs overwritten before being consumed are added to the lost counter, once: when the producer overwrites even the last requested pair during the copy, the consumer resumes from the oldest pair not overwritten.
+        Parameters:
+        :param max_items (int): maximum number of pairs to consume. If nothing is specified, all the available pairs are consumed
+        :return (np.ndarray): array of shape (k,2), with the timestamps in the first column and the values in the second one
+        """
+        end = self.written
+        start = max(self.read,end-self.capacity)
+        if max_items is not None:
+            end = min(end,start+max_items)
+        first,out = self.__copy_range__(start,end)
+        self.lost += first-self.read
+        self.read = max(end,first)
+        return out
+
+    def wait(self,count=1,timeout=None) -> bool:
+        """
+        Wait until at least count pairs are available to be consumed, or the producer has stopped.
+        Parameters:
+        :param count (int): number of pairs
+        :param timeout (float): maximum time to wait (in seconds). If nothing is specified, there is no limit
+        :return (bool): True when the pairs are available, False otherwise
+        """
+        count = min(count,self.capacity)
+        deadline = None if timeout is None else time.monotonic()+timeout
+        while self.written-self.read<count:
+            if self.closed:
+                return False
+            self.event.clear()
+            if self.written-self.read>=count or self.closed: #written between the check and the clear
+                continue
+            remaining = None if deadline is None else deadline-time.monotonic()
+            if (remaining is not None and remaining<=0) or not self.event.wait(remaining):
+                return False
+        return True
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of the buffer.
+        Parameters:
+        :return (dict): dictionary containing the number of pairs written, consumed, lost and available
+        """
+        return {'written':self.written,'read':self.read,'lost':self.lost,'available':self.available()}
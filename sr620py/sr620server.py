@@ -0,0 +1,601 @@
+'''
+Network server of the SR620 library: a single process owns the device and streams its measurements to many clients over a TCP or Unix socket, with a compact binary framing, per-client decimation and a single queue serializing the configuration requests
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620exceptions import *
+from .sr620constants import *
+from .sr620protocol import update_configuration
+from collections import deque
+from stat import S_ISSOCK
+import numpy as np
+import socketserver
+import threading
+import socket
+import select
+import struct
+import queue
+import json
+import os
+import logging
+
+#Framing: every frame is a header (kind of message, length of the payload) followed by the payload
+HEADER = struct.Struct('<BI')
+LOST = struct.Struct('<I')
+DECIMATION = struct.Struct('<I')
+MSG_SUBSCRIBE = 1 #client to server, payload: decimation (uint32)
+MSG_UNSUBSCRIBE = 2 #client to server, no payload
+MSG_CONFIGURE = 3 #client to server, payload: json dictionary with the parameters of set_custom_configuration (and optionally 'stat')
+MSG_SAMPLES = 16 #server to client, payload: measurements lost since the last frame (uint32), then (timestamp,value) pairs (little endian float64)
+MSG_REPLY = 17 #server to client, payload: json dictionary ('ok','error','setup','stat')
+MSG_SETUP = 18 #server to client, payload: json dictionary ('setup','stat'), sent in the stream when the configuration changes
+SAMPLE_DTYPE = np.dtype('<f8')
+MAX_FRAME = 1<<20 #maximum length of the payload of a request received by the server
+
+def send_frame(sock:socket.socket,kind:int,payload=b''):
+    """
+    Send a frame on a socket.
+    Parameters:
+    :param sock (socket.socket): connected socket
+    :param kind (int): kind of message (MSG_*)
+    :param payload (bytes): payload of the frame
+    """
+    sock.sendall(HEADER.pack(kind,len(payload))+payload)
+
+def recv_exact(sock:socket.socket,size:int) -> bytes:
+    """
+    Read exactly size bytes from a socket.
+    Parameters:
+    :param sock (socket.socket): connected socket
+    :param size (int): number of bytes
+    :return (bytes): bytes read (None if the connection has been closed)
+    """
+    buf = bytearray(size)
+    view = memoryview(buf)
+    k = 0
+    while k<size:
+        n = sock.recv_into(view[k:])
+        if n==0:
+            return None
+        k += n
+    return bytes(buf)
+
+def recv_frame(sock:socket.socket,max_length=None) -> tuple:
+    """
+    Read a frame from a socket.
+    Parameters:
+    :param sock (socket.socket): connected socket
+    :param max_length (int): maximum length of the payload, a longer frame raises ValueError before it is read. If nothing is specified, there is no limit
+    :return (tuple): kind of message and payload (None if the connection has been closed)
+    """
+    header = recv_exact(sock,HEADER.size)
+    if header is None:
+        return None
+    kind,length = HEADER.unpack(header)
+    if max_length!=None and length>max_length:
+        raise ValueError(f'Frame of {length} bytes, the maximum is {max_length}')
+    payload = recv_exact(sock,length) if length>0 else b''
+    if payload is None:
+        return None
+    return kind,payload
+
+class SR620Subscriber():
+    """Class describing a client connected to the server: its decimation and the bounded queue of the measurements still to be sent. The acquisition never waits for a client: when the queue is full, the oldest measurements are discarded and counted as lost"""
+
+    def __init__(self,sock:socket.socket,queue_size:int):
+        """
+        Constructor.
+        Parameters:
+        :param sock (socket.socket): socket of the client
+        :param queue_size (int): maximum number of measurements (after the decimation) waiting to be sent
+        """
+        self.sock = sock
+        self.queue_size = queue_size
+        self.decimation = 0 #0 when the client is not subscribed
+        self.partial = np.empty((0,2)) #measurements not yet averaged (fewer than decimation)
+        self.items = deque() #arrays of measurements and configuration messages, in order
+        self.queued = 0
+        self.lost = 0 #measurements lost since the last frame
+        self.total_lost = 0
+        self.sent = 0
+        self.closed = False
+        self.condition = threading.Condition()
+        self.send_lock = threading.Lock() #the replies are sent by the reading thread, the measurements by the sending one
+
+    def subscribe(self,decimation:int):
+        """
+        Start (or change) the subscription.
+        Parameters:
+        :param decimation (int): number of measurements averaged into every measurement sent (0 to stop the subscription)
+        """
+        with self.condition:
+            self.decimation = decimation
+            self.partial = np.empty((0,2))
+
+    def push(self,block:np.ndarray):
+        """
+        Add a block of measurements to the queue (called by the acquisition). The measurements are averaged in groups of decimation, the last incomplete group is kept for the next block.
+        Parameters:
+        :param block (np.ndarray): array of shape (k,2), with the timestamps in the first column and the values in the second one
+        """
+        with self.condition:
+            d = self.decimation
+            if d==0 or self.closed:
+                return
+            if d>1:
+                if len(self.partial)>0:
+                    block = np.concatenate((self.partial,block))
+                m = len(block)//d
+                self.partial = block[m*d:].copy()
+                block = block[:m*d].reshape(m,d,2).mean(axis=1)
+            if len(block)==0:
+                return
+            self.items.append(block)
+            self.queued += len(block)
+            while self.queued>self.queue_size: #the oldest measurements are discarded (the configuration messages are kept)
+                i = next(i for i,item in enumerate(self.items) if isinstance(item,np.ndarray))
+                first = self.items[i]
+                cut = min(self.queued-self.queue_size,len(first))
+                if cut==len(first):
+                    del self.items[i]
+                else:
+                    self.items[i] = first[cut:]
+                self.queued -= cut
+                self.lost += cut
+                self.total_lost += cut
+            self.condition.notify()
+
+    def notify_setup(self,message:dict):
+        """
+        Add a configuration message to the stream: the measurements sent after it have been measured with the new configuration.
+        Parameters:
+        :param message (dict): dictionary containing the configuration ('setup') and the statistics ('stat')
+        """
+        with self.condition:
+            if self.decimation==0 or self.closed:
+                return
+            self.partial = np.empty((0,2)) #the groups never mix two configurations
+            self.items.append(message)
+            self.condition.notify()
+
+    def close(self):
+        """
+        Stop the sending thread.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def send(self,kind:int,payload=b''):
+        """
+        Send a frame to the client.
+        Parameters:
+        :param kind (int): kind of message (MSG_*)
+        :param payload (bytes): payload of the frame
+        """
+        with self.send_lock:
+            send_frame(self.sock,kind,payload)
+
+    def sender_loop(self):
+        """
+        Body of the sending thread: all the measurements in the queue are sent in a single frame, together with the number of measurements lost since the last frame.
+        """
+        try:
+            while True:
+                with self.condition:
+                    while len(self.items)==0 and not self.closed:
+                        self.condition.wait()
+                    if self.closed:
+                        return
+                    items = list(self.items)
+                    self.items.clear()
+                    self.queued = 0
+                    lost = self.lost
+                    self.lost = 0
+                blocks = []
+                for item in items+[None]:
+                    if isinstance(item,np.ndarray):
+                        blocks.append(item)
+                        continue
+                    if len(blocks)>0 or lost>0:
+                        data = np.concatenate(blocks) if len(blocks)>0 else np.empty((0,2))
+                        self.send(MSG_SAMPLES,LOST.pack(min(lost,0xFFFFFFFF))+np.ascontiguousarray(data,dtype=SAMPLE_DTYPE).tobytes())
+                        self.sent += len(data)
+                        blocks = []
+                        lost = 0
+                    if item is not None:
+                        self.send(MSG_SETUP,json.dumps(item).encode('utf-8'))
+        except OSError: #the client has gone away, its reading thread closes the connection
+            pass
+
+class SR620RequestHandler(socketserver.BaseRequestHandler):
+    """Class handling the connection of a client (one thread per client): it reads the requests, while a second thread sends the measurements"""
+
+    def handle(self):
+        owner = self.server.owner
+        subscriber = SR620Subscriber(self.request,owner.queue_size)
+        sender = threading.Thread(target=subscriber.sender_loop,daemon=True)
+        sender.start()
+        owner.add_subscriber(subscriber)
+        try:
+            while True:
+                frame = recv_frame(self.request,MAX_FRAME)
+                if frame is None:
+                    break
+                kind,payload = frame
+                if kind==MSG_SUBSCRIBE:
+                    subscriber.subscribe(max(DECIMATION.unpack(payload)[0],1))
+                    subscriber.send(MSG_REPLY,json.dumps(dict(owner.get_setup(),ok=True,error=None)).encode('utf-8'))
+                elif kind==MSG_UNSUBSCRIBE:
+                    subscriber.subscribe(0)
+                    subscriber.send(MSG_REPLY,json.dumps({'ok':True,'error':None}).encode('utf-8'))
+                elif kind==MSG_CONFIGURE:
+                    reply = owner.configure(json.loads(payload.decode('utf-8')))
+                    subscriber.send(MSG_REPLY,json.dumps(reply).encode('utf-8'))
+                else:
+                    subscriber.send(MSG_REPLY,json.dumps({'ok':False,'error':f'Unknown message {kind}'}).encode('utf-8'))
+        except OSError: #connection reset by the client
+            pass
+        except (ValueError,struct.error):
+            logging.error('Invalid request from a client, the connection has been closed')
+        finally:
+            owner.remove_subscriber(subscriber)
+            subscriber.close()
+            sender.join()
+
+class ThreadingTCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+if hasattr(socketserver,'ThreadingUnixStreamServer'): #not available on Windows
+    class ThreadingUnixStreamServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+
+class SR620Server():
+    """Class describing a server owning a device and streaming its measurements to many clients. The device is measured continuously by the background acquisition, and a single control thread drains its buffer and distributes the measurements to the queues of the clients, so that a slow client only loses its own measurements. The configuration requests of all the clients are put in a queue and applied by the same control thread, between two blocks of measurements.
+    The protocol has no authentication and no encryption: every process that can connect to the address can read the measurements and change the configuration of the device. Listen on 127.0.0.1 or on a Unix socket (whose file permissions limit the access), and reach a remote server through an SSH tunnel"""
+
+    POLL = 0.05 #maximum time (in seconds) between two checks of the configuration queue
+    REQUEST_TIMEOUT = 30 #maximum time (in seconds) waited for a configuration request to be applied
+
+    def __init__(self,device,address,*,stat=STATISTICS_MEAN,capacity=65536,queue_size=65536):
+        """
+        Constructor.
+        Parameters:
+        :param device (SR620): device owned by the server (already connected)
+        :param address (tuple|str): (host,port) tuple to listen on TCP (port 0 to choose a free port), or path of a Unix socket. Since there is no authentication, a host other than 127.0.0.1 exposes the device to the network
+        :param stat (str): string representing the statistics to measure. Options: STATISTICS_MEAN,STATISTICS_JITTER,STATISTICS_MAX,STATISTICS_MIN
+        :param capacity (int): capacity of the buffer of the background acquisition
+        :param queue_size (int): maximum number of measurements waiting to be sent to every client
+        """
+        self.device = device
+        self.requested_address = address
+        self.stat = stat
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.server = None
+        self.threads = []
+        self.running = threading.Event()
+        self.requests = queue.Queue()
+        self.subscribers = []
+        self.subscribers_lock = threading.Lock()
+        self.buffer = None
+        self.error = None
+        self.statistics = {'samples':0,'configurations':0,'clients':0}
+
+    @property
+    def address(self):
+        """Address on which the server is listening (with the actual port when port 0 has been requested)"""
+        return self.server.server_address if self.server!=None else self.requested_address
+
+    def start(self):
+        """
+        Start the acquisition and the server.
+        """
+        if isinstance(self.requested_address,str):
+            if os.path.exists(self.requested_address) and S_ISSOCK(os.stat(self.requested_address).st_mode):
+                os.unlink(self.requested_address) #socket left by a previous server
+            self.server = ThreadingUnixStreamServer(self.requested_address,SR620RequestHandler)
+        else:
+            self.server = ThreadingTCPServer(self.requested_address,SR620RequestHandler)
+        self.server.owner = self
+        self.running.set()
+        self.buffer = self.device.start_background_acquisition(self.stat,capacity=self.capacity)
+        self.threads = [
+            threading.Thread(target=self.__control_loop__,daemon=True),
+            threading.Thread(target=self.server.serve_forever,kwargs={'poll_interval':self.POLL},daemon=True),
+        ]
+        for thread in self.threads:
+            thread.start()
+        logging.debug(f'Server listening on {self.address}')
+
+    def stop(self):
+        """
+        Stop the server, the acquisition and the connections with the clients.
+        """
+        if self.server is None:
+            return
+        self.running.clear()
+        self.server.shutdown()
+        for thread in self.threads:
+            thread.join()
+        with self.subscribers_lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            try:
+                subscriber.sock.shutdown(socket.SHUT_RDWR) #the threads of the client are stopped
+            except OSError:
+                pass
+        self.server.server_close()
+        if isinstance(self.requested_address,str) and os.path.exists(self.requested_address):
+            os.unlink(self.requested_address)
+        self.server = None
+        logging.debug(f'Server stopped: {self.get_statistics()}')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.stop()
+
+    def add_subscriber(self,subscriber:SR620Subscriber):
+        with self.subscribers_lock:
+            self.subscribers.append(subscriber)
+            self.statistics['clients'] += 1
+
+    def remove_subscriber(self,subscriber:SR620Subscriber):
+        with self.subscribers_lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+
+    def get_setup(self) -> dict:
+        """
+        Return the configuration of the device and the statistics measured.
+        Parameters:
+        :return (dict): dictionary containing the configuration ('setup') and the statistics ('stat')
+        """
+        return {'setup':dict(self.device.setup.items()),'stat':self.stat}
+
+    def configure(self,params:dict) -> dict:
+        """
+        Put a configuration request in the queue and wait until it has been applied (called by the threads of the clients).
+        Parameters:
+        :param params (dict): parameters of set_custom_configuration, and optionally 'stat' (statistics to measure)
+        :return (dict): reply sent to the client, containing 'ok', 'error', 'setup' and 'stat'
+        """
+        if not self.running.is_set() or self.error!=None:
+            return {'ok':False,'error':'The acquisition has been terminated'}
+        reply = {}
+        done = threading.Event()
+        self.requests.put((params,reply,done))
+        if not done.wait(self.REQUEST_TIMEOUT):
+            return {'ok':False,'error':'The configuration request has not been applied in time'}
+        return reply
+
+    def __apply_request__(self,params:dict,reply:dict):
+        """
+        Apply a configuration request: the acquisition is stopped, the measurements left in the buffer are distributed, the configuration is applied and the acquisition is started again. The request is accepted only when the configuration read back from the device is the requested one.
+        Parameters:
+        :param params (dict): parameters of set_custom_configuration, and optionally 'stat'
+        :param reply (dict): reply, filled with the result
+        """
+        params = dict(params)
+        stat = params.pop('stat',None)
+        try:
+            if stat!=None and stat not in self.device.STAT_DICT:
+                raise SR620ValueException()
+            requested = update_configuration(self.device.setup,**params) #the parameters are checked before stopping the acquisition
+        except Exception as e:
+            reply.update(ok=False,error=repr(e))
+            return
+        self.device.stop_background_acquisition()
+        self.__fan_out__(self.buffer.drain())
+        try:
+            self.device.set_custom_configuration(**params) #the errors are logged, not raised
+            if self.device.device_state==requested:
+                if stat!=None:
+                    self.stat = stat
+                reply.update(self.get_setup(),ok=True,error=None)
+                self.statistics['configurations'] += 1
+            else:
+                applied = dict(self.device.device_state.items()) if self.device.device_state!=None else None
+                reply.update(self.get_setup(),ok=False,error=f'Configuration not applied, device configuration: {applied}')
+                logging.error('Configuration request not applied by the device')
+        except Exception as e:
+            reply.update(self.get_setup(),ok=False,error=repr(e))
+        finally:
+            if not self.device.cont: #the connection has been lost while configuring
+                try:
+                    self.device.reconnect()
+                except Exception: #the acquisition terminates at once, and the server with it
+                    pass
+            message = self.get_setup()
+            with self.subscribers_lock:
+                for subscriber in self.subscribers:
+                    subscriber.notify_setup(message)
+            self.buffer = self.device.start_background_acquisition(self.stat,capacity=self.capacity)
+
+    def __fan_out__(self,block:np.ndarray):
+        """
+        Distribute a block of measurements to all the clients (never blocking).
+        Parameters:
+        :param block (np.ndarray): array of shape (k,2), with the timestamps in the first column and the values in the second one
+        """
+        if len(block)==0:
+            return
+        self.statistics['samples'] += len(block)
+        with self.subscribers_lock:
+            for subscriber in self.subscribers:
+                subscriber.push(block)
+
+    def __control_loop__(self):
+        """
+        Body of the control thread: the configuration requests are applied one at a time, and the measurements of the background acquisition are distributed to the clients.
+        """
+        try:
+            while self.running.is_set():
+                try:
+                    params,reply,done = self.requests.get_nowait()
+                except queue.Empty:
+                    pass
+                else:
+                    self.__apply_request__(params,reply)
+                    done.set()
+                    continue
+                if self.buffer.wait(1,timeout=self.POLL):
+                    self.__fan_out__(self.buffer.drain())
+                elif self.buffer.closed:
+                    self.__fan_out__(self.buffer.drain())
+                    self.error = self.buffer.error if self.buffer.error!=None else SR620ReadException()
+                    logging.error('Acquisition of the server terminated')
+                    break
+        finally:
+            self.device.stop_background_acquisition()
+            while not self.requests.empty(): #the requests left are never applied
+                params,reply,done = self.requests.get_nowait()
+                reply.update(ok=False,error='The acquisition has been terminated')
+                done.set()
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of the server.
+        Parameters:
+        :return (dict): dictionary containing the number of measurements distributed ('samples'), of configurations applied ('configurations'), of clients connected since the start ('clients') and connected now ('connected'), and for every connected client the measurements sent and lost
+        """
+        with self.subscribers_lock:
+            clients = [{'decimation':s.decimation,'sent':s.sent,'lost':s.total_lost,'queued':s.queued} for s in self.subscribers]
+        return dict(self.statistics,connected=len(clients),subscribers=clients)
+
+class SR620Client():
+    """Class describing a client of the server: it subscribes to the measurements of the device (optionally decimated by the server) and sends configuration requests"""
+
+    def __init__(self,address,*,timeout=10):
+        """
+        Constructor.
+        Parameters:
+        :param address (tuple|str): (host,port) tuple of a TCP server, or path of a Unix socket
+        :param timeout (float): maximum time (in seconds) to wait for the reply to a request
+        """
+        family = socket.AF_UNIX if isinstance(address,str) else socket.AF_INET
+        self.sock = socket.socket(family,socket.SOCK_STREAM)
+        self.sock.connect(address)
+        self.timeout = timeout
+        self.pending = deque() #frames of measurements read while waiting for a reply
+        self.setup = None
+        self.stat = None
+        self.lost = 0
+
+    def close(self):
+        """
+        Close the connection with the server.
+        """
+        self.sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def __request__(self,kind:int,payload=b'') -> dict:
+        """
+        Send a request and wait for its reply. The measurements received in the meantime are kept for read.
+        Parameters:
+        :param kind (int): kind of message (MSG_*)
+        :param payload (bytes): payload of the request
+        :return (dict): reply of the server
+        """
+        send_frame(self.sock,kind,payload)
+        while True:
+            frame = self.__read_frame__(self.timeout)
+            if frame is None:
+                logging.error('No reply from the server! The execution has been concluded... please, check the connection!')
+                raise SR620ReadException()
+            kind,payload = frame
+            if kind==MSG_REPLY:
+                reply = json.loads(payload.decode('utf-8'))
+                if not reply['ok']:
+                    logging.error(f"Request refused by the server: {reply['error']}")
+                    raise SR620ValueException()
+                return reply
+            self.pending.append(frame)
+
+    def __read_frame__(self,timeout) -> tuple:
+        """
+        Read a frame, waiting at most timeout seconds for its first byte (a frame is always read whole).
+        Parameters:
+        :param timeout (float): maximum time to wait (in seconds). If nothing is specified, there is no limit
+        :return (tuple): kind of message and payload (None if nothing arrived in time or the connection has been closed)
+        """
+        ready,_,_ = select.select([self.sock],[],[],timeout)
+        if len(ready)==0:
+            return None
+        return recv_frame(self.sock)
+
+    def subscribe(self,decimation=1) -> dict:
+        """
+        Subscribe to the measurements of the device.
+        Parameters:
+        :param decimation (int): number of measurements averaged by the server into every measurement sent (the timestamp is the mean of their timestamps)
+        :return (dict): configuration of the device ('setup') and statistics measured ('stat')
+        """
+        reply = self.__request__(MSG_SUBSCRIBE,DECIMATION.pack(decimation))
+        self.setup = reply['setup']
+        self.stat = reply['stat']
+        return reply
+
+    def unsubscribe(self):
+        """
+        Stop receiving the measurements.
+        """
+        self.__request__(MSG_UNSUBSCRIBE)
+
+    def configure(self,**params) -> dict:
+        """
+        Ask the server to apply a configuration. The request is queued with the ones of the other clients; the measurements already queued keep the previous configuration.
+        Parameters:
+        :param params: parameters of set_custom_configuration (mode,source,jitter,arming,size,clock,clock_frequency), and optionally stat
+        :return (dict): configuration of the device ('setup') and statistics measured ('stat')
+        """
+        reply = self.__request__(MSG_CONFIGURE,json.dumps(params).encode('utf-8'))
+        return {'setup':reply['setup'],'stat':reply['stat']}
+
+    def read(self,timeout=None) -> np.ndarray:
+        """
+        Read the next block of measurements. The configuration messages received before it update setup and stat, and the measurements lost by the server are added to lost.
+        Parameters:
+        :param timeout (float): maximum time to wait (in seconds). If nothing is specified, there is no limit
+        :return (np.ndarray): array of shape (k,2), with the timestamps in the first column and the values in the second one (empty if nothing arrived in time, None if the connection has been closed)
+        """
+        while True:
+            if len(self.pending)>0:
+                frame = self.pending.popleft()
+            else:
+                ready,_,_ = select.select([self.sock],[],[],timeout)
+                if len(ready)==0:
+                    return np.empty((0,2))
+                frame = recv_frame(self.sock)
+                if frame is None:
+                    return None
+            kind,payload = frame
+            if kind==MSG_SETUP:
+                message = json.loads(payload.decode('utf-8'))
+                self.setup = message['setup']
+                self.stat = message['stat']
+            elif kind==MSG_SAMPLES:
+                self.lost += LOST.unpack_from(payload)[0]
+                return np.frombuffer(payload,dtype=SAMPLE_DTYPE,offset=LOST.size).reshape(-1,2)
+
+    def iter_samples(self):
+        """
+        Generate the blocks of measurements until the connection is closed.
+        Parameters:
+        :return (generator): generator of arrays of shape (k,2)
+        """
+        while True:
+            block = self.read()
+            if block is None:
+                return
+            yield block
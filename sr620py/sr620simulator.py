@@ -0,0 +1,221 @@
+'''
+Simulator of the SR620 library: an in-process device understanding the commands sent by the library and generating synthetic oscillator data, to test and benchmark the acquisition without a physical counter
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620protocol import *
+import numpy as np
+import time
+
+NOISE_WHITE_FM = 'white_fm'
+NOISE_WHITE_PM = 'white_pm'
+NOISE_RANDOM_WALK_FM = 'random_walk_fm'
+
+class SimulatedSerial():
+    """Class describing a simulated SR620, exposing the interface of a serial port (write, read, read_until, in_waiting, ...). It can be passed to the SR620 constructor in place of a real serial port.
+    The time spent by the device is modelled (transmission at the chosen baud rate, latency of the device and gate time of the measurements): it is accumulated in a virtual clock and, when realtime is set on True, also waited for"""
+
+    BITS_PER_BYTE = 10 #start bit, 8 data bits, stop bit
+    MAX_SAMPLES = 100000 #maximum number of samples generated for a single measurement
+    DEFAULT_GATE = 0.001 #gate time (in seconds) of the arming modes without a fixed gate
+
+    def __init__(self,*,f_0=10e6,noise=NOISE_WHITE_FM,sigma=1e-11,interval=1e-6,baudrate=9600,latency=0.002,realtime=True,seed=None):
+        """
+        Constructor.
+        Parameters:
+        :param f_0 (float): nominal frequency of the simulated oscillator
+        :param noise (str): kind of noise of the oscillator. Options: NOISE_WHITE_FM, NOISE_WHITE_PM, NOISE_RANDOM_WALK_FM
+        :param sigma (float): level of the noise (fractional frequency for NOISE_WHITE_FM and NOISE_RANDOM_WALK_FM, fractional phase per gate for NOISE_WHITE_PM)
+        :param interval (float): nominal time interval (in seconds) returned in time and width mode
+        :param baudrate (int): simulated baud rate of the link
+        :param latency (float): simulated time (in seconds) spent by the device to process a command
+        :param realtime (bool): when it is set on True, the modelled times are actually waited for, otherwise they are only accumulated in the virtual clock
+        :param seed (int): seed of the random generator, to reproduce the same data
+        """
+        self.f_0 = f_0
+        self.noise = noise
+        self.sigma = sigma
+        self.interval = interval
+        self.baudrate = baudrate
+        self.latency = latency
+        self.realtime = realtime
+        self.rng = np.random.default_rng(seed)
+        self.timeout = None
+        self.is_open = True
+        self.elapsed = 0.0 #virtual clock
+        self.buffer = bytearray()
+        self.ready_at = 0.0 #virtual time at which the bytes in the buffer are available
+        self.walk = 0.0 #state of the random walk
+        self.last_phase = 0.0 #state of the white phase noise
+        self.setup = {'mode':MODE_DICT['freq'],'source':0,'armm':ARMM_DICT['1s'],'size':0,'jttr':0,'clock':0,'clockfr':0}
+        self.commands = 0
+
+    def __spend__(self,seconds:float):
+        """
+        Advance the virtual clock, waiting for the same time when realtime is set on True.
+        Parameters:
+        :param seconds (float): time spent (in seconds)
+        """
+        self.elapsed += seconds
+        if self.realtime and seconds>0:
+            time.sleep(seconds)
+
+    def __transmission_time__(self,num_bytes:int) -> float:
+        """
+        Return the time needed to transmit a number of bytes at the simulated baud rate.
+        """
+        return num_bytes*self.BITS_PER_BYTE/self.baudrate
+
+    @property
+    def in_waiting(self) -> int:
+        """
+        Number of bytes available in the input buffer.
+        """
+        return len(self.buffer) if self.elapsed>=self.ready_at else 0
+
+    def reset_input_buffer(self):
+        self.buffer.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+    def write(self,data:bytes) -> int:
+        """
+        Write commands on the simulated device. The responses are appended to the input buffer, and are available after the modelled time.
+        Parameters:
+        :param data (bytes): commands, terminated by a carriage return
+        :return (int): number of bytes written
+        """
+        self.__spend__(self.__transmission_time__(len(data)))
+        busy = self.latency
+        response = b''
+        for line in data.decode('ASCII').split('\r'):
+            for command in line.split(';'):
+                command = command.strip()
+                if command!='':
+                    self.commands += 1
+                    out,gate = self.__execute__(command)
+                    response += out
+                    busy += gate
+        if response!=b'':
+            self.ready_at = max(self.ready_at,self.elapsed)+busy+self.__transmission_time__(len(response))
+            self.buffer += response
+        return len(data)
+
+    def __wait_ready__(self):
+        """
+        Wait until the bytes in the input buffer are available.
+        """
+        if self.elapsed<self.ready_at:
+            self.__spend__(self.ready_at-self.elapsed)
+
+    def read(self,size=1) -> bytes:
+        self.__wait_ready__()
+        out = bytes(self.buffer[:size])
+        del self.buffer[:size]
+        return out
+
+    def read_until(self,expected=b'\n',size=None) -> bytes:
+        self.__wait_ready__()
+        i = self.buffer.find(expected)
+        end = len(self.buffer) if i<0 else i+len(expected) #a real port would block: the simulator returns what it has
+        out = bytes(self.buffer[:end])
+        del self.buffer[:end]
+        return out
+
+    def readall(self) -> bytes:
+        return self.read(len(self.buffer))
+
+    def __execute__(self,command:str) -> tuple:
+        """
+        Execute a single command.
+        Parameters:
+        :param command (str): command, without terminators
+        :return (tuple): response of the device (bytes) and time spent measuring (in seconds)
+        """
+        name = command[:4].upper()
+        arg = command[4:].strip()
+        if name=='MEAS':
+            stat = int(arg.lstrip('?') or 0)
+            size = int(SIZE_LIST[self.setup['size']])
+            return (f'{self.__measure__(stat,size):.15E}\r\n'.encode('ASCII'),self.__gate_time__()*size)
+        if name=='BDMP':
+            n = int(arg)
+            scale = BDMP_SCALE.get(self.__mode__(),1.0)
+            if self.__mode__()=='freq': #the frequency records count over the gate
+                scale /= self.__gate_time__()
+            values = self.__values__(n)
+            return (np.round(values/scale).astype('<i8').tobytes(),self.__gate_time__()*n)
+        if name=='STUP':
+            x = (self.setup['jttr']<<5)|(self.setup['clock']<<6)|(self.setup['clockfr']<<7)
+            fields = [self.setup['mode'],self.setup['source'],self.setup['armm'],0,self.setup['size'],0,0,x]
+            return ((','.join(str(v) for v in fields)+'\r\n').encode('ASCII'),0.0)
+        if name=='*IDN':
+            return (b'StanfordResearchSystems,SR620,00000,1.0 (simulated)\r\n',0.0)
+        setters = {'SRCE':'source','MODE':'mode','ARMM':'armm','JTTR':'jttr','CLCK':'clock','CLKF':'clockfr'}
+        if name in setters:
+            self.setup[setters[name]] = int(float(arg))
+        elif name=='SIZE':
+            self.setup['size'] = SIZE_LIST.index(float(arg))
+        return (b'',0.0) #STOP, AUTM and the unknown commands have no response
+
+    def __mode__(self) -> str:
+        return get_key_from_value(MODE_DICT,self.setup['mode'])
+
+    def __gate_time__(self) -> float:
+        """
+        Return the gate time of a single sample, according to the arming mode.
+        """
+        armm = get_key_from_value(ARMM_DICT,self.setup['armm'])
+        if armm in ('1per','ext1per'):
+            return 1/self.f_0
+        return ARMM_TIME.get(armm,self.DEFAULT_GATE)
+
+    def __fractional_frequency__(self,n:int) -> np.ndarray:
+        """
+        Generate n samples of fractional frequency, according to the kind of noise of the oscillator.
+        """
+        if self.noise==NOISE_RANDOM_WALK_FM:
+            y = self.walk+np.cumsum(self.rng.normal(0,self.sigma,n))
+            self.walk = float(y[-1])
+            return y
+        if self.noise==NOISE_WHITE_PM:
+            x = np.concatenate(([self.last_phase],self.rng.normal(0,self.sigma,n)))
+            self.last_phase = float(x[-1])
+            return np.diff(x)
+        return self.rng.normal(0,self.sigma,n)
+
+    def __values__(self,n:int) -> np.ndarray:
+        """
+        Generate n single-shot measurements, according to the mode of measurement.
+        """
+        y = self.__fractional_frequency__(n)
+        mode = self.__mode__()
+        if mode in ('time','width'):
+            return self.interval*(1+y)
+        if mode=='period':
+            return 1/(self.f_0*(1+y))
+        if mode=='count':
+            return np.round(self.f_0*self.__gate_time__()*(1+y))
+        return self.f_0*(1+y)
+
+    def __measure__(self,stat:int,size:int) -> float:
+        """
+        Generate a measurement of the chosen statistics over size samples.
+        """
+        values = self.__values__(min(size,self.MAX_SAMPLES))
+        if stat==STAT_DICT['jitter']:
+            if len(values)<2:
+                return 0.0
+            if self.setup['jttr']==JTTR_DICT['ALL']:
+                return float(np.sqrt(np.mean(np.diff(values)**2)/2))
+            return float(np.std(values,ddof=1))
+        if stat==STAT_DICT['max']:
+            return float(values.max())
+        if stat==STAT_DICT['min']:
+            return float(values.min())
+        return float(values.mean())
@@ -0,0 +1,213 @@
+'''
+Sample store of the SR620 library: persistent, memory-mapped storage of (timestamp,value) records for long campaigns, with a coarse time index for range queries
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620recorder import SR620Recorder
+from .sr620utils import compute_allan, allan_to_dict
+from .sr620allan import OnlineAllan
+from .sr620constants import *
+import numpy as np
+import struct
+import logging
+import os
+
+class SampleStore():
+    """Class describing a file of fixed-width records (timestamp in seconds since the epoch and value, both float64), accessed through a memory map.
+    The file starts with a header of 64 bytes (magic, version, number of records). The records are appended in place, and the number of records in the header is updated only after they are synced, so that the file is always consistent.
+    A coarse index (one timestamp every index_every records) is kept in memory: the records between two times are found with two binary searches, and returned as a view of the file (without copying them)"""
+
+    MAGIC = b'SR620STO'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIIQ')
+    HEADER_LEN = 64
+    RECORD_LEN = 16
+
+    def __init__(self,file_path:str,*,mode='a',grow_rows=1<<16,index_every=1024):
+        """
+        Constructor.
+        Parameters:
+        :param file_path (str): path of the store
+        :param mode (str): 'a' to open the store for appending (it is created if it does not exist), 'r' to open it read-only
+        :param grow_rows (int): number of records by which the file is extended when it is full
+        :param index_every (int): number of records between two entries of the coarse index
+        """
+        if mode not in ('a','r'):
+            raise ValueError("The mode must be 'a' or 'r'")
+        self.file_path = file_path
+        self.mode = mode
+        self.grow_rows = grow_rows
+        self.index_every = index_every
+        if mode=='a' and not os.path.exists(file_path):
+            with open(file_path,'wb') as fout:
+                fout.write(self.HEADER.pack(self.MAGIC,self.VERSION,0,0).ljust(self.HEADER_LEN,b'\0'))
+        self.fout = open(file_path,'r+b' if mode=='a' else 'rb')
+        magic,version,_,count = self.HEADER.unpack(self.fout.read(self.HEADER.size))
+        if magic!=self.MAGIC or version!=self.VERSION:
+            self.fout.close()
+            raise ValueError(f'{file_path} is not a sample store')
+        self.count = count
+        self.capacity = 0
+        self.data = None
+        self.__map__(max(count,(os.path.getsize(file_path)-self.HEADER_LEN)//self.RECORD_LEN))
+        self.index = np.array(self.data[:count:index_every,0]) #strided read: one page every index_every records
+
+    def __map__(self,capacity:int):
+        """
+        Map the records of the file, extending it (in append mode) to the requested number of records.
+        Parameters:
+        :param capacity (int): number of records that the file must be able to hold
+        """
+        if isinstance(self.data,np.memmap):
+            self.data.flush()
+        if self.mode=='a' and capacity>self.capacity:
+            self.fout.truncate(self.HEADER_LEN+capacity*self.RECORD_LEN)
+        self.capacity = capacity
+        if capacity==0: #an empty file cannot be mapped
+            self.data = np.empty((0,2),dtype='<f8')
+            return
+        self.data = np.memmap(self.file_path,dtype='<f8',mode='r+' if self.mode=='a' else 'r',offset=self.HEADER_LEN,shape=(capacity,2))
+
+    def __len__(self) -> int:
+        return self.count
+
+    def append(self,timestamp:float,value:float):
+        """
+        Append a record to the store. The record is made durable by the next flush.
+        Parameters:
+        :param timestamp (float): timestamp of the measurement, in seconds since the epoch
+        :param value (float): value of the measurement
+        """
+        self.append_many(np.array([[timestamp,value]],dtype=np.float64))
+
+    def append_many(self,records:np.ndarray):
+        """
+        Append several records to the store. The records are made durable by the next flush. The time index needs non decreasing timestamps: a timestamp lower than the previous one (i.e. after the system clock has been stepped back) is replaced by the previous one, and a warning is logged.
+        Parameters:
+        :param records (np.ndarray): array with two columns, containing the timestamps (in seconds since the epoch) and the values
+        """
+        if self.mode!='a':
+            raise ValueError('The store is open read-only')
+        n = len(records)
+        if n==0:
+            return
+        ts = records[:,0]
+        last = self.data[self.count-1,0] if self.count>0 else -np.inf
+        clamped = np.maximum.accumulate(np.concatenate(([last],ts)))[1:]
+        if np.any(clamped!=ts):
+            logging.warning(f'{int(np.count_nonzero(clamped!=ts))} timestamp(s) going backwards replaced by the previous one in {self.file_path}')
+            records = np.column_stack((clamped,records[:,1]))
+            ts = clamped
+        if self.count+n>self.capacity:
+            self.__map__(max(self.count+n,self.capacity+self.grow_rows))
+        start = self.count
+        self.data[start:start+n] = records
+        first = -(-start//self.index_every)*self.index_every #first indexed record among the new ones
+        if first<start+n:
+            self.index = np.concatenate((self.index,ts[first-start::self.index_every]))
+        self.count += n
+
+    def flush(self):
+        """
+        Sync the records on the disk, then update the number of records in the header.
+        """
+        if self.mode!='a':
+            return
+        if isinstance(self.data,np.memmap):
+            self.data.flush()
+        self.fout.seek(0)
+        self.fout.write(self.HEADER.pack(self.MAGIC,self.VERSION,0,self.count))
+        self.fout.flush()
+        os.fsync(self.fout.fileno())
+
+    def close(self):
+        """
+        Flush the records and close the store. The space reserved for the following records is released.
+        """
+        self.flush()
+        self.data = None
+        if self.mode=='a':
+            self.fout.truncate(self.HEADER_LEN+self.count*self.RECORD_LEN)
+        self.fout.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        self.close()
+
+    def __locate__(self,t:float) -> int:
+        """
+        Return the position of the first record whose timestamp is not lower than t. A binary search on the coarse index selects a block of index_every records, then a binary search inside the block selects the record.
+        Parameters:
+        :param t (float): time, in seconds since the epoch
+        :return (int): position of the record (the number of records if all the timestamps are lower than t)
+        """
+        k = int(np.searchsorted(self.index,t,side='left'))
+        lo = max(k-1,0)*self.index_every
+        hi = min(k*self.index_every,self.count)
+        if k==0:
+            return 0
+        return lo+int(np.searchsorted(self.data[lo:hi,0],t,side='left'))
+
+    def range(self,start=None,end=None) -> np.ndarray:
+        """
+        Return the records whose timestamps are in [start,end), as a view of the file (the records are not copied, nor loaded until they are accessed).
+        Parameters:
+        :param start (float): first time, in seconds since the epoch. If nothing is specified, the range starts from the first record
+        :param end (float): last time (excluded), in seconds since the epoch. If nothing is specified, the range ends with the last record
+        :return (np.ndarray): array with two columns, containing the timestamps and the values
+        """
+        i = 0 if start is None else self.__locate__(start)
+        j = self.count if end is None else self.__locate__(end)
+        return self.data[i:max(i,j)]
+
+    def iter_chunks(self,start=None,end=None,*,chunk_rows=1<<16):
+        """
+        Generator of the records whose timestamps are in [start,end), in chunks of at most chunk_rows records (views of the file).
+        Parameters:
+        :param start (float): first time, in seconds since the epoch
+        :param end (float): last time (excluded), in seconds since the epoch
+        :param chunk_rows (int): maximum number of records of every chunk
+        :return (generator): generator of arrays with two columns
+        """
+        records = self.range(start,end)
+        for i in range(0,len(records),chunk_rows):
+            yield records[i:i+chunk_rows]
+
+    def compute_allan_variance(self,tau0:float,*,start=None,end=None,command=ALLAN_OVERLAPPING,f_0=None,max_m=None,chunk_rows=1<<16) -> dict:
+        """
+        Compute the Allan Deviation of the values whose timestamps are in [start,end). Only the selected range is read from the file.
+        When max_m is specified, the values are read from the memory map in chunks of chunk_rows records and added to an online estimator (OnlineAllan), so that the memory used is bounded by max_m whatever the length of the range. Otherwise the values of the range are copied in memory (8 bytes per record) and computed with compute_allan, as in the measurement sets.
+        Parameters:
+        :param tau0 (float): averaging time of a single measurement (in seconds)
+        :param start (float): first time, in seconds since the epoch
+        :param end (float): last time (excluded), in seconds since the epoch
+        :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+        :param f_0 (float): nominal frequency. If no value is given, the nominal frequency will be the mean of the values
+        :param max_m (int): if specified, largest averaging factor (octave spaced averaging times up to tau0*max_m), computed in chunks with bounded memory
+        :param chunk_rows (int): number of records read at once when max_m is specified
+        :return (dict): dictionary whose keys are the averaging times, while the values are the corresponding Allan Deviations (empty if the range has fewer than 3 values)
+        """
+        if max_m!=None:
+            est = OnlineAllan(tau0,f_0=f_0,max_m=max_m)
+            for chunk in self.iter_chunks(start,end,chunk_rows=chunk_rows):
+                est.add_many(chunk[:,1])
+            return est.result(command) if est.count>=3 else {}
+        values = self.range(start,end)[:,1]
+        if len(values)<3:
+            return {}
+        if f_0 is not None:
+            values = (values-f_0)/f_0
+        return allan_to_dict(compute_allan(values,1/tau0,command,normalized=f_0 is not None))
+
+class StoreRecorder(SR620Recorder):
+    """Recorder saving the measurements in a sample store (.sr620 files). Existing stores are appended to, so that a campaign can be split in several measurement sets"""
+
+    def open(self):
+        self.fout = SampleStore(self.file_path,mode='a')
+
+    def write_batch(self,batch:np.ndarray):
+        self.fout.append_many(batch)
+        self.fout.flush()
@@ -0,0 +1,176 @@
+'''
+Sweep runner of the SR620 library: a list of steps (configuration, statistics and number of measurements) executed in the order minimizing the reconfigurations, with the saving and the analysis of every step overlapped with the acquisition of the following one
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620protocol import *
+from .sr620constants import *
+from .sr620recorder import open_recorder
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+import numpy as np
+import time
+import logging
+
+@dataclass
+class SweepStep():
+    """Class describing a step of a sweep: configuration to apply (with the names of the parameters of set_custom_configuration, i.e. {'source':SOURCE_B,'arming':ARMING_SECOND}), statistics to measure and number of measurements. Optionally, the measurements can be saved in a file and passed to an analysis function.
+    The parameters that are not specified are kept on the configuration of the device at the start of the sweep, so that the result of a step does not depend on the order of execution"""
+
+    configuration: dict = field(default_factory=dict)
+    stat: str = STATISTICS_MEAN
+    count: int = 100
+    name: str = None
+    file_path: str = None
+    analysis: object = None #function receiving the array of the measurements (timestamps and values), whose result is returned with the step
+
+def configuration_distance(a:Setup,b:Setup) -> int:
+    """
+    Return the number of fields that differ between two configurations (number of commands needed to go from one to the other).
+    Parameters:
+    :param a (Setup): first configuration
+    :param b (Setup): second configuration
+    :return (int): number of different fields
+    """
+    return sum(1 for (field,x),(_,y) in zip(a.items(),b.items()) if x!=y)
+
+def order_steps(steps:list,current:Setup) -> list:
+    """
+    Order the steps of a sweep so that the number of configuration changes is minimized: starting from the current configuration, the next step is always the nearest one (greedy), and the steps with the same configuration are kept in their original order.
+    Parameters:
+    :param steps (list): list of SweepStep
+    :param current (Setup): current configuration of the device
+    :return (list): list of (index,step,configuration) tuples in the order of execution, where index is the position of the step in the original list and configuration is the Setup applied. The configurations are checked as in set_custom_configuration: an invalid one raises SR620ValueException (or SR620SizeException), and the name of the step is logged
+    """
+    pending = []
+    for i,step in enumerate(steps): #every step is checked before the first one is executed
+        name = step.name if step.name!=None else f'step {i}'
+        unknown = [param for param in step.configuration if param not in CONF_PARAMETERS]
+        if len(unknown)>0:
+            logging.error(f"The parameters {unknown} of {name} do not exist! The execution has been concluded... please, check the documentation!")
+            raise SR620ValueException()
+        try:
+            conf = update_configuration(current,**step.configuration)
+        except (SR620ValueException,SR620SizeException):
+            logging.error(f"The configuration {step.configuration} of {name} is not valid! The sweep has not been started")
+            raise
+        pending.append((i,step,conf))
+    order = []
+    state = current
+    while len(pending)>0:
+        k = min(range(len(pending)),key=lambda k: (configuration_distance(state,pending[k][2]),pending[k][0]))
+        i,step,conf = pending.pop(k)
+        order.append((i,step,conf))
+        state = conf
+    return order
+
+class SR620Sweep():
+    """Class running a sweep of measurement sets on a device. The steps are reordered to minimize the reconfigurations, the saving and the analysis of every step run in a background thread while the following step is acquired, and the time spent in every phase is collected in a profile"""
+
+    def __init__(self,device):
+        """
+        Constructor.
+        Parameters:
+        :param device (SR620): device on which the sweep is run (already connected)
+        """
+        self.device = device
+        self.profile = []
+
+    def __postprocess__(self,step:SweepStep,data:np.ndarray) -> tuple:
+        """
+        Save and analyse the measurements of a step (executed in the background thread).
+        Parameters:
+        :param step (SweepStep): step
+        :param data (np.ndarray): array of the measurements (timestamps and values)
+        :return (tuple): result of the analysis and time spent (in seconds)
+        """
+        start = time.perf_counter()
+        if step.file_path!=None:
+            with open_recorder(step.file_path,step.stat,flush_rows=max(len(data),1)) as recorder:
+                for ts,value in data:
+                    recorder.append(value,ts)
+        result = step.analysis(data) if step.analysis!=None else None
+        return result,time.perf_counter()-start
+
+    def run(self,steps:list,*,reorder=True,print=True) -> list:
+        """
+        Run the steps of a sweep.
+        Parameters:
+        :param steps (list): list of SweepStep
+        :param reorder (bool): when it is set on True, the steps are executed in the order minimizing the reconfigurations (see order_steps), otherwise in the given order
+        :return (list): list of dictionaries, one for every step in the given order, containing the keys 'name','position' (order of execution),'configuration','stat','values' (array of the measurements with timestamps and values),'analysis' (result of the analysis function),'error' (configuration not applied by the device, or error of the saving or of the analysis, None if no error occurred) and 'timing'. The steps not executed because the sweep has been terminated are None
+        """
+        dev = self.device
+        order = order_steps(steps,dev.setup.copy())
+        if not reorder:
+            order.sort(key=lambda item: item[0])
+        if print: logging.debug(f'Sweep started: {len(steps)} steps, {self.count_changes(order,dev.setup)} configuration changes')
+        results = [None]*len(steps)
+        pending = []
+        self.profile = []
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            for position,(i,step,conf) in enumerate(order):
+                timing = {}
+                start = time.perf_counter()
+                dev.set_custom_configuration(**{param:getattr(conf,field) for param,field in CONF_PARAMETERS.items()})
+                timing['configure'] = time.perf_counter()-start
+                name = step.name if step.name!=None else f'step {i}'
+                if dev.device_state!=conf: #rejected by the device (or the connection has been lost): the step is not measured
+                    applied = dict(dev.device_state.items()) if dev.device_state!=None else None
+                    results[i] = {'name':name,'position':position,'configuration':dict(conf.items()),'stat':step.stat,'values':np.empty((0,2)),'analysis':None,'error':f'Configuration not applied, device configuration: {applied}','timing':timing}
+                    logging.error(f'Configuration of step {name} not applied, the step has been skipped')
+                    if not dev.cont:
+                        logging.error('Sweep terminated')
+                        break
+                    continue
+                start = time.perf_counter()
+                data = np.empty((step.count,2),dtype=np.float64)
+                k = 0
+                for ts,value in dev.iter_measurements(step.stat,step.count):
+                    data[k] = (ts,value)
+                    k += 1
+                data = data[:k]
+                timing['acquire'] = time.perf_counter()-start
+                timing['samples'] = k
+                results[i] = {'name':name,'position':position,'configuration':dict(conf.items()),'stat':step.stat,'values':data,'analysis':None,'error':None,'timing':timing}
+                pending.append((i,executor.submit(self.__postprocess__,step,data)))
+                if print: logging.debug(f"Step {results[i]['name']} acquired: {k} measurements in {timing['acquire']:.3f} s")
+                if not dev.cont:
+                    logging.error('Sweep terminated')
+                    break
+            for i,future in pending:
+                start = time.perf_counter()
+                try:
+                    results[i]['analysis'],results[i]['timing']['postprocess'] = future.result()
+                except Exception as e: #the other steps are kept
+                    results[i]['error'] = repr(e)
+                    logging.error(f"Saving or analysis of step {results[i]['name']} terminated")
+                results[i]['timing']['wait'] = time.perf_counter()-start #time spent waiting for the background thread at the end of the sweep
+        self.profile = [{'name':res['name'],'position':res['position'],**res['timing']} for res in results if res!=None]
+        if print:
+            for row in sorted(self.profile,key=lambda row: row['position']):
+                logging.debug(f'Sweep profile: {row}')
+        return results
+
+    def count_changes(self,order:list,current:Setup) -> int:
+        """
+        Return the number of configuration fields changed by a sequence of steps.
+        Parameters:
+        :param order (list): list of (index,step,configuration) tuples returned by order_steps
+        :param current (Setup): initial configuration
+        :return (int): number of fields changed
+        """
+        total = 0
+        for i,step,conf in order:
+            total += configuration_distance(current,conf)
+            current = conf
+        return total
+
+    def get_profile(self) -> list:
+        """
+        Return the timing profile of the last sweep.
+        Parameters:
+        :return (list): list of dictionaries, one for every step executed, containing the name, the position in the order of execution, the time spent configuring the device, acquiring, saving/analysing (in the background thread) and waiting for the background thread at the end (in seconds), and the number of measurements
+        """
+        return self.profile
@@ -0,0 +1,133 @@
+'''
+Transport layer of the SR620 library: framing of the commands written on the device and of the responses read from it
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from .sr620instrument import SR620Instrumentation
+import time
+import logging
+
+class SR620Transport():
+    """Class describing the link with the device. It frames the commands sent to the instrument and the responses read from it, keeping track of the time spent for each command"""
+
+    COMMAND_TERMINATOR = b'\r'
+    RESPONSE_TERMINATOR = b'\r\n'
+
+    def __init__(self,port,instrumentation=None):
+        """
+        Constructor.
+        Parameters:
+        :param port (serial.Serial): open serial port (or any object exposing the same interface) on which the device is connected
+        :param instrumentation (SR620Instrumentation): statistics in which the time spent writing, waiting for the device and reading is collected. If nothing is specified, a new one is created
+        """
+        self.port = port
+        self.instrumentation = SR620Instrumentation() if instrumentation is None else instrumentation
+        self.num_commands = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def discard_stale(self):
+        """
+        Discard the bytes left in the input buffer by a previous command. Nothing is done (and no time is spent) when the buffer is empty.
+        """
+        if self.port.in_waiting:
+            self.port.reset_input_buffer()
+
+    def send(self,command:str):
+        """
+        Write a command on the device.
+        Parameters:
+        :param command (str): command that must be executed, according to the format requested by the device ('command(?) param')
+        """
+        with self.instrumentation.measure('write'):
+            self.discard_stale()
+            self.port.write(command.encode('ASCII')+self.COMMAND_TERMINATOR)
+            self.port.flush()
+
+    def read_response(self) -> str:
+        """
+        Read a single response from the device, up to the response terminator. The time spent waiting for the first byte (device wait) is measured separately from the time spent reading the rest of the response.
+        Parameters:
+        :return (str): response of the device
+        """
+        with self.instrumentation.measure('wait'):
+            first = self.port.read(1)
+        with self.instrumentation.measure('read'):
+            if first==self.RESPONSE_TERMINATOR[:1]:
+                rest = self.port.read_until(self.RESPONSE_TERMINATOR[1:])
+            else:
+                rest = self.port.read_until(self.RESPONSE_TERMINATOR)
+        return (first+rest).decode('utf-8')
+
+    def read_bytes(self,num_bytes:int) -> bytes:
+        """
+        Read a fixed number of raw bytes from the device.
+        Parameters:
+        :param num_bytes (int): number of bytes to read
+        :return (bytes): bytes read from the device
+        """
+        with self.instrumentation.measure('wait'):
+            first = self.port.read(1)
+        with self.instrumentation.measure('read'):
+            return first+self.port.read(num_bytes-1) if num_bytes>1 else first
+
+    def query(self,command:str,needs_response=True) -> str:
+        """
+        Write a command on the device and, if requested, read its response. The time spent is added to the statistics of the transport.
+        Parameters:
+        :param command (str): command that must be executed
+        :param needs_response (bool): when an output is expected from the device must be set on True, otherwise on False
+        :return (str): response of the device (None when needs_response is set on False)
+        """
+        start = time.perf_counter()
+        try:
+            self.send(command)
+            return self.read_response() if needs_response else None
+        finally:
+            self.account(time.perf_counter()-start,1)
+
+    def query_many(self,commands:list) -> list:
+        """
+        Pipelined mode: write all the commands on the device before reading their responses. A response is read for each command containing a query ('?').
+        Parameters:
+        :param commands (list): list of commands that must be executed
+        :return (list): list of the responses, one for each query, in the same order of the commands
+        """
+        start = time.perf_counter()
+        try:
+            self.discard_stale()
+            for command in commands:
+                self.port.write(command.encode('ASCII')+self.COMMAND_TERMINATOR)
+            self.port.flush()
+            return [self.read_response() for command in commands if '?' in command]
+        finally:
+            self.account(time.perf_counter()-start,len(commands))
+
+    def account(self,elapsed:float,num_commands=1):
+        """
+        Update the statistics of the transport.
+        Parameters:
+        :param elapsed (float): time spent, in seconds
+        :param num_commands (int): number of commands executed in that time
+        """
+        self.num_commands += num_commands
+        self.total_time += elapsed
+        self.last_time = elapsed
+        if logging.root.isEnabledFor(logging.DEBUG): #no formatting on the hot path when the debug log is disabled
+            logging.debug('%d command(s) executed in %.1f ms',num_commands,elapsed*1000)
+
+    def get_statistics(self) -> dict:
+        """
+        Return the statistics of the transport.
+        Parameters:
+        :return (dict): dictionary containing the number of commands executed, the total time spent and the mean time spent per command (in seconds)
+        """
+        mean = self.total_time/self.num_commands if self.num_commands>0 else 0.0
+        return {'commands':self.num_commands,'total_time':self.total_time,'mean_time':mean}
+
+    def close(self):
+        """
+        Close the underlying port.
+        """
+        self.port.close()
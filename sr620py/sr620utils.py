@@ -1,7 +1,5 @@
 from .sr620exceptions import *
-import matplotlib
-import matplotlib.pyplot as plt
-from tqdm import tqdm
+import numpy as np
 import threading
 import time
 import logging
@@ -29,6 +27,7 @@ def get_bit(x, i):
     return bit
 
 def progress(tot,p,dev):
+    from tqdm import tqdm #imported only when a progress bar is shown
     #logging.debug('Start measuring...')
     for j in tqdm(range(int(tot+tot*0.1))):
         time.sleep(p)
@@ -41,16 +40,89 @@ def start_progress(tot,p,dev):
     threadpr.start()
     return threadpr
 
+class EpochClock():
+    """Class describing a clock giving the time in seconds since the epoch. The wall clock is read only once, when the clock is created: the following readings are derived from time.monotonic, so that they never go backwards when the system clock is adjusted (i.e. by NTP)"""
+
+    def __init__(self):
+        self.anchor = time.time()-time.monotonic()
+
+    def now(self) -> float:
+        """
+        Return the current time.
+        Parameters:
+        :return (float): time in seconds since the epoch
+        """
+        return self.anchor+time.monotonic()
+
+def decode_binary_dump(buf:bytes,scale:float,*,gate=None,out=None) -> np.ndarray:
+    """
+    Decode the records of a binary dump (64 bit two's complement integers, LSB first) into the values of the measurements. The frequency records count in units of scale over the gate, so their values are divided by the gate time.
+    Parameters:
+    :param buf (bytes): records read from the device
+    :param scale (float): value of a unit of the records, according to the mode of the device (see BDMP_SCALE)
+    :param gate (float): gate time (in seconds) of the frequency measurements. If nothing is specified, the records are only multiplied by scale
+    :param out (np.ndarray): if specified, the values are written in this preallocated array (which must have one element for every record)
+    :return (np.ndarray): values of the measurements
+    """
+    factor = scale if gate is None else scale/gate
+    return np.multiply(np.frombuffer(buf,dtype='<i8'),factor,out=out)
+
 def tot_allan_time(p):
     tot = 0
     for i in range(1,p+1):
         tot = tot+int(float(f'1e{i}'))
     return tot
 
+def compute_allan(lst:list,rate:float,command:str,*,normalized=True):
+    """
+    Compute the Allan Variance of a set of frequency measurements.
+    Parameters:
+    :param lst (list): list (or array) of frequency measurements
+    :param rate (float): sampling rate of the measurements (1/averaging time)
+    :param command (str): kind of Allan Variance to compute. Options: ALLAN_CLASSIC, ALLAN_OVERLAPPING, ALLAN_MODIFIED
+    :param normalized (bool): when it is set on False, the measurements are normalized with respect to their mean
+    :return (allantools.Dataset): dataset containing the result of the computation
+    """
+    import allantools #imported only when an Allan Variance is computed
+    lst = np.asarray(lst,dtype=np.float64)
+    if not normalized: #if no nominal frequency is given, we use the mean of the measurements
+        mean = lst.mean()
+        lst = (lst-mean)/mean
+    a = allantools.Dataset(data=lst,rate=rate,data_type='freq')
+    a.compute(command)
+    return a
+
+def allan_to_dict(a) -> dict:
+    """
+    Convert the result of an Allan Variance computation into a dictionary.
+    Parameters:
+    :param a (allantools.Dataset): dataset containing the result of the computation
+    :return (dict): dictionary whose keys are the averaging times, while the values are the corresponding Allan Variances
+    """
+    return {float(a.out['taus'][i]):float(a.out['stat'][i]) for i in range(len(a.out['taus']))}
+
+def save_allan(a,path):
+    """
+    Save the result of an Allan Variance computation in a csv file.
+    Parameters:
+    :param a (allantools.Dataset): dataset containing the result of the computation (or dictionary returned by allan_to_dict)
+    :param path (str): path of the output file
+    """
+    dct = a if isinstance(a,dict) else allan_to_dict(a)
+    with open(path,'w') as fout:
+        fout.write(f'averaging time,allan deviation\n')
+        for tau,dev in dct.items():
+            fout.write(f"{float(tau)},{float(dev)}\n")
+
 def save_plot(a,path):
+    import matplotlib #imported only when a plot is saved
+    import matplotlib.pyplot as plt
     matplotlib.set_loglevel("warning")
     plt.figure(figsize=(8,6))
-    plt.errorbar(a.out['taus'], a.out['stat'], yerr=a.out['stat_err'], marker='o', linestyle='-', color='b')
+    if isinstance(a,dict): #no error bars available
+        plt.plot(list(a.keys()), list(a.values()), marker='o', linestyle='-', color='b')
+    else:
+        plt.errorbar(a.out['taus'], a.out['stat'], yerr=a.out['stat_err'], marker='o', linestyle='-', color='b')
     plt.xscale('log')
     plt.yscale('log')
     plt.xlabel('Tau (s)')
@@ -0,0 +1,50 @@
+'''
+Tests of the batch analysis of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620analysis import analyze_recordings
+from sr620py.sr620utils import compute_allan, allan_to_dict
+from sr620py.sr620constants import *
+from datetime import datetime, timezone
+import numpy as np
+import pytest
+
+def recording(tmp_path,name,n=2000,seed=0):
+    data = np.column_stack((np.arange(n,dtype=np.float64),10e6*(1+np.random.default_rng(seed).normal(0,1e-11,n))))
+    path = str(tmp_path/name)
+    np.save(path,data)
+    return path,data
+
+def test_analysis_and_cache(tmp_path):
+    path,data = recording(tmp_path,'day1.npy')
+    cache = str(tmp_path/'cache')
+    results = analyze_recordings([path],commands=[ALLAN_OVERLAPPING],f_0=10e6,processes=2,cache_dir=cache,print=False)
+    assert len(results)==1 and results[0]['error'] is None and not results[0]['cached']
+    ref = allan_to_dict(compute_allan((data[:,1]-10e6)/10e6,1.0,ALLAN_OVERLAPPING))
+    assert results[0]['result']==pytest.approx(ref)
+    results = analyze_recordings([path],commands=[ALLAN_OVERLAPPING],f_0=10e6,processes=2,cache_dir=cache,print=False)
+    assert results[0]['cached'] and results[0]['result']==pytest.approx(ref)
+
+def test_errors_are_returned_per_file(tmp_path):
+    path,_ = recording(tmp_path,'day1.npy')
+    results = analyze_recordings([str(tmp_path/'missing.npy'),path],commands=[ALLAN_OVERLAPPING,'foo'],processes=2,print=False)
+    assert len(results)==3
+    assert results[0]['channel'] is None and 'missing.npy' in results[0]['error']
+    assert results[1]['error'] is None and len(results[1]['result'])>0
+    assert results[2]['error']!=None and results[2]['result']=={} #the failing computation does not stop the others
+
+def test_gaps_are_dropped(tmp_path):
+    _,data = recording(tmp_path,'day1.npy')
+    values = data[:,1].copy()
+    values[100:110] = np.nan #the device did not answer for 10 samples
+    path = str(tmp_path/'table.csv')
+    with open(path,'w') as fout:
+        fout.write('timestamp,a mean\n')
+        for t,v in zip(data[:,0],values):
+            fout.write(f'{datetime.fromtimestamp(t,timezone.utc).isoformat()},{v}\n')
+    results = analyze_recordings([path],commands=[ALLAN_OVERLAPPING],f_0=10e6,processes=1,print=False)
+    assert results[0]['error'] is None and results[0]['samples']==len(values)-10
+    assert results[0]['tau0']==1.0
+    assert all(np.isfinite(dev) for dev in results[0]['result'].values())
@@ -0,0 +1,89 @@
+'''
+Tests of the asynchronous client of the SR620 library, connected through a socket pair to a minimal device
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620async import AsyncSR620
+from sr620py.sr620constants import *
+import asyncio
+import socket
+import pytest
+
+class FakeDevice():
+    """Minimal device answering on a socket: STUP?, MEAS? and the configuration commands, with a delay before every response"""
+
+    SETTERS = {'MODE':0,'SRCE':1,'ARMM':2}
+
+    def __init__(self,delay=0.01):
+        self.fields = [3,0,5,0,0,0,0,0] #frequency, source A, 1 s arming, size 1
+        self.delay = delay
+        self.log = []
+
+    async def serve(self,reader,writer):
+        try:
+            while True:
+                line = await reader.readuntil(b'\r')
+                for command in line.decode('ASCII').strip().split(';'):
+                    if command=='':
+                        continue
+                    self.log.append(command)
+                    name,arg = command[:4],command[4:]
+                    if name in self.SETTERS:
+                        self.fields[self.SETTERS[name]] = int(arg)
+                    elif name=='STUP':
+                        await asyncio.sleep(self.delay)
+                        writer.write((','.join(str(v) for v in self.fields)+'\r\n').encode('ASCII'))
+                    elif name=='MEAS':
+                        await asyncio.sleep(self.delay)
+                        writer.write(b'1.000000000000000E+07\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError,ConnectionError):
+            pass
+
+async def open_device(fake:FakeDevice,**kwargs):
+    a,b = socket.socketpair()
+    device_reader,device_writer = await asyncio.open_connection(sock=b)
+    server = asyncio.ensure_future(fake.serve(device_reader,device_writer))
+    reader,writer = await asyncio.open_connection(sock=a)
+    dev = AsyncSR620(reader,writer,**kwargs)
+    await dev.__retrieve_parameters__()
+    return dev,server
+
+def test_measure():
+    async def main():
+        dev,server = await open_device(FakeDevice())
+        assert dev.mode==MODE_FREQUENCY
+        assert await dev.measure(STATISTICS_MEAN)==10e6
+        values = [v async for ts,v in dev.iter_measurements(STATISTICS_MEAN,3)]
+        assert values==[10e6]*3
+        await dev.close_connection()
+        server.cancel()
+    asyncio.run(main())
+
+def test_concurrent_setters_are_not_interleaved():
+    async def main():
+        fake = FakeDevice()
+        dev,server = await open_device(fake)
+        fake.log.clear()
+        await asyncio.gather(dev.set_mode(MODE_PERIOD),dev.set_source(SOURCE_B),dev.measure(STATISTICS_MEAN))
+        assert dev.device_state.mode==MODE_PERIOD and dev.device_state.source==SOURCE_B
+        assert fake.fields[:2]==[4,1]
+        writes = [i for i,command in enumerate(fake.log) if command[:4] in FakeDevice.SETTERS]
+        for i in writes: #every configuration write is followed by its own readback
+            assert fake.log[i+1]=='STUP?'
+        await dev.close_connection()
+        server.cancel()
+    asyncio.run(main())
+
+def test_timeout_discards_late_response():
+    async def main():
+        fake = FakeDevice(delay=0.2)
+        dev,server = await open_device(fake)
+        with pytest.raises(asyncio.TimeoutError):
+            await dev.__query__('MEAS?0',timeout=0.05)
+        fake.delay = 0.0
+        assert (await dev.__query__('STUP?')).startswith('3,0,5') #the late response of MEAS? is discarded
+        await dev.close_connection()
+        server.cancel()
+    asyncio.run(main())
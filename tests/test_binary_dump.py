@@ -0,0 +1,29 @@
+'''
+Tests of the decoding of the binary dump records of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620utils import decode_binary_dump
+import numpy as np
+import struct
+import pytest
+
+TIME_SCALE = 1.05963812934e-14
+FREQ_SCALE = 1.24900090270e-9
+
+def test_time_record():
+    buf = bytes.fromhex('40420f0000000000')+bytes.fromhex('ffffffffffffffff') #1000000 and -1 units
+    assert np.allclose(decode_binary_dump(buf,TIME_SCALE),[1e6*TIME_SCALE,-TIME_SCALE])
+
+def test_frequency_record_depends_on_gate():
+    buf = bytes.fromhex('c76be259d1480000') #10 MHz over a gate of 1 cs
+    assert struct.unpack('<q',buf)[0]==80063993375687
+    assert decode_binary_dump(buf,FREQ_SCALE,gate=0.01)[0]==pytest.approx(10e6,rel=1e-12)
+    assert decode_binary_dump(buf,FREQ_SCALE,gate=1)[0]==pytest.approx(1e5,rel=1e-12) #the same record over a gate of 1 s
+
+def test_decode_in_place():
+    out = np.zeros(4)
+    buf = np.array([1,2],dtype='<i8').tobytes()
+    decode_binary_dump(buf,2.0,out=out[1:3])
+    assert np.array_equal(out,[0,2,4,0])
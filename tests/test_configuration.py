@@ -0,0 +1,103 @@
+'''
+Tests of the configuration diffing of the SR620 library, run against a minimal scripted device
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import SR620
+from sr620py.sr620constants import *
+import serial
+import pytest
+
+class ConfigurationPort():
+    """Port emulating the configuration commands of the device (the setters and STUP?), and recording the commands written"""
+
+    SETTERS = {'MODE':0,'SRCE':1,'ARMM':2}
+    SIZES = [1,2,5,1e1,2e1,5e1,1e2,2e2,5e2,1e3,2e3,5e3,1e4,2e4,5e4,1e5,2e5,5e5,1e6,2e6,5e6]
+    FLAGS = {'JTTR':5,'CLCK':6,'CLKF':7}
+
+    def __init__(self):
+        self.stup = [3,0,5,0,0,0,0,0]
+        self.written = []
+        self.input = bytearray()
+        self.baudrate = 9600
+        self.timeout = None
+
+    @property
+    def in_waiting(self):
+        return len(self.input)
+
+    def reset_input_buffer(self):
+        self.input.clear()
+
+    def write(self,data):
+        for line in data.decode('ASCII').split('\r')[:-1]:
+            self.written.append(line)
+            for command in line.split(';'):
+                name,_,arg = command.strip().partition(' ')
+                if name=='STUP?':
+                    self.input += (','.join(str(v) for v in self.stup)+'\r\n').encode('ASCII')
+                elif name in self.SETTERS:
+                    self.stup[self.SETTERS[name]] = int(arg)
+                elif name=='SIZE':
+                    self.stup[4] = self.SIZES.index(float(arg))
+                elif name in self.FLAGS:
+                    bit = 1<<self.FLAGS[name]
+                    self.stup[7] = (self.stup[7]&~bit)|(bit if int(arg) else 0)
+
+    def flush(self):
+        pass
+
+    def read(self,size=1):
+        data = bytes(self.input[:size])
+        del self.input[:size]
+        return data
+
+    def read_until(self,expected=b'\n',size=None):
+        end = self.input.find(expected)
+        return self.read(len(self.input) if end<0 else end+len(expected))
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def device(monkeypatch):
+    port = ConfigurationPort()
+    monkeypatch.setattr(serial,'Serial',lambda *args,**kwargs: port)
+    dev = SR620('/dev/ttyFAKE')
+    port.written.clear()
+    yield dev
+    dev.close_connection()
+
+def setters(port:ConfigurationPort) -> list:
+    return [line for line in port.written if 'STUP?' not in line]
+
+def test_only_changed_fields_are_sent(device):
+    port = device.ser
+    device.set_mode(MODE_PERIOD)
+    assert setters(port)==['MODE 4;']
+    assert device.mode==MODE_PERIOD
+    port.written.clear()
+    device.set_mode(MODE_PERIOD) #already set: nothing is written
+    assert port.written==[]
+
+def test_transaction_sends_a_single_command(device):
+    port = device.ser
+    with device.configuration():
+        device.set_mode(MODE_PERIOD)
+        device.set_source(SOURCE_B)
+        device.set_arming(ARMING_CENTISECOND)
+        assert port.written==[] #nothing is sent inside the transaction
+    sent = setters(port)
+    assert len(sent)==1
+    assert {command.strip() for command in sent[0].split(';') if command.strip()!=''}=={'MODE 4','SRCE 1','ARMM 3'}
+    assert (device.mode,device.source,device.armm)==(MODE_PERIOD,SOURCE_B,ARMING_CENTISECOND)
+
+def test_transaction_discarded_on_error(device):
+    port = device.ser
+    with pytest.raises(RuntimeError):
+        with device.configuration():
+            device.set_mode(MODE_PERIOD)
+            raise RuntimeError()
+    assert port.written==[]
+    assert device.mode==MODE_FREQUENCY
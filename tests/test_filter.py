@@ -0,0 +1,57 @@
+'''
+Tests of the outlier filter of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+import numpy as np
+import pytest
+
+def test_median_and_mad_match_numpy():
+    rng = np.random.default_rng(0)
+    f = OutlierFilter(window=31,threshold=1e9)
+    v = np.round(rng.normal(0,1,500),1) #with repeated values
+    for k,x in enumerate(v):
+        f.process(float(x))
+        w = v[max(0,k-30):k+1]
+        m = np.median(w)
+        assert f.median()==pytest.approx(m)
+        assert f.mad()==pytest.approx(np.median(np.abs(w-m)))
+
+def test_drop_and_flag():
+    v = 10e6+np.random.default_rng(1).normal(0,1e-3,1000)
+    glitches = [100,400,401,777]
+    v[glitches] += 1.0 #missed triggers
+    drop = OutlierFilter(window=51,threshold=5.0)
+    kept = [x for x in v if drop.process(x)]
+    assert len(kept)==len(v)-len(glitches)
+    assert drop.get_statistics()['dropped']==len(glitches)
+    flag = OutlierFilter(window=51,threshold=5.0,mode=FILTER_FLAG)
+    assert all(flag.process(x) for x in v)
+    assert flag.flagged==glitches
+    stats = flag.get_statistics()
+    assert (stats['outliers'],stats['dropped'],stats['flagged'])==(4,0,4)
+
+def test_follows_a_step():
+    f = OutlierFilter(window=21,threshold=5.0)
+    v = np.concatenate((np.random.default_rng(2).normal(0,1,100),100+np.random.default_rng(3).normal(0,1,100)))
+    kept = [f.process(x) for x in v]
+    assert not all(kept[100:111]) #the first values after the step are outliers
+    assert all(kept[111:]) #then the window follows the new level
+
+def test_filter_in_allan_variance():
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    try:
+        dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1,arming=ARMING_CENTISECOND)
+        f = OutlierFilter(window=51,threshold=1.0) #a low threshold, so that part of the measurements is discarded
+        dct = dev.start_measurement_allan_variance(300,f_0=10e6,outlier_filter=f,progress=False,print=False)
+        assert len(dct)>0
+        assert f.get_statistics()['dropped']>0
+        assert f.samples==300+f.outliers #the discarded measurements are taken again
+    finally:
+        dev.close_connection()
+
+def test_invalid_mode():
+    with pytest.raises(ValueError):
+        OutlierFilter(mode='keep')
@@ -0,0 +1,36 @@
+'''
+Tests of the hybrid Allan acquisition of the SR620 library (device-side averaging for the long averaging times)
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620allan import plan_hybrid_allan, merge_allan
+import numpy as np
+import pytest
+
+def test_plan():
+    plan = plan_hybrid_allan(0.01,2.0,raw_max_m=50)
+    assert (plan['raw'],plan['size'],plan['blocks'])==(550,50,44)
+    assert plan['split_tau']==0.5
+    assert plan['transfers']<plan['transfers_raw']
+    plan = plan_hybrid_allan(1.0,100,raw_max_m=1000) #short run: single-shot measurements only
+    assert (plan['size'],plan['blocks'],plan['raw'])==(1,0,1100)
+    assert plan['split_tau']==float('inf')
+
+def test_merge():
+    short = {0.1:3.0,0.2:2.0,0.5:1.5,1.0:1.0}
+    long = {0.5:1.4,1.0:0.9,2.0:0.7}
+    assert merge_allan(short,long,0.5)=={0.1:3.0,0.2:2.0,0.5:1.4,1.0:0.9,2.0:0.7}
+
+def test_hybrid_run_white_fm():
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0,sigma=1e-11))
+    try:
+        dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1,arming=ARMING_CENTISECOND)
+        dct = dev.start_hybrid_allan_variance(2.0,f_0=10e6,raw_max_m=50,progress=False,print=False)
+        assert dev.start_hybrid_allan_variance(2.0,command=ALLAN_MODIFIED,progress=False,print=False)=={} #the modified variance needs every gate
+    finally:
+        dev.close_connection()
+    assert min(dct)==0.01 and max(dct)>=2.0
+    for tau,adev in dct.items(): #white FM: the deviation falls as 1/sqrt(tau) on both sides of the split
+        assert adev*np.sqrt(tau/0.01)==pytest.approx(1e-11,rel=0.5)
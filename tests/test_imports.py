@@ -0,0 +1,31 @@
+'''
+Tests of the import cost of the SR620 library: the optional heavy dependencies are loaded only when they are used
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+import subprocess
+import sys
+import os
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def loaded_modules(code:str,modules:list) -> list:
+    check = f"import sys\n{code}\nprint(','.join(m for m in {modules!r} if m in sys.modules))"
+    out = subprocess.run([sys.executable,'-c',check],cwd=ROOT,capture_output=True,text=True,check=True).stdout.strip()
+    return [m for m in out.split(',') if m!='']
+
+def test_import_does_not_load_heavy_modules():
+    assert loaded_modules('import sr620py',['matplotlib','allantools','tqdm'])==[]
+
+def test_async_client_is_imported_on_first_use():
+    assert loaded_modules('import sr620py',['asyncio','sr620py.sr620async'])==[]
+    assert loaded_modules('from sr620py import AsyncSR620',['asyncio','sr620py.sr620async'])==['asyncio','sr620py.sr620async']
+
+def test_monitor_is_imported_on_first_use():
+    assert loaded_modules('import sr620py',['sr620py.sr620monitor'])==[]
+    assert loaded_modules('from sr620py import SR620Monitor',['sr620py.sr620monitor','matplotlib','tqdm'])==['sr620py.sr620monitor']
+
+def test_server_is_imported_on_first_use():
+    assert loaded_modules('import sr620py',['sr620py.sr620server','socketserver'])==[]
+    assert loaded_modules('from sr620py import SR620Client',['sr620py.sr620server'])==['sr620py.sr620server']
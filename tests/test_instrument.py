@@ -0,0 +1,41 @@
+'''
+Tests of the per-stage instrumentation of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620instrument import SR620Instrumentation, StageStatistics
+import pytest
+
+def test_stage_statistics():
+    s = StageStatistics()
+    for k in range(99):
+        s.add(1e-3)
+    s.add(1.0)
+    summary = s.summary()
+    assert summary['count']==100
+    assert summary['min']==1e-3 and summary['max']==1.0
+    assert summary['mean']==pytest.approx((99e-3+1.0)/100)
+    assert 1e-3<=summary['p50']<=1e-3*10**0.1 #upper edge of the bin
+    assert summary['p99']<=1e-3*10**0.1
+    s.reset()
+    assert s.summary()['count']==0 and s.summary()['min']==0.0
+
+def test_disabled_instrumentation():
+    inst = SR620Instrumentation(enabled=False)
+    with inst.measure('write'):
+        pass
+    assert inst.get_statistics()['write']['count']==0
+
+def test_device_stages():
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    try:
+        dev.instrumentation.reset()
+        dev.start_measurement_set(STATISTICS_MEAN,20,print=False)
+        stats = dev.get_instrumentation_statistics()
+        for stage in ('write','wait','read','parse'):
+            assert stats[stage]['count']==20
+        assert stats['record']['count']==0 #nothing saved
+    finally:
+        dev.close_connection()
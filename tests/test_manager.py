@@ -0,0 +1,76 @@
+'''
+Tests of the manager of several SR620 devices
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620manager import SR620Manager, align_by_time
+import numpy as np
+import pytest
+
+class FakeDevice():
+    """Device returning a constant value, which can lose the connection after a number of measurements"""
+
+    def __init__(self,value,fail_after=None):
+        self.value = value
+        self.fail_after = fail_after
+        self.count = 0
+        self.cont = True
+
+    def measure(self,stat,progress=True):
+        self.count += 1
+        if self.fail_after!=None and self.count>self.fail_after:
+            self.cont = False
+            return None
+        return self.value
+
+    def close_connection(self):
+        pass
+
+def test_align_mixed_gate_times():
+    fast = (np.arange(20)*0.1,np.arange(20,dtype=float)) #gate of 0.1 s
+    slow = (np.array([0.0,1.0]),np.array([5.0,6.0])) #gate of 1 s
+    table = align_by_time({'fast':fast,'slow':slow})
+    assert np.allclose(table['timestamp'],[0.0,1.0,2.0])
+    assert np.array_equal(table['slow'][:2],[5.0,6.0])
+    assert np.isnan(table['slow'][2])
+    assert np.allclose(table['fast'],[np.mean(range(0,5)),np.mean(range(5,15)),np.mean(range(15,20))]) #rows of +/-0.5 s
+
+def test_align_empty_device():
+    table = align_by_time({'a':(np.array([0.0,1.0,2.0]),np.array([1.0,2.0,3.0])),'b':(np.empty(0),np.empty(0))})
+    assert np.array_equal(table['a'],[1.0,2.0,3.0])
+    assert np.all(np.isnan(table['b']))
+
+def test_align_no_measurements():
+    table = align_by_time({'a':(np.empty(0),np.empty(0))})
+    assert len(table['timestamp'])==0 and len(table['a'])==0
+
+def test_align_single_samples():
+    table = align_by_time({'a':(np.array([10.0]),np.array([1.0])),'b':(np.array([15.0]),np.array([2.0]))})
+    assert np.allclose(table['timestamp'],[10.0,15.0]) #the step is the whole span
+    assert np.array_equal(table['a'][:1],[1.0]) and np.isnan(table['a'][1])
+    assert np.isnan(table['b'][0]) and np.array_equal(table['b'][1:],[2.0])
+
+def test_manager_isolates_failures(tmp_path):
+    manager = SR620Manager({'a':FakeDevice(1.0),'b':FakeDevice(2.0,fail_after=3)})
+    path = str(tmp_path/'set.csv')
+    table = manager.start_measurement_set('mean',10,file_path=path,print=False)
+    stats = manager.get_statistics()
+    assert stats['a']['samples']==10 and stats['a']['error'] is None
+    assert stats['b']['samples']==3 and stats['b']['error']!=None
+    assert np.nansum(table['b'])==pytest.approx(2.0*np.sum(~np.isnan(table['b'])))
+    lines = open(path).read().splitlines()
+    assert lines[0]=='timestamp,a mean,b mean'
+    assert len(lines)==len(table['timestamp'])+1
+
+def test_manager_reports_worker_errors():
+    manager = SR620Manager({'a':FakeDevice(1.0)})
+    def broken(*args):
+        raise RuntimeError('bug in the worker')
+    manager.__measure_device__ = broken
+    manager.start_measurement_set('mean',5,print=False)
+    assert 'bug in the worker' in manager.get_statistics()['a']['error']
+
+def test_manager_needs_devices():
+    with pytest.raises(ValueError):
+        SR620Manager({})
@@ -0,0 +1,66 @@
+'''
+Tests of the live monitor of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620monitor import SR620Monitor, MinMaxDecimator
+import sr620py.sr620 as sr620
+import numpy as np
+import pytest
+
+def test_decimator_keeps_peaks():
+    rng = np.random.default_rng(0)
+    v = rng.normal(0,1,10000)
+    v[1234] = 50.0
+    v[8765] = -50.0
+    dec = MinMaxDecimator(100)
+    for k,x in enumerate(v):
+        dec.add(float(k),x)
+    t,d = dec.series()
+    assert len(t)<=200
+    assert np.all(np.diff(t)>=0)
+    assert d.max()==50.0 and t[d.argmax()]==1234
+    assert d.min()==-50.0 and t[d.argmin()]==8765
+    width = dec.width #every bucket holds the extremes of width consecutive samples
+    for k in range(dec.used):
+        chunk = v[k*width:(k+1)*width]
+        assert sorted(d[2*k:2*k+2])==[chunk.min(),chunk.max()]
+
+def test_decimator_short_series():
+    dec = MinMaxDecimator(10)
+    for k in range(5):
+        dec.add(float(k),float(k))
+    t,d = dec.series()
+    assert np.array_equal(t,np.repeat(np.arange(5.0),2))
+    assert np.array_equal(d,t)
+
+def test_monitor_snapshot(tmp_path):
+    path = str(tmp_path/'live.png')
+    v = 10e6*(1+np.random.default_rng(1).normal(0,1e-11,3000))
+    with SR620Monitor(f_0=10e6,snapshot_path=path,interval=60,progress=False) as monitor:
+        monitor.start(len(v),tau0=0.5)
+        for k,x in enumerate(v):
+            monitor.update(100.0+0.5*k,x)
+        data = monitor.snapshot()
+    assert data['count']==3000
+    assert data['times'].min()>=0.0 and data['times'].max()<=0.5*2999 #relative to the first measurement
+    assert min(data['allan'])==0.5
+    assert data['allan'][0.5]==pytest.approx(1e-11,rel=0.1)
+    with open(path,'rb') as fin:
+        assert fin.read(8)==b'\x89PNG\r\n\x1a\n' #the last snapshot is written by stop
+
+def test_monitor_replaces_progress_bar(monkeypatch):
+    def fail(*args):
+        raise AssertionError('The default progress bar has been started')
+    monkeypatch.setattr(sr620,'start_progress',fail)
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    try:
+        dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1,arming=ARMING_CENTISECOND)
+        monitor = SR620Monitor(progress=False)
+        dct = dev.start_measurement_allan_variance(300,f_0=10e6,monitor=monitor,progress=True,print=False)
+        assert len(dct)>0 and monitor.count==300
+        assert monitor.get_tau0()==0.01
+    finally:
+        dev.close_connection()
@@ -0,0 +1,65 @@
+'''
+Tests of the online Allan Variance estimator of the SR620 library, validated against allantools
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620allan import OnlineAllan
+from sr620py.sr620utils import compute_allan, allan_to_dict
+from sr620py.sr620constants import *
+import numpy as np
+import pytest
+
+TOLERANCE = 1e-6 #maximum relative difference from allantools
+COMMANDS = (ALLAN_CLASSIC,ALLAN_OVERLAPPING,ALLAN_MODIFIED)
+
+@pytest.fixture(scope='module')
+def values():
+    rng = np.random.default_rng(0)
+    return 10e6+rng.normal(0,1e-3,20000)+np.cumsum(rng.normal(0,1e-5,20000))
+
+def check_agreement(est:OnlineAllan,values:np.ndarray,tau0:float,f_0=None):
+    lst = values if f_0 is None else (values-f_0)/f_0
+    for command in COMMANDS:
+        ref = allan_to_dict(compute_allan(lst,1/tau0,command,normalized=f_0 is not None))
+        res = est.result(command)
+        common = [tau for tau in res if tau in ref]
+        assert len(common)>=10
+        for tau in common:
+            assert res[tau]==pytest.approx(ref[tau],rel=TOLERANCE)
+
+@pytest.mark.parametrize('f_0',[None,10e6])
+def test_agreement_with_allantools(values,f_0):
+    est = OnlineAllan(0.1,f_0=f_0,max_m=len(values))
+    est.add_many(values)
+    check_agreement(est,values,0.1,f_0)
+
+def test_single_samples_match_blocks(values):
+    a = OnlineAllan(1.0,f_0=10e6,max_m=1024,batch=100)
+    for v in values[:5000]:
+        a.add(float(v))
+    b = OnlineAllan(1.0,f_0=10e6,max_m=1024)
+    for block in np.array_split(values[:5000],37): #blocks of any length
+        b.add_many(block)
+    for command in COMMANDS:
+        ra,rb = a.result(command),b.result(command)
+        assert ra.keys()==rb.keys()
+        for tau in ra:
+            assert ra[tau]==pytest.approx(rb[tau],rel=1e-9)
+
+def test_results_mid_run_and_state(values):
+    est = OnlineAllan(1.0,max_m=len(values))
+    est.add_many(values[:7000])
+    assert len(est.result())>0 #queried while the measurements are added
+    restored = OnlineAllan.from_state(est.get_state())
+    for v in values[7000:]:
+        est.add(float(v))
+    restored.add_many(values[7000:])
+    check_agreement(est,values,1.0)
+    check_agreement(restored,values,1.0)
+
+def test_bounded_memory(values):
+    est = OnlineAllan(1.0,max_m=64)
+    est.add_many(values)
+    assert len(est.phase)==est.size
+    assert max(est.result().keys())==64.0
@@ -0,0 +1,47 @@
+'''
+Tests of the response parsers of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620protocol import *
+from sr620py.sr620constants import *
+from sr620py.sr620exceptions import SR620ReadException
+import numpy as np
+import pytest
+
+def test_parse_float_matches_dictionary_parser():
+    for response in ['1.000000000012E+07\r\n','-3.5E-09,1.2E-12\r\n','42\r\n']:
+        assert parse_float(response)==float(parse_string_to_dict(response)['value_0'])
+    with pytest.raises(SR620ReadException):
+        parse_float('\r\n')
+
+def test_parse_values_into_buffer():
+    out = np.zeros(5)
+    values = parse_values('1.5,2.5,3.5\r\n',out)
+    assert np.array_equal(values,[1.5,2.5,3.5])
+    assert values.base is out #written in place
+    assert np.array_equal(parse_responses(['1.0\r\n','2.0,9.0\r\n']),[1.0,2.0])
+    with pytest.raises(SR620ReadException):
+        parse_values('1.0,abc\r\n')
+
+def test_parse_setup():
+    conf = parse_setup('4,1,3,0,6,0,0,96\r\n') #jitter and clock bits (5 and 6) set
+    assert (conf.mode,conf.source,conf.armm,conf.size)==(MODE_PERIOD,SOURCE_B,ARMING_CENTISECOND,100)
+    assert (conf.jttr,conf.clock,conf.clockfr)==(JITTER_ALLAN,CLOCK_EXTERNAL,CLOCK_FREQUENCY_10_MEGAHZ)
+    with pytest.raises(SR620ReadException):
+        parse_setup('4,1,3\r\n')
+
+def test_configuration_command_contains_only_changes():
+    applied = parse_setup('3,0,5,0,0,0,0,0\r\n')
+    requested = applied.copy()
+    assert configuration_command(requested,applied)==''
+    requested.mode = MODE_PERIOD
+    requested.size = 100
+    assert configuration_command(requested,applied)=='MODE 4; SIZE 100;'
+    assert configuration_command(requested,None).count(';')==len(CONF_FIELDS)
+    assert applied.mode==MODE_FREQUENCY #the copy is independent
+
+def test_measure_commands():
+    assert measure_command(STATISTICS_MEAN).endswith('MEAS?0')
+    assert measure_command(STATISTICS_MIN).endswith('MEAS?3')
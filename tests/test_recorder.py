@@ -0,0 +1,69 @@
+'''
+Tests of the recorders of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620recorder import CsvRecorder, NpyRecorder, SR620Recorder, format_timestamps, epoch_to_datetime, TIMEZONE
+from datetime import datetime
+import numpy as np
+import pytest
+
+DST_START = 1711846800.0 #2024-03-31 01:00 UTC, the clocks of Europe/Rome go from 02:00 to 03:00
+
+def test_format_timestamps_matches_datetime():
+    ts = np.array([DST_START-0.5,DST_START,DST_START+3600.25,1729990000.0,1729990000.0+86400])
+    expected = [datetime.fromtimestamp(t,TIMEZONE).isoformat(' ',timespec='microseconds') for t in ts]
+    assert list(format_timestamps(ts))==expected
+    assert [d.isoformat() for d in epoch_to_datetime(ts)]==[datetime.fromtimestamp(t,TIMEZONE).isoformat() for t in ts]
+
+def test_format_timestamps_empty():
+    assert len(format_timestamps(np.empty(0)))==0
+
+def test_csv_recorder(tmp_path):
+    path = str(tmp_path/'set.csv')
+    with CsvRecorder(path,'mean',flush_rows=3) as rec:
+        for i in range(5):
+            rec.append(10e6+i,DST_START+i)
+    lines = open(path).read().splitlines()
+    assert lines[0]=='timestamp,mean'
+    assert lines[1]=='2024-03-31 03:00:00.000000+02:00,10000000.0'
+    assert len(lines)==6
+
+def test_npy_recorder(tmp_path):
+    path = str(tmp_path/'set.npy')
+    with NpyRecorder(path,'mean',flush_rows=4) as rec:
+        for i in range(10):
+            rec.append(float(i))
+        assert np.load(path).shape==(8,2) #only the complete batches are counted
+    data = np.load(path)
+    assert np.array_equal(data[:,1],np.arange(10))
+    assert np.all(np.diff(data[:,0])>=0)
+
+def test_recorder_clock_ignores_wall_clock_steps(tmp_path,monkeypatch):
+    import time
+    rec = NpyRecorder(str(tmp_path/'set.npy'),'mean')
+    real = time.time
+    monkeypatch.setattr(time,'time',lambda: real()-3600) #the system clock is stepped back
+    rec.append(1.0)
+    rec.close()
+    data = np.load(rec.file_path)
+    assert data[0,0]==pytest.approx(real(),abs=60)
+
+class FailingRecorder(SR620Recorder):
+    def open(self):
+        self.fout = open(self.file_path,'w')
+        self.writes = 0
+
+    def write_batch(self,batch):
+        self.writes += 1
+        raise OSError('disk full')
+
+def test_close_does_not_write_a_failed_batch_again(tmp_path):
+    rec = FailingRecorder(str(tmp_path/'out'),'mean',flush_rows=2)
+    rec.append(1.0)
+    with pytest.raises(OSError):
+        rec.append(2.0) #the batch is full
+    rec.close()
+    assert rec.writes==1
+    assert rec.fout.closed
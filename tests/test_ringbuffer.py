@@ -0,0 +1,78 @@
+'''
+Tests of the ring buffer of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620ringbuffer import SR620RingBuffer
+import numpy as np
+import threading
+
+def push_range(buf:SR620RingBuffer,start:int,end:int):
+    for i in range(start,end):
+        buf.push(float(i),float(i))
+
+def test_wrap_around():
+    buf = SR620RingBuffer(5)
+    out = []
+    for k in range(7): #the write position goes around the buffer several times
+        push_range(buf,k*3,k*3+3)
+        out.append(buf.drain())
+    assert np.array_equal(np.concatenate(out)[:,1],np.arange(21))
+    assert buf.lost==0
+
+def test_overrun():
+    buf = SR620RingBuffer(5)
+    push_range(buf,0,12)
+    assert buf.available()==5
+    assert np.array_equal(buf.snapshot()[:,1],np.arange(7,12))
+    assert np.array_equal(buf.drain()[:,1],np.arange(7,12))
+    assert buf.lost==7
+    push_range(buf,12,14)
+    assert np.array_equal(buf.drain(max_items=1)[:,1],[12])
+    assert np.array_equal(buf.drain()[:,1],[13])
+    assert buf.get_statistics()=={'written':14,'read':14,'lost':7,'available':0}
+
+class LappingBuffer(SR620RingBuffer):
+    """Buffer whose producer writes extra pairs while the consumer is copying"""
+
+    extra = 0
+
+    def __copy_range__(self,start,end):
+        push_range(self,self.written,self.written+self.extra)
+        self.extra = 0
+        return super().__copy_range__(start,end)
+
+def test_overrun_during_copy_is_counted_once():
+    buf = LappingBuffer(4)
+    push_range(buf,0,4)
+    buf.extra = 10 #the producer laps the consumer during the copy
+    out = buf.drain(max_items=2)
+    assert len(out)==0
+    rest = buf.drain()
+    assert np.array_equal(rest[:,1],np.arange(10,14))
+    assert buf.lost==10
+    assert buf.lost+len(out)+len(rest)==buf.written
+
+def test_concurrent_producer():
+    buf = SR620RingBuffer(64)
+    n = 20000
+    producer = threading.Thread(target=push_range,args=(buf,0,n))
+    producer.start()
+    out = []
+    while producer.is_alive() or buf.available()>0:
+        buf.wait(1,timeout=0.01)
+        out.append(buf.drain())
+    producer.join()
+    values = np.concatenate(out)[:,1]
+    assert np.all(np.diff(values)>0) #in order, without duplicates
+    assert len(values)+buf.lost==n
+
+def test_wait_and_close():
+    buf = SR620RingBuffer(4)
+    assert not buf.wait(1,timeout=0.01)
+    buf.push(0.0,1.0)
+    assert buf.wait(1,timeout=0.01)
+    buf.close(RuntimeError('stopped'))
+    assert not buf.wait(5)
+    assert isinstance(buf.error,RuntimeError)
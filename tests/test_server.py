@@ -0,0 +1,63 @@
+'''
+Regression tests of the network server of the SR620 library, run against the simulated device
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620exceptions import SR620ValueException
+from sr620py.sr620server import SR620Server, SR620Client, HEADER, MAX_FRAME, MSG_CONFIGURE, recv_frame
+import numpy as np
+import pytest
+
+@pytest.fixture
+def server():
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    srv = SR620Server(dev,('127.0.0.1',0))
+    srv.start()
+    yield srv
+    srv.stop()
+    dev.close_connection()
+
+def read_samples(client:SR620Client,count:int) -> int:
+    k = 0
+    while k<count:
+        block = client.read(timeout=5)
+        assert block is not None and len(block)>0
+        k += len(block)
+    return k
+
+def test_configure(server):
+    with SR620Client(server.address) as client:
+        client.subscribe()
+        reply = client.configure(mode=MODE_PERIOD)
+        assert reply['setup']['mode']==MODE_PERIOD
+        assert server.device.device_state.mode==MODE_PERIOD
+
+def test_invalid_configuration_keeps_streaming(server):
+    with SR620Client(server.address) as client:
+        client.subscribe()
+        read_samples(client,10)
+        with pytest.raises(SR620ValueException):
+            client.configure(mode='foo')
+        assert server.device.device_state.mode==MODE_FREQUENCY
+        assert server.statistics['configurations']==0
+        read_samples(client,10)
+
+def test_rejected_configuration_keeps_streaming(server):
+    sim = server.device.ser
+    execute = sim.__execute__
+    sim.__execute__ = lambda command: (b'',0.0) if command.startswith('MODE') else execute(command) #mode locked on frequency
+    with SR620Client(server.address) as client:
+        client.subscribe()
+        with pytest.raises(SR620ValueException):
+            client.configure(mode=MODE_PERIOD)
+        block = np.concatenate([client.read(timeout=5) for i in range(3)])
+        assert np.allclose(block[:,1],10e6,rtol=1e-6)
+
+def test_oversized_frame_closes_connection(server):
+    with SR620Client(server.address) as client:
+        client.sock.sendall(HEADER.pack(MSG_CONFIGURE,MAX_FRAME+1))
+        client.sock.settimeout(5)
+        assert recv_frame(client.sock) is None #closed by the server, without waiting for the payload
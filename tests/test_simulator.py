@@ -0,0 +1,198 @@
+'''
+Regression tests of the SR620 library, run against the simulated device
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620protocol import BDMP_SCALE, MODE_DICT, SOURCE_DICT, ARMM_DICT, SIZE_LIST, update_configuration
+from sr620py.sr620sweep import SR620Sweep, SweepStep
+from sr620py.sr620exceptions import SR620ValueException, SR620SizeException
+from sr620py.sr620checkpoint import load_checkpoint
+import numpy as np
+import pytest
+
+@pytest.fixture
+def device():
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    yield dev
+    dev.close_connection()
+
+def test_configuration(device):
+    device.set_custom_configuration(mode=MODE_PERIOD,source=SOURCE_B,arming=ARMING_CENTISECOND,size=100)
+    assert device.device_state==device.setup
+    assert (device.mode,device.source,device.armm,device.size)==(MODE_PERIOD,SOURCE_B,ARMING_CENTISECOND,100)
+    sim = device.ser
+    assert sim.setup['mode']==MODE_DICT[MODE_PERIOD]
+    assert sim.setup['source']==SOURCE_DICT[SOURCE_B]
+    assert sim.setup['armm']==ARMM_DICT[ARMING_CENTISECOND]
+    assert SIZE_LIST[sim.setup['size']]==100
+
+def test_configuration_sends_only_changes(device):
+    device.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    commands = device.ser.commands
+    device.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    assert device.ser.commands==commands #nothing has changed, nothing is sent
+
+def test_configuration_transaction(device):
+    with device.configuration():
+        device.set_mode(MODE_PERIOD)
+        device.set_number_samples(10)
+    assert device.device_state.mode==MODE_PERIOD
+    assert device.device_state.size==10
+
+def test_measure_frequency(device):
+    device.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    res = device.measure(STATISTICS_MEAN,progress=False)
+    assert res==pytest.approx(10e6,rel=1e-9)
+
+def test_measure_resolution():
+    sim = SimulatedSerial(realtime=False,seed=0,latency=0.0,sigma=1e-14)
+    dev = SR620(None,port=sim)
+    try:
+        dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+        values = np.array([dev.measure(STATISTICS_MEAN,progress=False) for i in range(20)])
+        assert np.unique(values).size>1 #fluctuations of 1e-7 Hz are not rounded away
+    finally:
+        dev.close_connection()
+
+def test_measurement_set(device,tmp_path):
+    device.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    path = str(tmp_path/'set.npy')
+    res = device.start_measurement_set(STATISTICS_MEAN,50,file_path=path,print=False)
+    assert len(res)==50
+    data = np.load(path)
+    assert data.shape==(50,2)
+    assert np.array_equal(data[:,1],np.array(res))
+
+def test_binary_dump(device):
+    device.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+    out = device.start_binary_dump(1000,print=False)
+    assert out.shape==(1000,)
+    assert np.all(np.abs(out-10e6)<1e-3)
+    assert np.all(np.abs(out/BDMP_SCALE['freq']-np.round(out/BDMP_SCALE['freq']))<1e-3) #integer number of counts
+
+def test_binary_dump_period(device):
+    device.set_custom_configuration(mode=MODE_PERIOD,size=1)
+    out = device.start_binary_dump(100,print=False)
+    assert np.allclose(out,1e-7,rtol=1e-6)
+
+def test_allan_variance(device):
+    device.set_custom_configuration(arming=ARMING_CENTISECOND)
+    dct = device.start_measurement_allan_variance(1000,f_0=10e6,progress=False,print=False)
+    taus = sorted(dct.keys())
+    assert taus[0]==pytest.approx(0.01)
+    devs = np.array([dct[tau] for tau in taus])
+    assert devs[0]==pytest.approx(1e-11,rel=0.2) #white frequency noise of the simulator
+    assert devs[-1]<devs[0] #averaged down
+
+def test_binary_dump_frequency_gate(device):
+    device.set_custom_configuration(mode=MODE_FREQUENCY,arming=ARMING_CENTISECOND,size=1)
+    out = device.start_binary_dump(100,print=False)
+    assert np.allclose(out,10e6,rtol=1e-6)
+
+def fail_after(sim:SimulatedSerial,count:int):
+    """Make the simulated device stop answering after count measurements."""
+    calls = [0]
+    execute = sim.__execute__
+    def failing(command):
+        if command.startswith('MEAS'):
+            calls[0] += 1
+            if calls[0]>count:
+                raise OSError('device unplugged')
+        return execute(command)
+    sim.__execute__ = failing
+    return execute
+
+def test_allan_variance_keeps_partial_data(device):
+    device.set_custom_configuration(arming=ARMING_CENTISECOND)
+    fail_after(device.ser,400)
+    dct = device.start_measurement_allan_variance(1000,f_0=10e6,progress=False,print=False)
+    assert len(dct)>0 #computed on the 400 measurements performed
+
+def test_allan_variance_resume(device,tmp_path):
+    path = str(tmp_path/'run.json')
+    device.set_custom_configuration(arming=ARMING_CENTISECOND)
+    execute = fail_after(device.ser,250)
+    device.start_measurement_allan_variance(600,f_0=10e6,checkpoint_path=path,checkpoint_every=100,progress=False,print=False)
+    state = load_checkpoint(path)
+    assert 'samples' not in state #the measurements are in the sample store
+    with SampleStore(path+'.sr620',mode='r') as store:
+        assert len(store)==250
+    device.ser.__execute__ = execute
+    dct = device.resume_allan_variance(path,progress=False,print=False)
+    assert len(dct)>0
+    with SampleStore(path+'.sr620',mode='r') as store:
+        assert len(store)==600
+
+def test_allan_variance_resume_after_clock_step(device,tmp_path,monkeypatch):
+    import time
+    path = str(tmp_path/'run.json')
+    device.set_custom_configuration(arming=ARMING_CENTISECOND)
+    execute = fail_after(device.ser,250)
+    device.start_measurement_allan_variance(600,f_0=10e6,checkpoint_path=path,checkpoint_every=100,progress=False,print=False)
+    device.ser.__execute__ = execute
+    real = time.time
+    monkeypatch.setattr(time,'time',lambda: real()-3600) #NTP stepped the clock back before the run is resumed
+    dct = device.resume_allan_variance(path,progress=False,print=False)
+    assert len(dct)>0
+    with SampleStore(path+'.sr620',mode='r') as store:
+        assert len(store)==600
+        assert np.all(np.diff(store.range()[:,0])>=0)
+
+def test_shared_connection_keeps_own_configuration():
+    sim = SimulatedSerial(realtime=False,seed=0,latency=0.0)
+    a = SR620('sim',port=sim,shared=True)
+    b = SR620('sim',port=sim,shared=True)
+    try:
+        a.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+        b.set_custom_configuration(mode=MODE_PERIOD,size=1)
+        assert a.mode==MODE_FREQUENCY
+        assert a.measure(STATISTICS_MEAN,progress=False)==pytest.approx(10e6,rel=1e-6)
+        assert b.measure(STATISTICS_MEAN,progress=False)==pytest.approx(1e-7,rel=1e-6)
+        b.set_custom_configuration(mode=MODE_PERIOD)
+        assert np.allclose(a.start_binary_dump(100,print=False),10e6,rtol=1e-6)
+    finally:
+        b.close_connection()
+        a.close_connection()
+
+def test_shared_connection_rejects_other_port():
+    sim = SimulatedSerial(realtime=False,seed=0,latency=0.0)
+    a = SR620('sim',port=sim,shared=True)
+    try:
+        with pytest.raises(ValueError):
+            SR620('sim',port=SimulatedSerial(realtime=False,seed=1,latency=0.0),shared=True)
+        with pytest.raises(ValueError):
+            SR620('sim',port=sim,baudrate=19200,shared=True)
+        b = SR620('sim',baudrate=sim.baudrate,shared=True) #same session
+        assert b.session is a.session
+        b.close_connection()
+    finally:
+        a.close_connection()
+
+def test_configuration_rejects_invalid_value(device):
+    setup = device.setup.copy()
+    with pytest.raises(SR620ValueException):
+        update_configuration(setup,source='C')
+    device.set_custom_configuration(mode='foo')
+    assert device.setup==setup #nothing has been changed
+
+def test_sweep_skips_rejected_configuration(device):
+    sim = device.ser
+    execute = sim.__execute__
+    sim.__execute__ = lambda command: (b'',0.0) if command.startswith('SRCE') else execute(command) #source locked on A
+    steps = [SweepStep({'source':SOURCE_A,'size':1},STATISTICS_MEAN,10),SweepStep({'source':SOURCE_B,'size':1},STATISTICS_MEAN,10)]
+    results = SR620Sweep(device).run(steps,reorder=False,print=False)
+    assert results[0]['error']==None and len(results[0]['values'])==10
+    assert results[1]['error']!=None and len(results[1]['values'])==0
+
+@pytest.mark.parametrize('configuration,exception',[({'source':'C'},SR620ValueException),({'size':3},SR620SizeException),({'sauce':SOURCE_A},SR620ValueException)])
+def test_sweep_rejects_invalid_step(device,caplog,configuration,exception):
+    steps = [SweepStep({'source':SOURCE_A},STATISTICS_MEAN,10),SweepStep(configuration,STATISTICS_MEAN,10,name='bad step')]
+    sent = []
+    execute = device.ser.__execute__
+    device.ser.__execute__ = lambda command: sent.append(command) or execute(command)
+    with pytest.raises(exception):
+        SR620Sweep(device).run(steps,print=False)
+    assert 'bad step' in caplog.text
+    assert sent==[] #nothing is measured before all the steps have been checked
@@ -0,0 +1,65 @@
+'''
+Regression tests of the sample store of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import *
+from sr620py.sr620utils import compute_allan, allan_to_dict
+import numpy as np
+import pytest
+
+def test_range_and_allan(tmp_path):
+    path = str(tmp_path/'campaign.sr620')
+    t = np.arange(20000,dtype=np.float64)
+    v = 10e6*(1+np.random.default_rng(0).normal(0,1e-11,len(t)))
+    with SampleStore(path) as store:
+        store.append_many(np.column_stack((t,v)))
+    with SampleStore(path,mode='r') as store:
+        assert np.array_equal(store.range(100,200)[:,0],t[100:200])
+        dct = store.compute_allan_variance(1.0,start=100,end=19900,f_0=10e6)
+    assert dct==allan_to_dict(compute_allan((v[100:19900]-10e6)/10e6,1.0,ALLAN_OVERLAPPING))
+    assert max(dct)>4096 #long averaging times are not cut
+
+def test_allan_in_chunks(tmp_path):
+    path = str(tmp_path/'campaign.sr620')
+    t = np.arange(20000,dtype=np.float64)
+    v = 10e6*(1+np.random.default_rng(1).normal(0,1e-11,len(t)))
+    with SampleStore(path) as store:
+        store.append_many(np.column_stack((t,v)))
+    with SampleStore(path,mode='r') as store:
+        ref = store.compute_allan_variance(1.0,f_0=10e6)
+        dct = store.compute_allan_variance(1.0,f_0=10e6,max_m=1024,chunk_rows=3000)
+    assert max(dct)==1024
+    for tau,dev in dct.items():
+        assert dev==pytest.approx(ref[tau],rel=1e-6)
+
+def test_timestamps_going_backwards(tmp_path):
+    path = str(tmp_path/'campaign.sr620')
+    with SampleStore(path) as store:
+        store.append_many(np.array([[100.0,1.0],[101.0,2.0]]))
+        store.append_many(np.array([[50.0,3.0],[102.0,4.0],[99.0,5.0]])) #the system clock has been stepped back
+        assert np.array_equal(store.range()[:,0],[100,101,101,102,102])
+        assert np.array_equal(store.range(101,102)[:,1],[2,3])
+
+def test_measurement_set_with_clock_stepped_back(tmp_path,monkeypatch):
+    import time
+    dev = SR620(None,port=SimulatedSerial(realtime=False,seed=0,latency=0.0))
+    try:
+        dev.set_custom_configuration(mode=MODE_FREQUENCY,size=1)
+        real = time.time
+        calls = [0]
+        def stepped():
+            calls[0] += 1
+            return real()-(3600 if calls[0]>1 else 0) #NTP steps the clock back by 1 h during the set
+        monkeypatch.setattr(time,'time',stepped)
+        path = str(tmp_path/'campaign.sr620')
+        res = dev.start_measurement_set(STATISTICS_MEAN,300,file_path=path,print=False)
+        assert len(res)==300
+        res = dev.start_measurement_set(STATISTICS_MEAN,300,file_path=path,print=False) #appended with the clock stepped back
+        assert len(res)==300
+    finally:
+        dev.close_connection()
+    with SampleStore(path,mode='r') as store:
+        assert len(store)==600
+        assert np.all(np.diff(store.range()[:,0])>=0)
@@ -0,0 +1,46 @@
+'''
+Tests of the streaming measurement generators of the SR620 library
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py import SR620
+from sr620py.sr620constants import *
+import numpy as np
+
+def scripted_device(values:list) -> SR620:
+    """Return a device (without connection) whose measurements are the given values: None is a reading that failed, and the connection is lost after the last value"""
+    dev = object.__new__(SR620)
+    dev.cont = True
+    it = iter(values)
+    def measure(stat,progress=False):
+        try:
+            return next(it)
+        except StopIteration:
+            dev.cont = False
+            return None
+    dev.measure = measure
+    return dev
+
+def test_iter_measurements_skips_failed_readings():
+    dev = scripted_device([1.0,None,2.0,3.0,4.0])
+    res = list(dev.iter_measurements(STATISTICS_MEAN,4))
+    assert [value for ts,value in res]==[1.0,2.0,3.0] #4 attempts, one failed
+    assert all(b[0]>=a[0] for a,b in zip(res,res[1:]))
+    assert [value for ts,value in dev.iter_measurements(STATISTICS_MEAN)]==[4.0] #the generator goes on from where the previous one stopped
+
+def test_iter_measurements_forever_stops_with_connection():
+    dev = scripted_device([float(k) for k in range(10)])
+    assert [value for ts,value in dev.iter_measurements(STATISTICS_MEAN)]==[float(k) for k in range(10)]
+    assert not dev.cont
+
+def test_iter_measurement_blocks():
+    dev = scripted_device([float(k) for k in range(10)])
+    blocks = list(dev.iter_measurement_blocks(STATISTICS_MEAN,4,10))
+    assert [len(block) for block in blocks]==[4,4,2]
+    assert np.array_equal(np.concatenate(blocks)[:,1],np.arange(10.0))
+    assert blocks[0] is not blocks[1] #every block is a new array, so it can be kept by the consumer
+
+def test_measurement_set_on_generator():
+    dev = scripted_device([1.0,2.0,None,3.0])
+    assert dev.start_measurement_set(STATISTICS_MEAN,4,print=False)==[1.0,2.0,3.0]
@@ -0,0 +1,68 @@
+'''
+Tests of the transport layer of the SR620 library, run against a scripted port
+
+@author: Matteo Tedde (Lab3841 s.r.l.)
+@contact: teddematteo03@gmail.com
+'''
+from sr620py.sr620transport import SR620Transport
+
+class ScriptedPort():
+    """Port answering every query with the response given for it, and recording the bytes written"""
+
+    def __init__(self,responses):
+        self.responses = responses
+        self.written = b''
+        self.input = bytearray()
+        self.resets = 0
+
+    @property
+    def in_waiting(self):
+        return len(self.input)
+
+    def reset_input_buffer(self):
+        self.resets += 1
+        self.input.clear()
+
+    def write(self,data):
+        self.written += data
+        for command in data.split(b'\r')[:-1]:
+            if command in self.responses:
+                self.input += self.responses[command]+b'\r\n'
+
+    def flush(self):
+        pass
+
+    def read(self,size=1):
+        data = bytes(self.input[:size])
+        del self.input[:size]
+        return data
+
+    def read_until(self,expected=b'\n'):
+        end = self.input.find(expected)
+        return self.read(len(self.input) if end<0 else end+len(expected))
+
+    def close(self):
+        pass
+
+def test_query_frames_command_and_response():
+    port = ScriptedPort({b'*IDN?':b'StanfordResearchSystems,SR620,1,1.0'})
+    t = SR620Transport(port)
+    assert t.query('*IDN?')=='StanfordResearchSystems,SR620,1,1.0\r\n'
+    assert t.query('MODE 0',needs_response=False) is None
+    assert port.written==b'*IDN?\rMODE 0\r'
+    assert port.resets==0 #nothing to discard: no time is spent draining the buffer
+    assert t.get_statistics()['commands']==2
+
+def test_stale_bytes_are_discarded():
+    port = ScriptedPort({b'MEAS? 0':b'1.0E+07'})
+    port.input += b'9.9E+06\r\n' #response left by an interrupted command
+    t = SR620Transport(port)
+    assert t.query('MEAS? 0')=='1.0E+07\r\n'
+    assert port.resets==1
+
+def test_pipelined_queries():
+    port = ScriptedPort({b'MODE?':b'0',b'SRCE?':b'1'})
+    t = SR620Transport(port)
+    assert t.query_many(['MODE 0','MODE?','SRCE?'])==['0\r\n','1\r\n']
+    assert port.written==b'MODE 0\rMODE?\rSRCE?\r' #written before reading the responses
+    assert t.get_statistics()['commands']==3